@@ -0,0 +1,54 @@
+"""
+Compara dos archivos de resultados (de micro.py o load.py) y marca las
+regresiones de latencia por encima de un umbral.
+
+Uso:
+    python -m benchmarks.compare base.json nuevo.json --umbral 10
+"""
+import argparse
+import json
+import sys
+
+METRICAS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def comparar(base, nuevo, umbral):
+    regresiones = []
+    for nombre in sorted(set(base["resultados"]) & set(nuevo["resultados"])):
+        antes, despues = base["resultados"][nombre], nuevo["resultados"][nombre]
+        partes = []
+        for metrica in METRICAS:
+            if metrica not in antes or metrica not in despues or not antes[metrica]:
+                continue
+            cambio = (despues[metrica] - antes[metrica]) / antes[metrica] * 100
+            marca = ""
+            if cambio > umbral:
+                marca = " ⚠️"
+                regresiones.append((nombre, metrica, cambio))
+            partes.append(f"{metrica}={antes[metrica]}→{despues[metrica]} ({cambio:+.1f}%){marca}")
+        if partes:
+            print(f"{nombre:28s} " + "  ".join(partes))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar resultados de benchmarks")
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--umbral", type=float, default=10.0, help="Porcentaje de empeoramiento tolerado")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.nuevo, encoding="utf-8") as f:
+        nuevo = json.load(f)
+    print(f"Base: {base['meta'].get('commit')}  Nuevo: {nuevo['meta'].get('commit')}")
+    regresiones = comparar(base, nuevo, args.umbral)
+    if regresiones:
+        print(f"\n❌ {len(regresiones)} regresiones por encima de {args.umbral}%")
+        sys.exit(1)
+    print("\n✅ Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Prueba de carga end-to-end: ejecuta `main.app` en el mismo proceso (sin
+red) contra un stub local de Nominatim y reporta latencias p50/p95/p99 y
+throughput por escenario.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.load --pedidos 500 --concurrencia 32 --output benchmarks/load.json
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.nominatim_stub import NominatimStub
+from benchmarks.resultados import guardar, percentiles
+
+CIUDADES = ["Buenos Aires", "Córdoba", "Rosario", "Mendoza", "Madrid", "London", "Paris", "Tokyo",
+            "Lima", "Bogotá", "Santiago", "Montevideo", "Quito", "Caracas", "Roma", "Berlín"]
+
+
+def _params_carta(i):
+    return {"anio": 1950 + i % 60, "mes": 1 + i % 12, "dia": 1 + i % 28,
+            "hora": i % 24, "minuto": i % 60, "lat": str(-50 + i % 100), "lon": str(-170 + i % 340)}
+
+
+def escenarios():
+    """Nombre -> función (cliente, i) que hace un pedido."""
+    def carta_coordenadas(cliente, i):
+        return cliente.get("/carta", params=_params_carta(i))
+
+    def carta_repetida(cliente, i):
+        return cliente.get("/carta", params=_params_carta(0))
+
+    def carta_ciudad(cliente, i):
+        return cliente.get("/carta", params={"anio": 1982, "mes": 6, "dia": 6,
+                                             "ciudad": CIUDADES[i % len(CIUDADES)]})
+
+    def buscar_ciudades(cliente, i):
+        return cliente.get("/buscar_ciudades", params={"q": CIUDADES[i % len(CIUDADES)]})
+
+    def cartas_lote(cliente, i):
+        registros = [{**_params_carta(i * 100 + j), "lat": -34.6, "lon": -58.4} for j in range(100)]
+        return cliente.post("/cartas", json={"registros": registros})
+
+    return {
+        "carta_coordenadas": carta_coordenadas,
+        "carta_repetida": carta_repetida,
+        "carta_ciudad": carta_ciudad,
+        "buscar_ciudades": buscar_ciudades,
+        "cartas_lote_100": cartas_lote
+    }
+
+
+async def correr_escenario(cliente, funcion, pedidos, concurrencia):
+    latencias = []
+    errores = 0
+    indices = iter(range(pedidos))
+
+    async def worker():
+        nonlocal errores
+        for i in indices:
+            inicio = time.perf_counter()
+            respuesta = await funcion(cliente, i)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code >= 400:
+                errores += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    return {
+        **percentiles(latencias),
+        "errores": errores,
+        "duracion_s": round(duracion, 3),
+        "pedidos_por_s": round(pedidos / duracion, 2)
+    }
+
+
+async def correr(pedidos, concurrencia, seleccion):
+    import httpx
+    import main as app_main
+
+    resultados = {}
+    transporte = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=120) as cliente:
+        for nombre, funcion in escenarios().items():
+            if seleccion and nombre not in seleccion:
+                continue
+            print(f"🚦 {nombre}...")
+            n = max(1, pedidos // 10) if nombre == "cartas_lote_100" else pedidos
+            resultados[nombre] = await correr_escenario(cliente, funcion, n, concurrencia)
+            datos = resultados[nombre]
+            print(f"  p50={datos['p50_ms']}ms p95={datos['p95_ms']}ms p99={datos['p99_ms']}ms "
+                  f"{datos['pedidos_por_s']} req/s errores={datos['errores']}")
+    app_main.chart_executor.shutdown()
+    await app_main.geocoding_service.aclose()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de astrología")
+    parser.add_argument("--pedidos", type=int, default=500, help="Pedidos por escenario")
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--latencia-stub", type=float, default=0.02, help="Latencia simulada de Nominatim (s)")
+    parser.add_argument("--escenarios", default="", help="Escenarios separados por coma (default: todos)")
+    parser.add_argument("--output", default="benchmarks/load.json")
+    args = parser.parse_args()
+
+    stub = NominatimStub(latencia=args.latencia_stub).iniciar()
+    directorio = tempfile.mkdtemp()
+    # Configurar el servicio antes de importar main
+    os.environ["NOMINATIM_URL"] = stub.url
+    os.environ["NOMINATIM_RATE"] = "1000"
+    os.environ["NOMINATIM_BURST"] = "100"
+    os.environ["GEOCODING_DB_PATH"] = os.path.join(directorio, "geocoding_cache.db")
+
+    seleccion = [e.strip() for e in args.escenarios.split(",") if e.strip()]
+    resultados = asyncio.run(correr(args.pedidos, args.concurrencia, seleccion))
+    resultados["_nominatim_llamadas"] = {"n": stub.llamadas}
+    stub.shutdown()
+    guardar(args.output, "load", resultados)
+
+
+if __name__ == "__main__":
+    main()
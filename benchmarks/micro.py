@@ -0,0 +1,133 @@
+"""
+Microbenchmarks de las funciones del camino crítico de /carta.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.micro --output benchmarks/micro.json
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import pytz
+
+os.makedirs("data", exist_ok=True)
+
+import timezones  # noqa: E402
+import util  # noqa: E402
+from geocoding import GeocodingService  # noqa: E402
+
+from benchmarks.nominatim_stub import NominatimStub  # noqa: E402
+from benchmarks.resultados import guardar, percentiles  # noqa: E402
+
+# Ubicaciones de prueba (lat, lon)
+UBICACIONES = [(-34.6037, -58.3816), (40.4168, -3.7038), (35.6762, 139.6503), (51.5074, -0.1278)]
+
+
+def medir(funcion, iteraciones, preparar=None):
+    """Ejecuta `funcion` `iteraciones` veces y devuelve los percentiles en ms."""
+    muestras = []
+    for i in range(iteraciones):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcion(i)
+        muestras.append((time.perf_counter() - inicio) * 1000)
+    return percentiles(muestras)
+
+
+def medir_async(funcion, iteraciones, preparar=None):
+    async def correr():
+        muestras = []
+        for i in range(iteraciones):
+            if preparar is not None:
+                preparar()
+            inicio = time.perf_counter()
+            await funcion(i)
+            muestras.append((time.perf_counter() - inicio) * 1000)
+        return muestras
+    return percentiles(asyncio.run(correr()))
+
+
+def bench_carta(iteraciones):
+    carta = util.get_chart(1982, 6, 6, 6, 30, 0, -3, -35.57, -58.0)
+    posiciones = {nombre: info["grado"] for nombre, info in carta["planetas"].items()}
+    return {
+        "get_chart": medir(lambda i: util.get_chart(1950 + i % 60, 1 + i % 12, 1 + i % 28, i % 24, 30,
+                                                     0, -3, -35.57, -58.0), iteraciones),
+        "calcular_aspectos": medir(lambda i: util.calcular_aspectos(posiciones), iteraciones),
+        "calcular_balance_elementos": medir(
+            lambda i: util.calcular_balance_elementos(carta["planetas"]), iteraciones
+        )
+    }
+
+
+def bench_zona_horaria(iteraciones):
+    inicio = time.perf_counter()
+    timezones.get_finder()
+    finder_ms = (time.perf_counter() - inicio) * 1000
+
+    def limpiar():
+        # Frío de verdad: también la caché de zonas de pytz, que si no
+        # devuelve la zona ya parseada aunque se limpien las nuestras
+        timezones._zona_en.cache_clear()
+        timezones._transiciones.cache_clear()
+        pytz._tzinfo_cache.clear()
+
+    def consulta(i):
+        lat, lon = UBICACIONES[i % len(UBICACIONES)]
+        util.get_timezone_offset(lat, lon, datetime(1990, 5, 5, 12))
+
+    return {
+        "tz_finder_init": {"n": 1, "p50_ms": round(finder_ms, 4)},
+        "tz_lookup_frio": medir(consulta, iteraciones, limpiar),
+        "tz_lookup_caliente": medir(consulta, iteraciones)
+    }
+
+
+def bench_cache_geocodificacion(iteraciones):
+    stub = NominatimStub().iniciar()
+    with tempfile.TemporaryDirectory() as directorio:
+        servicio = GeocodingService(base_url=stub.url, rate=1e6, burst=1000,
+                                    db_path=os.path.join(directorio, "cache.db"))
+        memoria = servicio.memory_cache["coordinates_cache"]
+
+        async def hit(i):
+            await servicio.get_coordinates("Buenos Aires", "Argentina")
+
+        async def miss(i):
+            await servicio.get_coordinates(f"Ciudad {i}", "")
+
+        async def primera_consulta():
+            await hit(0)
+            await servicio.flush_writes()
+
+        asyncio.run(primera_consulta())
+        resultados = {
+            "cache_hit_memoria": medir_async(hit, iteraciones),
+            "cache_hit_sqlite": medir_async(hit, iteraciones, memoria.clear),
+            "cache_miss_stub": medir_async(miss, iteraciones)
+        }
+    stub.shutdown()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks de la API de astrología")
+    parser.add_argument("--iteraciones", type=int, default=500)
+    parser.add_argument("--output", default="benchmarks/micro.json")
+    args = parser.parse_args()
+
+    resultados = {}
+    for bench in (bench_carta, bench_zona_horaria, bench_cache_geocodificacion):
+        print(f"⏱️ {bench.__name__}...")
+        resultados.update(bench(args.iteraciones))
+    for nombre, datos in resultados.items():
+        print(f"  {nombre:28s} p50={datos.get('p50_ms')}ms p95={datos.get('p95_ms', '-')}ms")
+    guardar(args.output, "micro", resultados)
+
+
+if __name__ == "__main__":
+    main()
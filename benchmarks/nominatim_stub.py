@@ -0,0 +1,84 @@
+"""
+Servidor local que imita las rutas /search y /reverse de Nominatim, para
+correr benchmarks y pruebas de carga sin depender de la red.
+
+Uso:
+    python -m benchmarks.nominatim_stub --port 8765 --latencia 0.05
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _resultado(nombre: str, lat: float, lon: float) -> dict:
+    return {
+        "display_name": f"{nombre}, Provincia, País",
+        "lat": str(lat),
+        "lon": str(lon),
+        "type": "city",
+        "importance": 0.7,
+        "address": {"city": nombre, "state": "Provincia", "country": "País", "country_code": "xx"}
+    }
+
+
+class NominatimStub(ThreadingHTTPServer):
+    """Servidor stub; cuenta las llamadas recibidas y puede agregar latencia."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latencia: float = 0.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latencia = latencia
+        self.llamadas = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def iniciar(self) -> "NominatimStub":
+        """Atiende pedidos en un hilo en segundo plano."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.llamadas += 1
+        if self.server.latencia:
+            time.sleep(self.server.latencia)
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/search":
+            nombre = params.get("q", "Ciudad").split(",")[0].title()
+            # Coordenadas deterministas a partir del nombre
+            semilla = sum(map(ord, nombre))
+            body = [_resultado(nombre, (semilla % 120) - 60, (semilla * 7 % 340) - 170)]
+        elif url.path == "/reverse":
+            body = _resultado("Ciudad", float(params.get("lat", 0)), float(params.get("lon", 0)))
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local de Nominatim")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos de espera por pedido")
+    args = parser.parse_args()
+    stub = NominatimStub(args.port, args.latencia)
+    print(f"Stub de Nominatim en {stub.url}")
+    stub.serve_forever()
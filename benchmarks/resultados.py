@@ -0,0 +1,50 @@
+"""Utilidades comunes: percentiles, metadatos y guardado de resultados en JSON."""
+import json
+import os
+import platform
+import subprocess
+import time
+
+
+def percentiles(muestras_ms):
+    """p50/p95/p99, media y máximo de una lista de tiempos en milisegundos."""
+    ordenadas = sorted(muestras_ms)
+    n = len(ordenadas)
+    if not n:
+        return {}
+
+    def p(q):
+        return round(ordenadas[min(n - 1, int(q * n))], 4)
+
+    return {
+        "n": n,
+        "media_ms": round(sum(ordenadas) / n, 4),
+        "p50_ms": p(0.50),
+        "p95_ms": p(0.95),
+        "p99_ms": p(0.99),
+        "max_ms": round(ordenadas[-1], 4)
+    }
+
+
+def metadatos():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+
+def guardar(path, tipo, resultados):
+    """Guarda los resultados con sus metadatos, con claves ordenadas para poder hacer diff."""
+    datos = {"tipo": tipo, "meta": metadatos(), "resultados": resultados}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write("\n")
+    print(f"💾 Resultados guardados en {path}")
@@ -0,0 +1,252 @@
+"""
+Mantenimiento y respaldo de la caché de geocodificación (SQLite), y
+límites de la caché de cartas en disco.
+
+Uso (desde la raíz del repositorio):
+    python cache_admin.py estado
+    python cache_admin.py mantener
+    python cache_admin.py exportar geocoding_seed.jsonl.gz
+    python cache_admin.py importar geocoding_seed.jsonl.gz
+    python cache_admin.py cartas
+
+Todas las órdenes aceptan --db para indicar otra base de datos (la de
+geocodificación, o la de cartas en `cartas`).
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from typing import Dict, Iterable
+
+from chart_cache import CHART_CACHE_MAX_BYTES, CHART_CACHE_MAX_ROWS, init_chart_db
+from chart_cache import DB_PATH as CHART_DB_PATH
+from geocoding import CACHE_COLUMNS, CACHE_DURATION_SECONDS, DB_PATH, init_cache_db
+
+# Filas máximas por tabla; al superarlas se borran las de acceso más antiguo
+GEOCODING_CACHE_MAX_ROWS = int(os.getenv("GEOCODING_CACHE_MAX_ROWS", "200000"))
+# Tamaño máximo de los datos de la base en bytes (0 = sin límite)
+GEOCODING_CACHE_MAX_BYTES = int(os.getenv("GEOCODING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Segundos entre pasadas del mantenimiento en segundo plano
+CACHE_MAINTENANCE_INTERVAL = float(os.getenv("CACHE_MAINTENANCE_INTERVAL", "3600"))
+# Archivo de caché precalentada que se importa al iniciar, si existe
+GEOCODING_SEED_FILE = os.getenv("GEOCODING_SEED_FILE", "geocoding_seed.jsonl.gz")
+
+
+def purgar_vencidas(conn, ahora: float = None) -> Dict[str, int]:
+    """Borra las entradas más viejas que CACHE_DURATION_SECONDS."""
+    limite = (ahora or time.time()) - CACHE_DURATION_SECONDS
+    borradas = {}
+    with conn:
+        for table in CACHE_COLUMNS:
+            borradas[table] = conn.execute(f"DELETE FROM {table} WHERE timestamp < ?", (limite,)).rowcount
+    return borradas
+
+
+def _borrar_menos_usadas(conn, table: str, cantidad: int) -> int:
+    return conn.execute(
+        f"DELETE FROM {table} WHERE rowid IN "
+        f"(SELECT rowid FROM {table} ORDER BY last_access ASC LIMIT ?)",
+        (cantidad,)
+    ).rowcount
+
+
+def recortar_filas(conn, max_filas: int = GEOCODING_CACHE_MAX_ROWS,
+                   tablas: Iterable[str] = tuple(CACHE_COLUMNS)) -> Dict[str, int]:
+    """Deja cada tabla en `max_filas` como mucho, borrando las de acceso más antiguo."""
+    borradas = {}
+    with conn:
+        for table in tablas:
+            exceso = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - max_filas
+            borradas[table] = _borrar_menos_usadas(conn, table, exceso) if exceso > 0 else 0
+    return borradas
+
+
+def tamano_datos(conn) -> int:
+    """Bytes ocupados por datos (sin contar las páginas libres)."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    paginas = conn.execute("PRAGMA page_count").fetchone()[0]
+    libres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return (paginas - libres) * page_size
+
+
+def recortar_bytes(conn, max_bytes: int = GEOCODING_CACHE_MAX_BYTES,
+                   tablas: Iterable[str] = tuple(CACHE_COLUMNS)) -> int:
+    """
+    Mientras los datos superen `max_bytes`, borra el 10% de acceso más
+    antiguo de cada tabla. Devuelve cuántas filas se borraron.
+    """
+    borradas = 0
+    # Con 10% por vuelta, 50 vueltas dejan menos del 1% de las filas
+    for _ in range(50):
+        if not max_bytes or tamano_datos(conn) <= max_bytes:
+            break
+        with conn:
+            for table in tablas:
+                total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                if total:
+                    borradas += _borrar_menos_usadas(conn, table, max(1, total // 10))
+    return borradas
+
+
+def vacuum_incremental(conn) -> int:
+    """
+    Devuelve al sistema las páginas libres del archivo. Una base creada sin
+    auto_vacuum incremental se convierte una vez con un VACUUM completo.
+    Devuelve cuántas páginas se liberaron.
+    """
+    libres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    return libres
+
+
+def mantener(db_path: str = DB_PATH, max_filas: int = GEOCODING_CACHE_MAX_ROWS,
+             max_bytes: int = GEOCODING_CACHE_MAX_BYTES) -> Dict:
+    """Una pasada completa: vencidas, límite de filas, límite de bytes y vacuum."""
+    conn = init_cache_db(db_path)
+    try:
+        resumen = {
+            "vencidas": purgar_vencidas(conn),
+            "por_filas": recortar_filas(conn, max_filas),
+            "por_bytes": recortar_bytes(conn, max_bytes)
+        }
+        resumen["paginas_liberadas"] = vacuum_incremental(conn)
+        resumen["bytes"] = tamano_datos(conn)
+        return resumen
+    finally:
+        conn.close()
+
+
+def mantener_cartas(db_path: str = CHART_DB_PATH, max_filas: int = CHART_CACHE_MAX_ROWS,
+                    max_bytes: int = CHART_CACHE_MAX_BYTES) -> Dict:
+    """
+    Límites de la caché de cartas en disco: las cartas no vencen, así que
+    solo se descartan las de acceso más antiguo y se libera el espacio.
+    """
+    conn = init_chart_db(db_path)
+    try:
+        resumen = {
+            "por_filas": recortar_filas(conn, max_filas, ("chart_cache",))["chart_cache"],
+            "por_bytes": recortar_bytes(conn, max_bytes, ("chart_cache",))
+        }
+        resumen["paginas_liberadas"] = vacuum_incremental(conn)
+        resumen["bytes"] = tamano_datos(conn)
+        return resumen
+    finally:
+        conn.close()
+
+
+def estado(db_path: str = DB_PATH) -> Dict:
+    conn = init_cache_db(db_path)
+    try:
+        limite = time.time() - CACHE_DURATION_SECONDS
+        return {
+            "tablas": {
+                table: {
+                    "filas": conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0],
+                    "vencidas": conn.execute(
+                        f"SELECT COUNT(*) FROM {table} WHERE timestamp < ?", (limite,)
+                    ).fetchone()[0]
+                }
+                for table in CACHE_COLUMNS
+            },
+            "bytes": tamano_datos(conn),
+            "paginas_libres": conn.execute("PRAGMA freelist_count").fetchone()[0]
+        }
+    finally:
+        conn.close()
+
+
+def exportar(db_path: str, destino: str) -> int:
+    """Escribe las entradas vigentes como JSONL comprimido con gzip. Devuelve cuántas."""
+    conn = init_cache_db(db_path)
+    limite = time.time() - CACHE_DURATION_SECONDS
+    total = 0
+    try:
+        with gzip.open(destino, "wt", encoding="utf-8") as f:
+            for table, column_name in CACHE_COLUMNS.items():
+                filas = conn.execute(
+                    f"SELECT query, {column_name}, timestamp, last_access FROM {table} WHERE timestamp >= ?",
+                    (limite,)
+                )
+                for query, raw, timestamp, last_access in filas:
+                    f.write(json.dumps({
+                        "tabla": table,
+                        "query": query,
+                        "datos": json.loads(raw),
+                        "timestamp": timestamp,
+                        "last_access": last_access
+                    }, ensure_ascii=False) + "\n")
+                    total += 1
+    finally:
+        conn.close()
+    return total
+
+
+def importar(db_path: str, origen: str) -> int:
+    """
+    Carga un JSONL de `exportar`. Una entrada existente solo se reemplaza si
+    la importada es más nueva. Devuelve cuántas líneas se procesaron.
+    """
+    conn = init_cache_db(db_path)
+    total = 0
+    try:
+        with gzip.open(origen, "rt", encoding="utf-8") as f, conn:
+            for linea in f:
+                entrada = json.loads(linea)
+                table = entrada["tabla"]
+                if table not in CACHE_COLUMNS:
+                    continue
+                column_name = CACHE_COLUMNS[table]
+                conn.execute(
+                    f"INSERT INTO {table} (query, {column_name}, timestamp, last_access) VALUES (?, ?, ?, ?) "
+                    f"ON CONFLICT(query) DO UPDATE SET {column_name} = excluded.{column_name}, "
+                    f"timestamp = excluded.timestamp, last_access = MAX(last_access, excluded.last_access) "
+                    f"WHERE excluded.timestamp > {table}.timestamp",
+                    (entrada["query"], json.dumps(entrada["datos"]), entrada["timestamp"],
+                     entrada.get("last_access") or entrada["timestamp"])
+                )
+                total += 1
+    finally:
+        conn.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de la caché de geocodificación")
+    parser.add_argument("--db", default=None,
+                        help=f"Base de datos de caché (default: {DB_PATH}, o {CHART_DB_PATH} en cartas)")
+    sub = parser.add_subparsers(dest="orden", required=True)
+    sub.add_parser("estado", help="Filas, vencidas y tamaño por tabla")
+    mant = sub.add_parser("mantener", help="Purgar vencidas, aplicar límites y liberar espacio")
+    mant.add_argument("--max-filas", type=int, default=GEOCODING_CACHE_MAX_ROWS)
+    mant.add_argument("--max-bytes", type=int, default=GEOCODING_CACHE_MAX_BYTES)
+    exp = sub.add_parser("exportar", help="Exportar a JSONL comprimido (.jsonl.gz)")
+    exp.add_argument("archivo")
+    imp = sub.add_parser("importar", help="Importar un JSONL comprimido (.jsonl.gz)")
+    imp.add_argument("archivo")
+    cartas = sub.add_parser("cartas", help="Aplicar los límites a la caché de cartas en disco")
+    cartas.add_argument("--max-filas", type=int, default=CHART_CACHE_MAX_ROWS)
+    cartas.add_argument("--max-bytes", type=int, default=CHART_CACHE_MAX_BYTES)
+    args = parser.parse_args()
+
+    if args.orden == "cartas":
+        print(json.dumps(mantener_cartas(args.db or CHART_DB_PATH, args.max_filas, args.max_bytes), indent=2))
+        return
+    args.db = args.db or DB_PATH
+    if args.orden == "estado":
+        print(json.dumps(estado(args.db), indent=2))
+    elif args.orden == "mantener":
+        print(json.dumps(mantener(args.db, args.max_filas, args.max_bytes), indent=2))
+    elif args.orden == "exportar":
+        print(f"💾 {exportar(args.db, args.archivo)} entradas exportadas a {args.archivo}")
+    elif args.orden == "importar":
+        print(f"📥 {importar(args.db, args.archivo)} entradas importadas de {args.archivo}")
+
+
+if __name__ == "__main__":
+    main()
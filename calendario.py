@@ -0,0 +1,293 @@
+import asyncio
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+import swisseph as swe
+
+import db
+from eventos import _diferencia, _posicion, _refinar, buscar_ingresos, jd_a_fecha
+from lru import TTLCache
+from metrics import registrar_cache
+from timezones import offset_en_utc
+from util import ASPECTOS, PLANETAS, SIGNS
+
+DB_PATH = os.getenv("CALENDARIO_DB_PATH", "data/calendario.db")
+# Meses en memoria (cada uno son unos pocos KB)
+CALENDARIO_CACHE_SIZE = int(os.getenv("CALENDARIO_CACHE_SIZE", "240"))
+# Cambia si cambia el cálculo: los meses guardados con otra versión se recalculan
+VERSION_CALENDARIO = 1
+
+# Fases principales: elongación Luna - Sol en grados
+FASES = {0: "luna_nueva", 90: "cuarto_creciente", 180: "luna_llena", 270: "cuarto_menguante"}
+# Fase de los días sin fase exacta, según la última fase principal
+FASES_INTERMEDIAS = {
+    "luna_nueva": "creciente",
+    "cuarto_creciente": "gibosa_creciente",
+    "luna_llena": "gibosa_menguante",
+    "cuarto_menguante": "menguante"
+}
+# Muestreo en días: la elongación avanza ~12°/día y la Luna se aleja de
+# cualquier planeta a más de 9°/día, así que cada objetivo se cruza a lo
+# sumo una vez entre dos muestras
+PASO_FASES = 1.0
+PASO_ASPECTOS = 0.5
+
+_ID_LUNA = PLANETAS["luna"]
+_ID_SOL = PLANETAS["sol"]
+# Ángulos Luna - planeta de los aspectos mayores, en ambos sentidos
+_OBJETIVOS_ASPECTOS = {
+    (signo * angulo) % 360: nombre for angulo, nombre, _ in ASPECTOS for signo in (1, -1)
+}
+
+
+def _elongacion(jd: float) -> float:
+    return (_posicion(jd, _ID_LUNA)[0] - _posicion(jd, _ID_SOL)[0]) % 360
+
+
+def _cruces_relativos(f, jd_inicio: float, jd_fin: float, paso: float, objetivos) -> List[Tuple[float, float]]:
+    """
+    Instantes en que el ángulo creciente `f` (grados) pasa por cada uno de
+    `objetivos`, entre `jd_inicio` y `jd_fin`. Devuelve pares (jd, objetivo).
+    """
+    n = max(1, math.ceil((jd_fin - jd_inicio) / paso))
+    jds = [jd_inicio + i * (jd_fin - jd_inicio) / n for i in range(n + 1)]
+    valores = [f(jd) for jd in jds]
+    cruces = []
+    for objetivo in objetivos:
+        g = lambda t: _diferencia(f(t), objetivo)
+        for a, b, va, vb in zip(jds, jds[1:], valores, valores[1:]):
+            fa, fb = _diferencia(va, objetivo), _diferencia(vb, objetivo)
+            if fa < 0 <= fb and fb - fa < 180:
+                cruces.append((b if fb == 0 else _refinar(g, a, b, fa, fb), objetivo))
+    return cruces
+
+
+def buscar_fases(jd_inicio: float, jd_fin: float) -> List[Dict]:
+    """Lunas nuevas, llenas y cuartos exactos entre dos días julianos (UT)."""
+    fases = []
+    for jd, objetivo in _cruces_relativos(_elongacion, jd_inicio, jd_fin, PASO_FASES, FASES):
+        longitud = _posicion(jd, _ID_LUNA)[0]
+        fases.append({
+            "fase": FASES[objetivo],
+            "jd": round(jd, 6),
+            "signo": SIGNS[int(longitud // 30) % 12],
+            "grado": round(longitud, 4)
+        })
+    fases.sort(key=lambda f: f["jd"])
+    return fases
+
+
+def _ultimo_aspecto(jd_inicio: float, jd_fin: float) -> Optional[Dict]:
+    """Último aspecto mayor exacto de la Luna a un planeta entre dos instantes."""
+    ultimo = None
+    for nombre, id_planeta in PLANETAS.items():
+        if id_planeta == _ID_LUNA:
+            continue
+        f = lambda t, i=id_planeta: (_posicion(t, _ID_LUNA)[0] - _posicion(t, i)[0]) % 360
+        for jd, objetivo in _cruces_relativos(f, jd_inicio, jd_fin, PASO_ASPECTOS, _OBJETIVOS_ASPECTOS):
+            if jd < jd_fin and (ultimo is None or jd > ultimo["jd"]):
+                ultimo = {"jd": jd, "planeta": nombre, "aspecto": _OBJETIVOS_ASPECTOS[objetivo]}
+    return ultimo
+
+
+def buscar_vacios(ingresos: List[Dict]) -> List[Dict]:
+    """
+    Períodos de Luna vacía de curso: desde su último aspecto mayor exacto a
+    un planeta hasta su entrada en el signo siguiente. `ingresos` son los
+    ingresos de la Luna en orden; se calcula un período por cada par.
+    """
+    vacios = []
+    for entrada, salida in zip(ingresos, ingresos[1:]):
+        ultimo = _ultimo_aspecto(entrada["jd"], salida["jd"])
+        vacios.append({
+            # Sin aspectos en todo el signo, el período empieza con el ingreso
+            "inicio_jd": round(ultimo["jd"] if ultimo else entrada["jd"], 6),
+            "fin_jd": salida["jd"],
+            "signo": entrada["signo"],
+            "planeta": ultimo["planeta"] if ultimo else None,
+            "aspecto": ultimo["aspecto"] if ultimo else None
+        })
+    return vacios
+
+
+def _limites_mes(anio: int, mes: int) -> Tuple[float, float]:
+    siguiente = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+    return swe.julday(anio, mes, 1, 0.0), swe.julday(*siguiente, 1, 0.0)
+
+
+def eventos_mes(anio: int, mes: int) -> Dict:
+    """
+    Eventos lunares de un mes UTC: fases, ingresos de la Luna y períodos
+    vacíos de curso que terminan en el mes. Es igual para todos los
+    usuarios, así que se calcula una vez y se guarda.
+    """
+    jd_inicio, jd_fin = _limites_mes(anio, mes)
+    # Desde el ingreso anterior al mes, para el primer período vacío
+    ingresos = [
+        {"signo": e["signo"], "jd": e["jd"]}
+        for e in buscar_ingresos("luna", jd_inicio - 3, jd_fin)
+    ]
+    ingresos.sort(key=lambda e: e["jd"])
+    vacios = [v for v in buscar_vacios(ingresos) if v["fin_jd"] >= jd_inicio]
+    return {
+        "version": VERSION_CALENDARIO,
+        "fases": buscar_fases(jd_inicio, jd_fin),
+        "ingresos": [e for e in ingresos if e["jd"] >= jd_inicio],
+        "vacios": vacios
+    }
+
+
+def _mes_relativo(anio: int, mes: int, delta: int) -> Tuple[int, int]:
+    indice = anio * 12 + (mes - 1) + delta
+    return indice // 12, indice % 12 + 1
+
+
+class CalendarioLunar:
+    """
+    Calendario lunar mensual a partir de tablas de eventos precalculadas.
+
+    Los eventos de cada mes UTC se calculan una sola vez en el executor y
+    se guardan en memoria y en SQLite. Un pedido lee el mes anterior, el
+    pedido y el siguiente, y solo convierte los instantes a la zona horaria
+    del usuario: no recalcula posiciones.
+    """
+
+    def __init__(self, executor, db_path: str = DB_PATH, size: int = CALENDARIO_CACHE_SIZE):
+        self.executor = executor
+        self.memory = TTLCache(size, float("inf"))
+        # La base se abre al primer uso: importar el módulo no toca el disco
+        self.db_path = db_path
+        self._db_conn = None
+        self.db_lock = threading.Lock()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def db_conn(self):
+        if self._db_conn is None:
+            with self.db_lock:
+                if self._db_conn is None:
+                    self._db_conn = self._init_db(self.db_path)
+        return self._db_conn
+
+    def _init_db(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = db.connect(db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS calendario_lunar (
+                mes TEXT PRIMARY KEY,
+                version INTEGER,
+                eventos TEXT,
+                timestamp REAL
+            )
+        ''')
+        conn.commit()
+        return conn
+
+    def _read_db_sync(self, clave: str) -> Optional[Dict]:
+        conn = self.db_conn
+        with self.db_lock:
+            row = conn.execute(
+                "SELECT eventos FROM calendario_lunar WHERE mes = ? AND version = ?", (clave, VERSION_CALENDARIO)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write_db_sync(self, clave: str, eventos: Dict):
+        conn = self.db_conn
+        with self.db_lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO calendario_lunar (mes, version, eventos, timestamp) VALUES (?, ?, ?, ?)",
+                (clave, VERSION_CALENDARIO, json.dumps(eventos, ensure_ascii=False), time.time())
+            )
+            conn.commit()
+
+    async def _calcular(self, anio: int, mes: int, clave: str) -> Dict:
+        eventos = await asyncio.to_thread(self._read_db_sync, clave)
+        registrar_cache("calendario_lunar", "sqlite", eventos is not None)
+        if eventos is None:
+            eventos = await self.executor.run(eventos_mes, anio, mes)
+            await asyncio.to_thread(self._write_db_sync, clave, eventos)
+        self.memory.set(clave, eventos)
+        return eventos
+
+    async def mes_utc(self, anio: int, mes: int) -> Dict:
+        """Eventos de un mes UTC; concurrentes para el mismo mes esperan un solo cálculo."""
+        clave = f"{anio:04d}-{mes:02d}"
+        eventos = self.memory.get(clave)
+        registrar_cache("calendario_lunar", "memoria", eventos is not None)
+        if eventos is not None:
+            return eventos
+        tarea = self._in_flight.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(self._calcular(anio, mes, clave))
+            self._in_flight[clave] = tarea
+            tarea.add_done_callback(lambda _: self._in_flight.pop(clave, None))
+        return await asyncio.shield(tarea)
+
+    async def mes_local(self, anio: int, mes: int, zona: Union[str, float] = 0.0) -> Dict:
+        """
+        Calendario del mes `anio`-`mes` en la hora local de `zona` (nombre
+        IANA u offset fijo en horas): fases, ingresos y períodos vacíos de
+        curso con fechas locales, y la fase y el signo lunar de cada día (al
+        mediodía local).
+        """
+        meses = await asyncio.gather(*(self.mes_utc(*_mes_relativo(anio, mes, d)) for d in (-1, 0, 1)))
+        fases = [f for m in meses for f in m["fases"]]
+        ingresos = [e for m in meses for e in m["ingresos"]]
+        vacios = [v for m in meses for v in m["vacios"]]
+
+        def local(jd: float) -> datetime:
+            utc = jd_a_fecha(jd).replace(tzinfo=None)
+            offset = zona if isinstance(zona, (int, float)) else offset_en_utc(zona, utc)
+            return utc + timedelta(hours=offset)
+
+        def en_mes(fecha: datetime) -> bool:
+            return (fecha.year, fecha.month) == (anio, mes)
+
+        def iso(fecha: datetime) -> str:
+            return fecha.isoformat(timespec="minutes")
+
+        fases_locales = [(local(f["jd"]), f) for f in fases]
+        ingresos_locales = [(local(e["jd"]), e) for e in ingresos]
+        resultado = {
+            "fases": [{**{k: v for k, v in f.items() if k != "jd"}, "fecha": iso(fecha)}
+                      for fecha, f in fases_locales if en_mes(fecha)],
+            "ingresos": [{"signo": e["signo"], "fecha": iso(fecha)}
+                         for fecha, e in ingresos_locales if en_mes(fecha)],
+            "vacios": []
+        }
+        for v in vacios:
+            inicio, fin = local(v["inicio_jd"]), local(v["fin_jd"])
+            if en_mes(inicio) or en_mes(fin):
+                resultado["vacios"].append({
+                    "inicio": iso(inicio),
+                    "fin": iso(fin),
+                    "signo": v["signo"],
+                    "ultimo_aspecto": {"planeta": v["planeta"], "aspecto": v["aspecto"]} if v["planeta"] else None
+                })
+
+        # Vista mensual: cada día con su fase y el signo de la Luna al
+        # mediodía, a partir de los eventos (sin calcular posiciones)
+        fechas_fases = [fecha for fecha, _ in fases_locales]
+        fechas_ingresos = [fecha for fecha, _ in ingresos_locales]
+        fase_del_dia = {fecha.date(): f["fase"] for fecha, f in fases_locales if en_mes(fecha)}
+        dias = []
+        dia = datetime(anio, mes, 1, 12)
+        while dia.month == mes:
+            i = bisect.bisect_right(fechas_fases, dia) - 1
+            j = bisect.bisect_right(fechas_ingresos, dia) - 1
+            dias.append({
+                "dia": dia.day,
+                "fase": fase_del_dia.get(dia.date()) or (
+                    FASES_INTERMEDIAS[fases_locales[i][1]["fase"]] if i >= 0 else None
+                ),
+                "signo": ingresos_locales[j][1]["signo"] if j >= 0 else None
+            })
+            dia += timedelta(days=1)
+        resultado["dias"] = dias
+        return resultado
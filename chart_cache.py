@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import swisseph as swe
+
+import db
+from lru import TTLCache
+from metrics import registrar_cache
+
+DB_PATH = os.getenv("CHART_CACHE_DB_PATH", "data/chart_cache.db")
+# Cartas guardadas en memoria
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "4096"))
+# Guardar también las cartas en SQLite (sobreviven a reinicios)
+CHART_CACHE_DISK = os.getenv("CHART_CACHE_DISK", "0") == "1"
+# Cartas máximas en SQLite; al superarlas se borran las de acceso más antiguo
+CHART_CACHE_MAX_ROWS = int(os.getenv("CHART_CACHE_MAX_ROWS", "100000"))
+# Tamaño máximo de los datos de la base en bytes (0 = sin límite)
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Decimales de lat/lon en la clave (~11 m con 4)
+COORD_PRECISION = 4
+
+
+def chart_key(y, m, d, h=12, mi=0, s=0, tz=0, lat=0.0, lon=0.0, opciones="placidus") -> str:
+    """
+    Clave canónica de una carta: el instante UT redondeado al segundo, las
+    coordenadas cuantizadas y las opciones de cálculo (sistemas de casas y
+    cuerpos extra). Entradas equivalentes (ej. 12:00 en UTC-3 y 15:00 en
+    UTC) dan la misma clave.
+    """
+    jd_ut = swe.julday(y, m, d, h + mi / 60 + s / 3600 - tz)
+    segundos = round(jd_ut * 86400)
+    canon = f"{segundos}|{round(lat, COORD_PRECISION)}|{round(lon, COORD_PRECISION)}|{opciones}"
+    return hashlib.sha256(canon.encode()).hexdigest()[:32]
+
+
+def etag_for(key: str, *extras) -> str:
+    """ETag fuerte para una respuesta derivada de la carta `key` y datos extra."""
+    payload = json.dumps([key, *extras], sort_keys=True, ensure_ascii=False, default=str)
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+
+def init_chart_db(db_path: str = DB_PATH):
+    """
+    Abre la base de caché de cartas y crea o actualiza su tabla. Las cartas
+    no vencen, pero `last_access` permite descartar las menos usadas cuando
+    la caché supera su tamaño máximo (ver cache_admin.mantener_cartas).
+    """
+    conn = db.connect(db_path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chart_cache (
+            key TEXT PRIMARY KEY,
+            chart TEXT,
+            timestamp REAL,
+            last_access REAL
+        )
+    ''')
+    # Bases creadas antes de existir last_access
+    columnas = {row[1] for row in conn.execute("PRAGMA table_info(chart_cache)")}
+    if "last_access" not in columnas:
+        conn.execute("ALTER TABLE chart_cache ADD COLUMN last_access REAL")
+        conn.execute("UPDATE chart_cache SET last_access = timestamp")
+    conn.execute("CREATE INDEX IF NOT EXISTS chart_cache_last_access ON chart_cache (last_access)")
+    conn.commit()
+    return conn
+
+
+class ChartCache:
+    """
+    Caché de cartas calculadas por clave canónica.
+
+    Tiene una capa LRU en memoria y, opcionalmente, una capa en SQLite que
+    se abre la primera vez que se usa. Las cartas no vencen: para las mismas
+    entradas el resultado es siempre el mismo.
+    """
+
+    def __init__(self, size: int = CHART_CACHE_SIZE, disk: bool = CHART_CACHE_DISK,
+                 db_path: str = DB_PATH):
+        self.memory = TTLCache(size, float("inf"))
+        self.disk = disk
+        self.db_path = db_path
+        self._db_conn = None
+        self.db_lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+    @property
+    def db_conn(self):
+        if self._db_conn is None and self.disk:
+            with self.db_lock:
+                if self._db_conn is None:
+                    self._db_conn = init_chart_db(self.db_path)
+        return self._db_conn
+
+    async def get(self, key: str) -> Optional[Dict]:
+        chart = self.memory.get(key)
+        registrar_cache("chart_cache", "memoria", chart is not None)
+        if chart is not None or not self.disk:
+            return chart
+        chart = await asyncio.to_thread(self._read_db_sync, key)
+        registrar_cache("chart_cache", "sqlite", chart is not None)
+        if chart is None:
+            self.disk_misses += 1
+            return None
+        self.disk_hits += 1
+        self.memory.set(key, chart)
+        return chart
+
+    async def set(self, key: str, chart: Dict):
+        self.memory.set(key, chart)
+        if self.disk:
+            await asyncio.to_thread(self._write_db_sync, key, chart)
+
+    def _read_db_sync(self, key: str) -> Optional[Dict]:
+        conn = self.db_conn
+        with self.db_lock:
+            row = conn.execute("SELECT chart FROM chart_cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                # Un acierto en disco sube la carta en memoria, así que se
+                # registra una sola vez mientras siga ahí
+                with conn:
+                    conn.execute("UPDATE chart_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]) if row else None
+
+    def _write_db_sync(self, key: str, chart: Dict):
+        conn = self.db_conn
+        ahora = time.time()
+        with self.db_lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chart_cache (key, chart, timestamp, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(chart, ensure_ascii=False), ahora, ahora)
+            )
+
+    def stats(self) -> Dict:
+        stats = {"memoria": self.memory.stats()}
+        if self.disk:
+            total = self.disk_hits + self.disk_misses
+            stats["disco"] = {
+                "hits": self.disk_hits,
+                "misses": self.disk_misses,
+                "hit_rate": round(self.disk_hits / total, 4) if total else 0.0
+            }
+        return stats
+
+
+# Instancia global de la caché de cartas
+chart_cache = ChartCache()
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import swisseph as swe
+
+from eventos import jd_a_fecha
+from executor import ExecutorSaturado
+from formatos import serializar
+from metrics import CIELO_SUSCRIPTORES, CIELO_TICKS
+from util import PLANETAS, SIGNS, _casas, _sign_index, calcular_aspectos, calcular_balance_elementos
+
+# Segundos entre actualizaciones del cielo actual
+CIELO_INTERVALO = float(os.getenv("CIELO_INTERVALO", "10"))
+# Decimales de lat/lon de cada suscriptor: con 1 (~10 km) los que están en
+# la misma ciudad comparten el cálculo de casas
+CIELO_COORD_DECIMALES = int(os.getenv("CIELO_COORD_DECIMALES", "1"))
+# Mensajes pendientes por suscriptor; un cliente lento saltea actualizaciones
+CIELO_COLA = int(os.getenv("CIELO_COLA", "2"))
+
+_JD_UNIX = 2440587.5
+
+Ubicacion = Optional[Tuple[float, float]]
+
+
+def cielo_en(jd_ut: float, ubicaciones: Iterable[Tuple[float, float]] = (), sistema_casas: str = "placidus") -> Dict:
+    """
+    Posiciones, aspectos y balance de elementos en `jd_ut` (una sola vez para
+    todos), y casas y ascendente para cada ubicación distinta.
+    """
+    planetas = {}
+    posiciones = {}
+    for nombre, id_planeta in PLANETAS.items():
+        res = swe.calc_ut(jd_ut, id_planeta, swe.FLG_SWIEPH | swe.FLG_SPEED)[0]
+        planetas[nombre] = {
+            "signo": SIGNS[_sign_index(res[0])],
+            "grado": round(res[0], 4),
+            "retrogrado": res[3] < 0
+        }
+        posiciones[nombre] = res[0]
+    casas = {}
+    for lat, lon in ubicaciones:
+        casas_ubicacion, ascendente = _casas(jd_ut, lat, lon, sistema_casas)
+        casas[(lat, lon)] = {
+            "ubicacion": {"latitud": lat, "longitud": lon},
+            "casas": casas_ubicacion,
+            "ascendente": ascendente
+        }
+    return {
+        "cielo": {
+            "jd": round(jd_ut, 6),
+            "fecha": jd_a_fecha(jd_ut).isoformat(timespec="seconds"),
+            "planetas": planetas,
+            "aspectos": calcular_aspectos(posiciones),
+            "balance_elementos": calcular_balance_elementos(planetas)
+        },
+        "casas": casas
+    }
+
+
+def _evento_sse(evento: str, datos: Dict, id_evento: int) -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (id_evento, evento.encode(), serializar(datos, "json"))
+
+
+class CieloEnVivo:
+    """
+    Cielo actual para muchos espectadores con un solo cálculo por tick.
+
+    Una tarea de fondo por proceso calcula cada CIELO_INTERVALO segundos las
+    posiciones y aspectos (un trabajo en el executor de cartas), los
+    serializa una vez como evento SSE y pone los mismos bytes en la cola de
+    cada suscriptor. Las casas se calculan una vez por ubicación distinta
+    (redondeada a CIELO_COORD_DECIMALES). La tarea solo corre mientras haya
+    suscriptores, así que el costo crece con los ticks y las ubicaciones, no
+    con los espectadores.
+    """
+
+    def __init__(self, executor, intervalo: float = CIELO_INTERVALO, cola: int = CIELO_COLA,
+                 decimales: int = CIELO_COORD_DECIMALES):
+        self.executor = executor
+        self.intervalo = intervalo
+        self.cola = cola
+        self.decimales = decimales
+        # Ubicación (o None, sin casas) -> colas de sus suscriptores
+        self.suscriptores: Dict[Ubicacion, Set[asyncio.Queue]] = {}
+        self.ticks = 0
+        self._ultimo: Optional[bytes] = None
+        self._casas: Dict[Ubicacion, bytes] = {}
+        self._tarea: Optional[asyncio.Task] = None
+
+    def _ubicacion(self, lat: Optional[float], lon: Optional[float]) -> Ubicacion:
+        if lat is None or lon is None:
+            return None
+        return round(lat, self.decimales), round(lon, self.decimales)
+
+    def suscribir(self, lat: Optional[float] = None, lon: Optional[float] = None) -> Tuple[asyncio.Queue, Ubicacion]:
+        """Cola que recibe cada actualización; empieza con la última si ya hay una."""
+        ubicacion = self._ubicacion(lat, lon)
+        cola = asyncio.Queue(maxsize=self.cola)
+        self.suscriptores.setdefault(ubicacion, set()).add(cola)
+        CIELO_SUSCRIPTORES.inc()
+        # Una ubicación nueva recibe sus casas en el próximo tick
+        if self._ultimo is not None:
+            cola.put_nowait(self._ultimo + self._casas.get(ubicacion, b""))
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._bucle())
+        return cola, ubicacion
+
+    def desuscribir(self, cola: asyncio.Queue, ubicacion: Ubicacion):
+        colas = self.suscriptores.get(ubicacion)
+        if colas is None or cola not in colas:
+            return
+        colas.discard(cola)
+        CIELO_SUSCRIPTORES.dec()
+        if not colas:
+            del self.suscriptores[ubicacion]
+            self._casas.pop(ubicacion, None)
+
+    @property
+    def total_suscriptores(self) -> int:
+        return sum(len(colas) for colas in self.suscriptores.values())
+
+    async def _tick(self):
+        jd = _JD_UNIX + time.time() / 86400
+        ubicaciones = [u for u in self.suscriptores if u is not None]
+        resultado = await self.executor.run(cielo_en, jd, ubicaciones)
+        self.ticks += 1
+        CIELO_TICKS.inc()
+        # Serializar una vez por tick y por ubicación, no por suscriptor
+        self._ultimo = _evento_sse("cielo", resultado["cielo"], self.ticks)
+        self._casas = {
+            ubicacion: _evento_sse("casas", casas, self.ticks)
+            for ubicacion, casas in resultado["casas"].items()
+        }
+        for ubicacion, colas in list(self.suscriptores.items()):
+            mensaje = self._ultimo + self._casas.get(ubicacion, b"")
+            for cola in colas:
+                if cola.full():
+                    # Cliente lento: se descarta la actualización más vieja
+                    cola.get_nowait()
+                cola.put_nowait(mensaje)
+
+    async def _bucle(self):
+        while self.suscriptores:
+            inicio = time.monotonic()
+            try:
+                await self._tick()
+            except ExecutorSaturado:
+                pass
+            except Exception as e:
+                print(f"❌ Error calculando el cielo actual: {e}")
+            await asyncio.sleep(max(0.0, self.intervalo - (time.monotonic() - inicio)))
+        # Sin suscriptores: el próximo en llegar no debe recibir datos viejos
+        self._ultimo = None
+        self._casas = {}
+
+    def resumen(self) -> Dict:
+        return {
+            "suscriptores": self.total_suscriptores,
+            "ubicaciones": len([u for u in self.suscriptores if u is not None]),
+            "ticks": self.ticks,
+            "intervalo_s": self.intervalo
+        }
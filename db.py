@@ -0,0 +1,23 @@
+import os
+import sqlite3
+
+# Milisegundos que una conexión espera un lock de escritura antes de fallar
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Abre una base SQLite preparada para varios procesos a la vez (uvicorn
+    con --workers): WAL permite leer mientras otro proceso escribe, y
+    busy_timeout hace que un escritor espere el lock en lugar de fallar con
+    "database is locked".
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    # Solo tiene efecto en una base nueva, y antes de pasar a WAL: permite
+    # liberar páginas con PRAGMA incremental_vacuum (ver cache_admin)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    # Con WAL, NORMAL no pierde consistencia y evita un fsync por commit
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
@@ -0,0 +1,122 @@
+import gzip
+import hashlib
+import os
+import re
+from typing import Dict, Optional
+
+import brotli
+from fastapi.responses import Response
+
+from formatos import negociar_codificacion
+
+# Sacar el <style> y los <script> inline del HTML a assets con huella
+ESTATICOS_SEPARAR = os.getenv("ESTATICOS_SEPARAR", "1") == "1"
+# Segundos de caché de los assets con huella (su URL cambia si cambia el contenido)
+ESTATICOS_MAX_AGE = int(os.getenv("ESTATICOS_MAX_AGE", str(365 * 24 * 60 * 60)))
+
+_STYLE_INLINE = re.compile(r"<style>(.*?)</style>", re.DOTALL)
+_SCRIPT_INLINE = re.compile(r"<script>(.*?)</script>", re.DOTALL)
+
+_MEDIA_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8"
+}
+
+
+def _huella(contenido: bytes) -> str:
+    return hashlib.sha256(contenido).hexdigest()[:16]
+
+
+class _Recurso:
+    """Un archivo en memoria con sus variantes precomprimidas."""
+
+    __slots__ = ("media_type", "cache_control", "huella", "variantes")
+
+    def __init__(self, contenido: bytes, media_type: str, cache_control: str):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.huella = _huella(contenido)
+        self.variantes: Dict[Optional[str], bytes] = {None: contenido}
+        # Se comprime una sola vez, así que se usa el nivel máximo
+        for codificacion, comprimido in (
+            ("br", brotli.compress(contenido, quality=11)),
+            ("gzip", gzip.compress(contenido, compresslevel=9, mtime=0))
+        ):
+            if len(comprimido) < len(contenido):
+                self.variantes[codificacion] = comprimido
+
+    def etag(self, codificacion: Optional[str]) -> str:
+        # ETag fuerte: cada codificación es una representación distinta
+        return f'"{self.huella}-{codificacion}"' if codificacion else f'"{self.huella}"'
+
+
+class Estaticos:
+    """
+    Frontend servido desde memoria.
+
+    Al cargar una página, su `<style>` y sus `<script>` inline se separan en
+    assets `/assets/<nombre>.<huella>.<ext>` con caché larga e inmutable; la
+    página queda con `Cache-Control: no-cache` y se revalida con su ETag.
+    Todo se precomprime con brotli y gzip al iniciar, y se responde 304 si
+    el cliente ya tiene la versión actual.
+    """
+
+    def __init__(self, separar: bool = ESTATICOS_SEPARAR, max_age: int = ESTATICOS_MAX_AGE):
+        self.separar = separar
+        self.max_age = max_age
+        self.paginas: Dict[str, _Recurso] = {}
+        self.assets: Dict[str, _Recurso] = {}
+
+    def _asset(self, base: str, ext: str, contenido: str) -> str:
+        datos = contenido.encode("utf-8")
+        recurso = _Recurso(datos, _MEDIA_TYPES[ext], f"public, max-age={self.max_age}, immutable")
+        nombre = f"{base}.{recurso.huella}{ext}"
+        self.assets[nombre] = recurso
+        return f"/assets/{nombre}"
+
+    def cargar(self, path: str) -> _Recurso:
+        """Lee la página `path`, separa sus assets inline y la deja precomprimida."""
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        base = os.path.splitext(os.path.basename(path))[0]
+        if self.separar:
+            html = _STYLE_INLINE.sub(
+                lambda m: f'<link rel="stylesheet" href="{self._asset(base, ".css", m.group(1))}" />', html
+            )
+            html = _SCRIPT_INLINE.sub(
+                lambda m: f'<script src="{self._asset(base, ".js", m.group(1))}"></script>', html
+            )
+        recurso = _Recurso(html.encode("utf-8"), _MEDIA_TYPES[".html"], "no-cache")
+        self.paginas[path] = recurso
+        print(f"📄 {path} cargado: {len(self.assets)} assets, "
+              f"{len(recurso.variantes[None])} bytes ({len(recurso.variantes.get('br', b''))} con brotli)")
+        return recurso
+
+    def responder(self, recurso: Optional[_Recurso], request) -> Response:
+        if recurso is None:
+            return Response(status_code=404)
+        codificacion = negociar_codificacion(request.headers.get("accept-encoding", ""))
+        if codificacion not in recurso.variantes:
+            codificacion = None
+        etag = recurso.etag(codificacion)
+        headers = {"ETag": etag, "Cache-Control": recurso.cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in if_none_match or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+        if codificacion:
+            headers["Content-Encoding"] = codificacion
+        return Response(recurso.variantes[codificacion], media_type=recurso.media_type, headers=headers)
+
+    def pagina(self, path: str, request) -> Response:
+        recurso = self.paginas.get(path)
+        if recurso is None:
+            recurso = self.cargar(path)
+        return self.responder(recurso, request)
+
+    def asset(self, nombre: str, request) -> Response:
+        return self.responder(self.assets.get(nombre), request)
+
+
+# Instancia global del frontend
+estaticos = Estaticos()
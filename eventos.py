@@ -0,0 +1,203 @@
+import swisseph as swe
+from datetime import datetime, timedelta, timezone
+
+from util import ASPECTOS, PLANETAS, SIGNS
+
+# Paso de muestreo en días por planeta. Debe ser bastante menor que la
+# duración de un período retrógrado y que el tiempo en recorrer 180°.
+PASOS = {
+    "sol": 2.0,
+    "luna": 1.0,
+    "mercurio": 1.0,
+    "venus": 1.0,
+    "marte": 2.0,
+    "jupiter": 4.0,
+    "saturno": 4.0,
+    "urano": 4.0,
+    "neptuno": 4.0,
+    "pluton": 4.0
+}
+
+# Precisión del instante de cada evento, en días (~0.1 segundos)
+TOLERANCIA = 1e-6
+
+TIPOS_EVENTO = ("aspecto", "ingreso", "estacion")
+
+_FLAGS = swe.FLG_SWIEPH | swe.FLG_SPEED
+_JD_UNIX = 2440587.5
+
+
+def _posicion(jd, id_planeta):
+    res = swe.calc_ut(jd, id_planeta, _FLAGS)[0]
+    return res[0], res[3]
+
+
+def _diferencia(grado, objetivo):
+    """Diferencia angular en (-180, 180]."""
+    d = (grado - objetivo) % 360
+    return d - 360 if d > 180 else d
+
+
+def jd_a_fecha(jd):
+    """Convierte un día juliano (UT) a datetime UTC."""
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=jd - _JD_UNIX)
+
+
+def _refinar(f, a, b, fa, fb):
+    """
+    Raíz de `f` en [a, b] con fa y fb de signo opuesto (método Illinois:
+    secante con salvaguarda, converge como la secante y nunca sale del
+    intervalo como la bisección).
+    """
+    lado = 0
+    while b - a > TOLERANCIA:
+        c = b - fb * (b - a) / (fb - fa)
+        if not (a < c < b):
+            c = (a + b) / 2
+        fc = f(c)
+        if fc == 0:
+            return c
+        if (fc > 0) == (fb > 0):
+            b, fb = c, fc
+            if lado == -1:
+                fa /= 2
+            lado = -1
+        else:
+            a, fa = c, fc
+            if lado == 1:
+                fb /= 2
+            lado = 1
+    return (a + b) / 2
+
+
+def _muestrear(planeta, jd_inicio, jd_fin):
+    """
+    Muestras (jd, longitud, velocidad) del planeta con un paso acorde a su
+    velocidad, incluyendo sus estaciones. Los eventos se acotan entre dos
+    muestras y luego se refinan, así que el costo crece con la cantidad de
+    eventos y no con la resolución pedida.
+    """
+    id_planeta = PLANETAS[planeta]
+    paso = PASOS.get(planeta, 1.0)
+    n = max(1, int((jd_fin - jd_inicio) / paso) + 1)
+    jds = [jd_inicio + i * (jd_fin - jd_inicio) / n for i in range(n + 1)]
+    muestras = [(jd,) + _posicion(jd, id_planeta) for jd in jds]
+
+    # Insertar las estaciones: entre dos muestras consecutivas el
+    # movimiento queda monótono y cada grado se cruza a lo sumo una vez.
+    estaciones = []
+    resultado = [muestras[0]]
+    for previa, actual in zip(muestras, muestras[1:]):
+        if (previa[2] > 0) != (actual[2] > 0):
+            jd = _refinar(lambda t: _posicion(t, id_planeta)[1],
+                          previa[0], actual[0], previa[2], actual[2])
+            estacion = (jd,) + _posicion(jd, id_planeta)
+            estaciones.append((estacion, actual[2] < 0))
+            resultado.append(estacion)
+        resultado.append(actual)
+    return resultado, estaciones
+
+
+def _cruces(planeta, muestras, objetivo):
+    """Instantes en que el planeta pasa exactamente por el grado `objetivo`."""
+    id_planeta = PLANETAS[planeta]
+    f = lambda t: _diferencia(_posicion(t, id_planeta)[0], objetivo)
+    instantes = []
+    for previa, actual in zip(muestras, muestras[1:]):
+        fa = _diferencia(previa[1], objetivo)
+        fb = _diferencia(actual[1], objetivo)
+        # Un salto de ±180 es el lado opuesto del círculo, no un cruce
+        if fa == 0:
+            instantes.append(previa[0])
+        elif (fa < 0) != (fb < 0) and fb != 0 and abs(fa - fb) < 180:
+            instantes.append(_refinar(f, previa[0], actual[0], fa, fb))
+    if muestras and _diferencia(muestras[-1][1], objetivo) == 0:
+        instantes.append(muestras[-1][0])
+    return instantes
+
+
+def _evento(tipo, planeta, jd, **datos):
+    longitud, velocidad = _posicion(jd, PLANETAS[planeta])
+    evento = {
+        "tipo": tipo,
+        "planeta": planeta,
+        "jd": round(jd, 6),
+        "fecha": jd_a_fecha(jd).isoformat(timespec="seconds"),
+        "longitud": round(longitud, 4) % 360,
+        "retrogrado": velocidad < 0
+    }
+    evento.update(datos)
+    return evento
+
+
+def buscar_estaciones(planeta, jd_inicio, jd_fin, muestras=None):
+    """Momentos en que el planeta se vuelve retrógrado o directo."""
+    if muestras is None:
+        muestras = _muestrear(planeta, jd_inicio, jd_fin)
+    return [
+        _evento("estacion", planeta, estacion[0],
+                direccion="retrograda" if a_retrogrado else "directa")
+        for estacion, a_retrogrado in muestras[1]
+    ]
+
+
+def buscar_ingresos(planeta, jd_inicio, jd_fin, muestras=None):
+    """Momentos en que el planeta entra en un signo."""
+    if muestras is None:
+        muestras = _muestrear(planeta, jd_inicio, jd_fin)
+    eventos = []
+    for indice in range(12):
+        for jd in _cruces(planeta, muestras[0], indice * 30):
+            _, velocidad = _posicion(jd, PLANETAS[planeta])
+            # En retrógrado, cruzar el inicio de un signo es entrar al anterior
+            signo = SIGNS[indice] if velocidad >= 0 else SIGNS[(indice - 1) % 12]
+            eventos.append(_evento("ingreso", planeta, jd, signo=signo))
+    return eventos
+
+
+def buscar_aspectos(planeta, grado_natal, jd_inicio, jd_fin, aspectos=None,
+                    muestras=None, planeta_natal=None):
+    """Momentos en que el planeta en tránsito forma un aspecto exacto con `grado_natal`."""
+    if muestras is None:
+        muestras = _muestrear(planeta, jd_inicio, jd_fin)
+    eventos = []
+    for angulo, nombre_asp, _ in ASPECTOS:
+        if aspectos and nombre_asp not in aspectos:
+            continue
+        # Redondeados: en la conjunción y la oposición los dos objetivos son
+        # el mismo grado, pero el % en float puede diferir en el último bit
+        objetivos = {round((grado_natal + signo * angulo) % 360, 9) % 360 for signo in (1, -1)}
+        for objetivo in objetivos:
+            for jd in _cruces(planeta, muestras[0], objetivo):
+                eventos.append(_evento(
+                    "aspecto", planeta, jd,
+                    aspecto=nombre_asp,
+                    planeta_natal=planeta_natal,
+                    grado_natal=round(grado_natal, 4)
+                ))
+    return eventos
+
+
+def longitud_natal(planeta, y, m, d, h=12, mi=0, s=0, tz=0):
+    """Longitud de un planeta en una fecha local, con la misma convención que get_chart."""
+    jd_ut = swe.julday(y, m, d, h + mi / 60 + s / 3600 - tz)
+    return _posicion(jd_ut, PLANETAS[planeta])[0]
+
+
+def buscar_eventos(planeta, jd_inicio, jd_fin, tipos=TIPOS_EVENTO, grado_natal=None,
+                   aspectos=None, planeta_natal=None):
+    """
+    Todos los eventos pedidos del planeta entre dos días julianos (UT),
+    ordenados por fecha. Los aspectos solo se buscan si se da `grado_natal`.
+    """
+    muestras = _muestrear(planeta, jd_inicio, jd_fin)
+    eventos = []
+    if "estacion" in tipos:
+        eventos += buscar_estaciones(planeta, jd_inicio, jd_fin, muestras)
+    if "ingreso" in tipos:
+        eventos += buscar_ingresos(planeta, jd_inicio, jd_fin, muestras)
+    if "aspecto" in tipos and grado_natal is not None:
+        eventos += buscar_aspectos(planeta, grado_natal, jd_inicio, jd_fin, aspectos,
+                                   muestras, planeta_natal)
+    eventos.sort(key=lambda e: e["jd"])
+    return eventos
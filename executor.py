@@ -0,0 +1,109 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import EXECUTOR_CAPACIDAD, EXECUTOR_EN_CURSO
+
+# Con varios workers de uvicorn (WEB_CONCURRENCY) los núcleos se reparten
+# entre ellos, para no tener más procesos de cálculo que núcleos
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", max(1, (os.cpu_count() or 1) // max(1, WEB_CONCURRENCY))))
+CHART_QUEUE_LIMIT = int(os.getenv("CHART_QUEUE_LIMIT", "64"))
+CHART_RETRY_AFTER = int(os.getenv("CHART_RETRY_AFTER", "1"))
+
+
+class ExecutorSaturado(Exception):
+    """Se lanza cuando el executor ya tiene tantos trabajos como admite."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("El servidor está procesando demasiadas cartas")
+        self.retry_after = retry_after
+
+
+def _init_worker():
+    """Inicializa cada proceso: importar util configura Swiss Ephemeris."""
+    import util  # noqa: F401
+
+
+def _precalentar_worker() -> int:
+    """Carga en el worker el TimezoneFinder y las efemérides con una carta de prueba."""
+    from datetime import datetime
+    import util
+    util.get_timezone_offset(-34.6037, -58.3816, datetime(2000, 1, 1, 12))
+    util.get_chart(2000, 1, 1)
+    return os.getpid()
+
+
+class ChartExecutor:
+    """
+    Pool de procesos acotado para el cálculo de cartas.
+
+    pyswisseph guarda estado global, así que cada worker es un proceso
+    propio. Se admiten como máximo `workers + queue_limit` trabajos a la
+    vez; los que exceden ese límite se rechazan de inmediato con
+    `ExecutorSaturado` en lugar de acumular latencia.
+    """
+
+    def __init__(self, workers: int = CHART_WORKERS, queue_limit: int = CHART_QUEUE_LIMIT,
+                 retry_after: int = CHART_RETRY_AFTER):
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self.retry_after = retry_after
+        self._pool = None
+        self._en_curso = 0
+
+    @property
+    def capacidad(self) -> int:
+        return self.workers + self.queue_limit
+
+    @property
+    def en_curso(self) -> int:
+        return self._en_curso
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+            # Se publica al crear el pool y no en __init__: los procesos del
+            # pool también importan este módulo y no deben sumar capacidad
+            EXECUTOR_CAPACIDAD.set(self.capacidad)
+        return self._pool
+
+    async def run(self, fn, *args):
+        """Ejecuta `fn(*args)` en el pool, o falla rápido si está saturado."""
+        if self._en_curso >= self.capacidad:
+            raise ExecutorSaturado(self.retry_after)
+        self._en_curso += 1
+        EXECUTOR_EN_CURSO.inc()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self._en_curso -= 1
+            EXECUTOR_EN_CURSO.dec()
+
+    async def precalentar(self) -> int:
+        """
+        Arranca los procesos del pool y carga en ellos los módulos pesados,
+        para que el primer pedido no pague ese costo. Devuelve cuántos
+        procesos distintos quedaron listos.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(pool, _precalentar_worker) for _ in range(self.workers)
+        ))
+        return len(set(pids))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Instancia global del executor
+chart_executor = ChartExecutor()
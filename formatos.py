@@ -0,0 +1,189 @@
+import gzip
+import os
+import zlib
+from typing import Dict, Optional
+
+import brotli
+import msgpack
+import orjson
+from fastapi.responses import Response
+
+from util import ASPECTOS, NIVELES_BALANCE, NOMBRES_ELEMENTOS, SIGNS
+
+# Formatos de respuesta: el JSON de siempre o MessagePack compacto
+MEDIA_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack"
+}
+# Cuerpos más chicos que esto no se comprimen
+COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "512"))
+# Calidad de brotli (0-11): 4 comprime parecido a gzip -6 pero más rápido
+COMPRESION_BROTLI_CALIDAD = int(os.getenv("COMPRESION_BROTLI_CALIDAD", "4"))
+COMPRESION_GZIP_NIVEL = int(os.getenv("COMPRESION_GZIP_NIVEL", "6"))
+
+# Versión del esquema compacto (cambia si cambia el significado de los índices)
+VERSION_COMPACTA = 1
+
+_INDICE_SIGNO = {signo: i for i, signo in enumerate(SIGNS)}
+_INDICE_ASPECTO = {nombre: i for i, (_, nombre, _) in enumerate(ASPECTOS)}
+_INDICE_BALANCE = {nivel: i for i, nivel in enumerate(NIVELES_BALANCE)}
+
+
+def _preferencias(header: str) -> Dict[str, float]:
+    """Valores de un encabezado Accept* con su calidad: 'a;q=0.5, b' -> {'a': 0.5, 'b': 1.0}."""
+    preferencias = {}
+    for parte in header.lower().split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.strip().partition("=")
+            if clave == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        if nombre:
+            preferencias[nombre.strip()] = calidad
+    return preferencias
+
+
+def negociar_formato(accept: str, formato: Optional[str] = None) -> str:
+    """
+    Formato de la respuesta: el parámetro `formato` si se indicó; si no, el
+    de MEDIA_TYPES con mayor calidad en `Accept`. Por defecto, json.
+    """
+    if formato in MEDIA_TYPES:
+        return formato
+    preferencias = _preferencias(accept)
+    mejor, calidad_mejor = "json", preferencias.get(MEDIA_TYPES["json"], 0.0)
+    for nombre, media_type in MEDIA_TYPES.items():
+        calidad = max(preferencias.get(media_type, 0.0), preferencias.get(media_type.replace("/", "/x-"), 0.0))
+        if calidad > calidad_mejor:
+            mejor, calidad_mejor = nombre, calidad
+    return mejor
+
+
+def negociar_codificacion(accept_encoding: str) -> Optional[str]:
+    """'br' o 'gzip' según `Accept-Encoding` (brotli tiene prioridad), o None."""
+    preferencias = _preferencias(accept_encoding)
+    for codificacion in ("br", "gzip"):
+        if preferencias.get(codificacion, 0) > 0:
+            return codificacion
+    return None
+
+
+def _compactar_casas(casas: Dict) -> Dict:
+    return {
+        "grados": [casa["grado"] for casa in casas.values()],
+        "signos": [_INDICE_SIGNO[casa["signo"]] for casa in casas.values()]
+    }
+
+
+def compactar_carta(carta: Dict) -> Dict:
+    """
+    Variante compacta de una carta de get_chart: columnas en lugar de
+    objetos por planeta y casa, e índices en lugar de nombres repetidos.
+
+    - `signos`, `casas.signos` y `ascendente`: índices en SIGNS
+    - `aspectos`: [cuerpo1, cuerpo2, aspecto, orbe] con índices en `cuerpos` y ASPECTOS
+    - `elementos`: cantidad de planetas por elemento, en el orden de NOMBRES_ELEMENTOS
+    - `balance`: índice en NIVELES_BALANCE
+
+    Los datos derivables (elemento y cualidad de cada signo, el resumen del
+    balance) se omiten.
+    """
+    if "planetas" not in carta:
+        # Errores y otras respuestas sin carta van tal cual
+        return carta
+    cuerpos = list(carta["planetas"])
+    indice_cuerpo = {nombre: i for i, nombre in enumerate(cuerpos)}
+    balance = carta["balance_elementos"]
+    compacta = {
+        "v": VERSION_COMPACTA,
+        "cuerpos": cuerpos,
+        "grados": [carta["planetas"][nombre]["grado"] for nombre in cuerpos],
+        "signos": [_INDICE_SIGNO[carta["planetas"][nombre]["signo"]] for nombre in cuerpos],
+        "casas": _compactar_casas(carta["casas"]),
+        "ascendente": _INDICE_SIGNO[carta["ascendente"]],
+        "aspectos": [
+            [indice_cuerpo[a["planeta1"]], indice_cuerpo[a["planeta2"]], _INDICE_ASPECTO[a["aspecto"]], a["orbe"]]
+            for a in carta["aspectos"]
+        ],
+        "elementos": [balance["elementos"][elemento]["cantidad"] for elemento in NOMBRES_ELEMENTOS],
+        "balance": _INDICE_BALANCE[balance["balance_general"]]
+    }
+    if "sistemas_casas" in carta:
+        compacta["sistemas_casas"] = {
+            sistema: {**_compactar_casas(datos["casas"]), "ascendente": _INDICE_SIGNO[datos["ascendente"]]}
+            for sistema, datos in carta["sistemas_casas"].items()
+        }
+    for clave in ("ubicacion", "zona_horaria"):
+        if clave in carta:
+            compacta[clave] = carta[clave]
+    return compacta
+
+
+def serializar(contenido, formato: str) -> bytes:
+    """JSON con orjson, o MessagePack (floats de 32 bits, ~7 dígitos significativos)."""
+    if formato == "msgpack":
+        return msgpack.packb(contenido, use_single_float=True)
+    return orjson.dumps(contenido)
+
+
+def comprimir(cuerpo: bytes, codificacion: Optional[str]) -> bytes:
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=COMPRESION_BROTLI_CALIDAD)
+    if codificacion == "gzip":
+        return gzip.compress(cuerpo, compresslevel=COMPRESION_GZIP_NIVEL)
+    return cuerpo
+
+
+class CompresorStream:
+    """Compresión incremental de una respuesta en streaming; cada trozo se envía de inmediato."""
+
+    def __init__(self, codificacion: Optional[str]):
+        self.codificacion = codificacion
+        if codificacion == "br":
+            self._compresor = brotli.Compressor(quality=COMPRESION_BROTLI_CALIDAD)
+        elif codificacion == "gzip":
+            self._compresor = zlib.compressobj(COMPRESION_GZIP_NIVEL, zlib.DEFLATED, 31)
+        else:
+            self._compresor = None
+
+    def comprimir(self, trozo: bytes) -> bytes:
+        if self.codificacion == "br":
+            return self._compresor.process(trozo) + self._compresor.flush()
+        if self.codificacion == "gzip":
+            return self._compresor.compress(trozo) + self._compresor.flush(zlib.Z_SYNC_FLUSH)
+        return trozo
+
+    def cerrar(self) -> bytes:
+        if self.codificacion == "br":
+            return self._compresor.finish()
+        if self.codificacion == "gzip":
+            return self._compresor.flush()
+        return b""
+
+
+def cabeceras(codificacion: Optional[str]) -> Dict[str, str]:
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if codificacion:
+        headers["Content-Encoding"] = codificacion
+    return headers
+
+
+def respuesta(contenido, formato: str, codificacion: Optional[str], headers: Optional[Dict] = None,
+              status_code: int = 200) -> Response:
+    """
+    Serializa `contenido` en `formato` y lo comprime con `codificacion` si
+    el cuerpo supera COMPRESION_MIN_BYTES.
+    """
+    cuerpo = serializar(contenido, formato)
+    if len(cuerpo) < COMPRESION_MIN_BYTES:
+        codificacion = None
+    return Response(
+        comprimir(cuerpo, codificacion),
+        status_code=status_code,
+        media_type=MEDIA_TYPES[formato],
+        headers={**cabeceras(codificacion), **(headers or {})}
+    )
@@ -0,0 +1,203 @@
+import math
+import os
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Dump de GeoNames (ej. data/cities15000.txt). Si no se define, no se usa.
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "")
+# Indexar también los nombres alternativos ("Londres" -> London)
+GAZETTEER_ALTERNATES = os.getenv("GAZETTEER_ALTERNATES", "1") == "1"
+
+# Largo máximo de prefijo con el top precalculado (los prefijos cortos
+# abarcan miles de nombres; así se responden sin recorrerlos)
+_PREFIJO_PRECALCULADO = 3
+_TOP_POR_PREFIJO = 20
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin diacríticos y con espacios simples: 'Córdoba ' -> 'cordoba'."""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_marcas = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_marcas.lower().split())
+
+
+def _trigramas(texto: str):
+    texto = f"  {texto} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _leer_tabla(path: str, clave: int, valor: int) -> Dict[str, str]:
+    """Lee un archivo auxiliar de GeoNames (tabulado, con comentarios '#')."""
+    tabla = {}
+    if not os.path.exists(path):
+        return tabla
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            if linea.startswith("#"):
+                continue
+            campos = linea.rstrip("\n").split("\t")
+            if len(campos) > max(clave, valor):
+                tabla[campos[clave]] = campos[valor]
+    return tabla
+
+
+class Gazetteer:
+    """
+    Índice local de ciudades cargado desde un dump de GeoNames.
+
+    Los datos numéricos se guardan en arrays compactos y los nombres
+    normalizados en una lista ordenada, así que la búsqueda por prefijo es
+    una búsqueda binaria. Para consultas sin coincidencia de prefijo hay un
+    índice de trigramas. Los resultados se ordenan por población.
+    """
+
+    def __init__(self):
+        self.nombres: List[str] = []
+        self.estados: List[str] = []
+        self.paises: List[str] = []
+        self.codigos_pais: List[str] = []
+        self.lat = array("d")
+        self.lon = array("d")
+        self.poblacion = array("q")
+        self._claves: List[str] = []
+        self._ids = array("I")
+        self._top_prefijos: Dict[str, array] = {}
+        self._trigramas: Dict[str, array] = {}
+
+    def __len__(self):
+        return len(self.nombres)
+
+    @classmethod
+    def from_geonames(cls, path: str) -> "Gazetteer":
+        """
+        Carga un dump `citiesNNNN.txt` de GeoNames. Si en el mismo directorio
+        están `admin1CodesASCII.txt` y `countryInfo.txt`, se usan para los
+        nombres de provincia/estado y de país.
+        """
+        directorio = os.path.dirname(path)
+        estados = _leer_tabla(os.path.join(directorio, "admin1CodesASCII.txt"), 0, 1)
+        paises = _leer_tabla(os.path.join(directorio, "countryInfo.txt"), 0, 4)
+
+        gaz = cls()
+        entradas = []
+        trigramas = {}
+        with open(path, encoding="utf-8") as f:
+            for linea in f:
+                campos = linea.rstrip("\n").split("\t")
+                if len(campos) < 15:
+                    continue
+                idx = len(gaz.nombres)
+                nombre, ascii_nombre, alternativos = campos[1], campos[2], campos[3]
+                codigo = campos[8]
+                gaz.nombres.append(nombre)
+                gaz.estados.append(estados.get(f"{codigo}.{campos[10]}", campos[10]))
+                gaz.paises.append(paises.get(codigo, codigo))
+                gaz.codigos_pais.append(codigo.lower())
+                gaz.lat.append(float(campos[4]))
+                gaz.lon.append(float(campos[5]))
+                gaz.poblacion.append(int(campos[14] or 0))
+
+                principal = normalizar(nombre)
+                claves = {principal, normalizar(ascii_nombre)}
+                if GAZETTEER_ALTERNATES and alternativos:
+                    claves.update(normalizar(a) for a in alternativos.split(","))
+                claves.discard("")
+                entradas.extend((clave, idx) for clave in claves)
+
+                for trigrama in _trigramas(principal):
+                    trigramas.setdefault(trigrama, array("I")).append(idx)
+
+        entradas.sort()
+        gaz._claves = [clave for clave, _ in entradas]
+        gaz._ids = array("I", (idx for _, idx in entradas))
+        gaz._trigramas = trigramas
+
+        # Top por población para los prefijos cortos
+        candidatos: Dict[str, set] = {}
+        for clave, idx in entradas:
+            for n in range(1, min(len(clave), _PREFIJO_PRECALCULADO) + 1):
+                candidatos.setdefault(clave[:n], set()).add(idx)
+        for prefijo, ids in candidatos.items():
+            top = sorted(ids, key=gaz.poblacion.__getitem__, reverse=True)[:_TOP_POR_PREFIJO]
+            gaz._top_prefijos[prefijo] = array("I", top)
+        return gaz
+
+    def _rango(self, prefijo: str) -> Tuple[int, int]:
+        inicio = bisect_left(self._claves, prefijo)
+        fin = bisect_left(self._claves, prefijo + "\uffff", inicio)
+        return inicio, fin
+
+    def _por_prefijo(self, prefijo: str, limit: int) -> List[int]:
+        if len(prefijo) <= _PREFIJO_PRECALCULADO and limit <= _TOP_POR_PREFIJO:
+            return list(self._top_prefijos.get(prefijo, ()))[:limit]
+        inicio, fin = self._rango(prefijo)
+        ids = set(self._ids[inicio:fin])
+        return sorted(ids, key=self.poblacion.__getitem__, reverse=True)[:limit]
+
+    def _por_trigramas(self, consulta: str, limit: int, excluir) -> List[int]:
+        trigramas = _trigramas(consulta)
+        conteo = Counter()
+        for trigrama in trigramas:
+            conteo.update(self._trigramas.get(trigrama, ()))
+        minimo = (len(trigramas) + 1) // 2
+        candidatos = [idx for idx, n in conteo.items() if n >= minimo and idx not in excluir]
+        candidatos.sort(key=lambda idx: (conteo[idx], self.poblacion[idx]), reverse=True)
+        return candidatos[:limit]
+
+    def _ciudad(self, idx: int) -> Dict:
+        partes = [p for p in (self.nombres[idx], self.estados[idx], self.paises[idx]) if p]
+        return {
+            'name': ", ".join(partes),
+            'lat': self.lat[idx],
+            'lon': self.lon[idx],
+            'city': self.nombres[idx],
+            'state': self.estados[idx],
+            'country': self.paises[idx],
+            'country_code': self.codigos_pais[idx],
+            'type': 'city',
+            # Escala de 0 a 1 a partir de la población, como la de Nominatim
+            'importance': round(min(1.0, math.log10(self.poblacion[idx] + 1) / 8), 4)
+        }
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Ciudades cuyo nombre empieza con `query` (o se le parece), por población."""
+        consulta = normalizar(query)
+        if not consulta:
+            return []
+        ids = self._por_prefijo(consulta, limit)
+        if len(ids) < limit and len(consulta) >= 4:
+            ids += self._por_trigramas(consulta, limit - len(ids), set(ids))
+        return [self._ciudad(idx) for idx in ids]
+
+    def lookup(self, city: str, country: str = "") -> Optional[Tuple[float, float]]:
+        """Coordenadas de la ciudad más poblada con ese nombre exacto (y ese país, si se indica)."""
+        nombre = normalizar(city)
+        pais = normalizar(country)
+        inicio = bisect_left(self._claves, nombre)
+        mejor = None
+        for i in range(inicio, len(self._claves)):
+            if self._claves[i] != nombre:
+                break
+            idx = self._ids[i]
+            if pais and pais not in (normalizar(self.paises[idx]), self.codigos_pais[idx]):
+                continue
+            if mejor is None or self.poblacion[idx] > self.poblacion[mejor]:
+                mejor = idx
+        if mejor is None:
+            return None
+        return (self.lat[mejor], self.lon[mejor])
+
+
+def load_gazetteer(path: str = GAZETTEER_PATH) -> Optional[Gazetteer]:
+    """Carga el gazetteer si está configurado; si no, devuelve None."""
+    if not path:
+        return None
+    if not os.path.exists(path):
+        print(f"⚠️ Gazetteer no encontrado en {path}, se usará solo Nominatim")
+        return None
+    gaz = Gazetteer.from_geonames(path)
+    print(f"📚 Gazetteer cargado: {len(gaz)} ciudades")
+    return gaz
@@ -1,91 +1,364 @@
-import requests
+import httpx
+import os
 import time
-import sqlite3
 import json
 import asyncio
+import threading
 from typing import Dict, List, Optional, Tuple
+import db
+from lru import TTLCache
+from rate_limit import TokenBucket
+from executor import WEB_CONCURRENCY
+from gazetteer import load_gazetteer
+from metrics import NOMINATIM_ERRORES, NOMINATIM_LLAMADAS, etapa, registrar_cache
 
-DB_PATH = 'data/geocoding_cache.db'
+DB_PATH = os.getenv("GEOCODING_DB_PATH", 'data/geocoding_cache.db')
 CACHE_DURATION_SECONDS = 30 * 24 * 60 * 60  # 30 días
+# Entradas por tabla en la caché en memoria que se consulta antes que SQLite
+GEOCODING_LRU_SIZE = int(os.getenv("GEOCODING_LRU_SIZE", "2048"))
+
+# Columna de datos de cada tabla de caché
+CACHE_COLUMNS = {
+    "city_search_cache": "results",
+    "coordinates_cache": "coordinates",
+    "reverse_cache": "info"
+}
+# Nominatim: URL base (se puede apuntar a un servidor local para tests),
+# tasa de llamadas permitida (la política pública es 1 req/s) y reintentos
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+NOMINATIM_RATE = float(os.getenv("NOMINATIM_RATE", "1"))
+# La tasa es del servicio completo: cada worker de uvicorn (WEB_CONCURRENCY)
+# tiene su propio limitador, así que se la reparten en partes iguales
+NOMINATIM_RATE_WORKER = NOMINATIM_RATE / max(1, WEB_CONCURRENCY)
+NOMINATIM_BURST = int(os.getenv("NOMINATIM_BURST", "1"))
+NOMINATIM_MAX_RETRIES = int(os.getenv("NOMINATIM_MAX_RETRIES", "3"))
+NOMINATIM_TIMEOUT = float(os.getenv("NOMINATIM_TIMEOUT", "10"))
+# Escrituras a SQLite: se agrupan y se confirman juntas cada tanto (o al
+# juntar un lote), para que varios workers no compitan por el lock en cada una
+GEOCODING_WRITE_INTERVAL = float(os.getenv("GEOCODING_WRITE_INTERVAL", "0.5"))
+GEOCODING_WRITE_BATCH = int(os.getenv("GEOCODING_WRITE_BATCH", "256"))
+# Decimales de lat/lon para la clave de reverse geocoding (~11 m con 4)
+REVERSE_PRECISION = 4
+
+def init_cache_db(db_path: str = DB_PATH):
+    """
+    Abre la base de caché de geocodificación y crea o actualiza sus tablas.
+
+    Cada tabla guarda el momento de la consulta a Nominatim (`timestamp`,
+    para el vencimiento) y el último acceso (`last_access`, para descartar
+    las menos usadas cuando la caché supera su tamaño máximo).
+    """
+    conn = db.connect(db_path)
+    for table, column_name in CACHE_COLUMNS.items():
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                query TEXT PRIMARY KEY,
+                {column_name} TEXT,
+                timestamp REAL,
+                last_access REAL
+            )
+        ''')
+        # Bases creadas antes de existir last_access
+        columnas = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if "last_access" not in columnas:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN last_access REAL")
+            conn.execute(f"UPDATE {table} SET last_access = timestamp")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_timestamp ON {table} (timestamp)")
+    conn.commit()
+    return conn
+
 
 class GeocodingService:
     """Servicio para geocodificación usando Nominatim API con caché local."""
     
-    def __init__(self):
-        self.base_url = "https://nominatim.openstreetmap.org"
+    def __init__(self, base_url: str = NOMINATIM_URL, rate: float = NOMINATIM_RATE_WORKER,
+                 burst: int = NOMINATIM_BURST, db_path: str = DB_PATH):
+        self.base_url = base_url.rstrip("/")
+        # Un único limitador para todas las llamadas del proceso (con su
+        # parte de NOMINATIM_RATE si hay varios workers)
+        self.rate_limiter = TokenBucket(rate, burst)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
         self.headers = {
             'User-Agent': 'AstrologyAPI/1.0 (https://github.com/sergioscardigno82/astrology-api)'
         }
-        self.db_conn = self._init_db()
+        # Índice local de ciudades (opcional); Nominatim solo se usa si no hay
+        # resultado. Se carga con cargar_gazetteer() durante el arranque.
+        self.gazetteer = None
+        # La base se abre con el primer uso: importar este módulo (por
+        # ejemplo desde cache_admin) no toca el disco
+        self.db_path = db_path
+        self._db_conn = None
+        self._db_open_lock = threading.Lock()
         self.db_lock = asyncio.Lock()
+        # La conexión se comparte entre hilos: serializar su uso
+        self.db_thread_lock = threading.Lock()
+        self.memory_cache = {
+            table: TTLCache(GEOCODING_LRU_SIZE, CACHE_DURATION_SECONDS)
+            for table in CACHE_COLUMNS
+        }
+        # Consultas a Nominatim en curso, por (tabla, query normalizado)
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # Escrituras pendientes de confirmar en SQLite: (tabla, query, datos, timestamp)
+        self._pending_writes: List[Tuple[str, str, any, float]] = []
+        # Últimos accesos pendientes de registrar en SQLite: tabla -> {query: momento}
+        self._pending_touches: Dict[str, Dict[str, float]] = {table: {} for table in CACHE_COLUMNS}
+        self._flush_task: Optional[asyncio.Task] = None
 
-    def _init_db(self):
-        """Inicializa la base de datos de caché."""
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        cursor = conn.cursor()
-        # Cache para search_cities
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS city_search_cache (
-                query TEXT PRIMARY KEY,
-                results TEXT,
-                timestamp REAL
-            )
-        ''')
-        # Cache para get_coordinates
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS coordinates_cache (
-                query TEXT PRIMARY KEY,
-                coordinates TEXT,
-                timestamp REAL
-            )
-        ''')
-        conn.commit()
-        return conn
+    @property
+    def db_conn(self):
+        if self._db_conn is None:
+            with self._db_open_lock:
+                if self._db_conn is None:
+                    self._db_conn = init_cache_db(self.db_path)
+        return self._db_conn
 
-    def _get_from_cache(self, table: str, query: str) -> Optional[any]:
-        """Obtiene un resultado desde la caché si es válido."""
-        cursor = self.db_conn.cursor()
-        
-        column_name = "coordinates" if table == "coordinates_cache" else "results"
-        
-        cursor.execute(f"SELECT {column_name}, timestamp FROM {table} WHERE query = ?", (query,))
-        row = cursor.fetchone()
+    def cargar_gazetteer(self):
+        """Carga el gazetteer local (lento con archivos grandes: usar en un hilo)."""
+        if self.gazetteer is None:
+            self.gazetteer = load_gazetteer()
+        return self.gazetteer
+
+    async def _get_from_cache(self, table: str, query: str) -> Optional[any]:
+        """
+        Obtiene un resultado desde la caché si es válido.
+
+        Primero consulta la caché en memoria; si no está, lee SQLite en un
+        hilo aparte y guarda el resultado en memoria para la próxima vez.
+        """
+        memory = self.memory_cache[table]
+        data = memory.get(query)
+        registrar_cache(table, "memoria", data is not None)
+        if data is not None:
+            self._touch(table, query)
+            return data
+
+        with etapa("sqlite"):
+            row = await asyncio.to_thread(self._read_db_sync, table, query)
         if row:
-            data, timestamp = row
+            raw, timestamp = row
             if time.time() - timestamp < CACHE_DURATION_SECONDS:
-                return json.loads(data)
+                registrar_cache(table, "sqlite", True)
+                data = json.loads(raw)
+                memory.set(query, data, timestamp)
+                self._touch(table, query)
+                return data
+        registrar_cache(table, "sqlite", False)
         return None
 
+    def _read_db_sync(self, table: str, query: str):
+        """Función síncrona para leer de la BD, para ser usada con to_thread."""
+        column_name = CACHE_COLUMNS[table]
+        with self.db_thread_lock:
+            cursor = self.db_conn.cursor()
+            cursor.execute(f"SELECT {column_name}, timestamp FROM {table} WHERE query = ?", (query,))
+            return cursor.fetchone()
+
     async def _set_to_cache(self, table: str, query: str, results: any):
-        """Guarda un resultado en la caché de forma segura usando un Lock."""
+        """
+        Guarda un resultado en la caché: en memoria de inmediato y en SQLite
+        en el próximo lote de escrituras.
+        """
+        self.memory_cache[table].set(query, results)
+        self._pending_writes.append((table, query, results, time.time()))
+        if len(self._pending_writes) >= GEOCODING_WRITE_BATCH:
+            await self.flush_writes()
+        else:
+            self._schedule_flush()
+
+    def _touch(self, table: str, query: str):
+        """Registra un acceso; se escribe en SQLite junto con el próximo lote."""
+        self._pending_touches[table][query] = time.time()
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(GEOCODING_WRITE_INTERVAL)
+        finally:
+            self._flush_task = None
+        await self.flush_writes()
+
+    async def flush_writes(self):
+        """Confirma en SQLite las escrituras y accesos pendientes en una sola transacción."""
         async with self.db_lock:
-            await asyncio.to_thread(self._write_db_sync, table, query, results)
-    
-    def _write_db_sync(self, table: str, query: str, data: any):
+            pending, self._pending_writes = self._pending_writes, []
+            touches = self._pending_touches
+            self._pending_touches = {table: {} for table in CACHE_COLUMNS}
+            if pending or any(touches.values()):
+                await asyncio.to_thread(self._write_db_sync, pending, touches)
+
+    def _write_db_sync(self, pending: List[Tuple[str, str, any, float]],
+                       touches: Optional[Dict[str, Dict[str, float]]] = None):
         """Función síncrona para escribir en la BD, para ser usada con to_thread."""
-        cursor = self.db_conn.cursor()
-        
-        column_name = "coordinates" if table == "coordinates_cache" else "results"
-        
-        cursor.execute(
-            f"INSERT OR REPLACE INTO {table} (query, {column_name}, timestamp) VALUES (?, ?, ?)",
-            (query, json.dumps(data), time.time())
-        )
-        self.db_conn.commit()
+        with self.db_thread_lock, self.db_conn:
+            for table, query, data, timestamp in pending:
+                column_name = CACHE_COLUMNS[table]
+                self.db_conn.execute(
+                    f"INSERT OR REPLACE INTO {table} (query, {column_name}, timestamp, last_access) "
+                    f"VALUES (?, ?, ?, ?)",
+                    (query, json.dumps(data), timestamp, timestamp)
+                )
+            for table, accesos in (touches or {}).items():
+                self.db_conn.executemany(
+                    f"UPDATE {table} SET last_access = ? WHERE query = ?",
+                    [(momento, query) for query, momento in accesos.items()]
+                )
+
+    def precargar_memoria(self, table: str, limit: int) -> int:
+        """
+        Copia a la caché en memoria las `limit` entradas vigentes usadas más
+        recientemente de una tabla de SQLite. Devuelve cuántas se cargaron.
+        """
+        column_name = CACHE_COLUMNS[table]
+        limite_vigencia = time.time() - CACHE_DURATION_SECONDS
+        with self.db_thread_lock:
+            rows = self.db_conn.execute(
+                f"SELECT query, {column_name}, timestamp FROM {table} "
+                f"WHERE timestamp > ? ORDER BY last_access DESC LIMIT ?",
+                (limite_vigencia, limit)
+            ).fetchall()
+        memory = self.memory_cache[table]
+        # De la más antigua a la más reciente, para que el LRU conserve las últimas
+        for query, raw, timestamp in reversed(rows):
+            memory.set(query, json.loads(raw), timestamp)
+        return len(rows)
+
+    def consultas_en_cache(self, table: str, queries: List[str]) -> set:
+        """Subconjunto de `queries` que ya tiene una entrada vigente en SQLite."""
+        if not queries:
+            return set()
+        limite_vigencia = time.time() - CACHE_DURATION_SECONDS
+        marcadores = ",".join("?" * len(queries))
+        with self.db_thread_lock:
+            rows = self.db_conn.execute(
+                f"SELECT query FROM {table} WHERE timestamp > ? AND query IN ({marcadores})",
+                (limite_vigencia, *queries)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    @staticmethod
+    def city_search_query(query: str, limit: int) -> str:
+        """
+        Clave de city_search_cache: incluye `limit`, porque una lista pedida
+        con un límite menor no sirve (ni se puede saber si está completa)
+        para un límite mayor.
+        """
+        return f"{query.lower().strip()}|{limit}"
+
+    @staticmethod
+    def coordinates_query(city: str, country: str = "") -> str:
+        """Clave de coordinates_cache para una ciudad y país."""
+        return f"{city.lower().strip()},{country.lower().strip()}"
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Cliente HTTP con conexiones keep-alive, uno por event loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=NOMINATIM_TIMEOUT,
+                limits=httpx.Limits(max_keepalive_connections=10)
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def _request(self, path: str, params: Dict) -> any:
+        """
+        GET a Nominatim respetando el limitador de tasa compartido.
+
+        Ante un 429/503 espera lo que indique `Retry-After` (o un backoff
+        exponencial) y reintenta hasta NOMINATIM_MAX_RETRIES veces.
+        """
+        client = self._get_client()
+        for attempt in range(NOMINATIM_MAX_RETRIES + 1):
+            with etapa("nominatim_espera"):
+                await self.rate_limiter.acquire()
+            try:
+                with etapa("nominatim"):
+                    response = await client.get(path, params=params)
+            except httpx.HTTPError as e:
+                NOMINATIM_ERRORES.labels(path, type(e).__name__).inc()
+                raise
+            NOMINATIM_LLAMADAS.labels(path, str(response.status_code)).inc()
+            if response.status_code in (429, 503) and attempt < NOMINATIM_MAX_RETRIES:
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else 2 ** attempt
+                print(f"⏳ Nominatim respondió {response.status_code}, reintentando en {delay}s")
+                self.rate_limiter.penalize(delay)
+                continue
+            if response.is_error:
+                NOMINATIM_ERRORES.labels(path, f"http_{response.status_code}").inc()
+            response.raise_for_status()
+            try:
+                return response.json()
+            except ValueError:
+                # Un 200 con una página HTML (error o límite de tasa) en lugar de JSON
+                NOMINATIM_ERRORES.labels(path, "json_invalido").inc()
+                raise
+
+    async def aclose(self):
+        """Confirma las escrituras pendientes y cierra el cliente HTTP."""
+        await self.flush_writes()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+
+    async def _single_flight(self, key: Tuple[str, str], factory):
+        """
+        Ejecuta `factory()` una sola vez por clave aunque haya varias llamadas
+        concurrentes: las demás esperan el mismo resultado en curso.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            # Una consulta igual pudo terminar mientras este llamador leía
+            # SQLite: su resultado ya está en memoria
+            table, query = key
+            data = self.memory_cache[table].get(query)
+            if data is not None:
+                return data
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield: si un llamador se cancela, la consulta sigue para los demás
+        return await asyncio.shield(task)
+
+    def cache_stats(self) -> Dict[str, Dict]:
+        """Estadísticas de aciertos/fallos de la caché en memoria por tabla."""
+        return {table: memory.stats() for table, memory in self.memory_cache.items()}
 
     async def search_cities(self, query: str, limit: int = 10) -> List[Dict]:
         """
         Buscar ciudades por nombre, usando caché.
         """
+        # Consultar el gazetteer local
+        if self.gazetteer is not None:
+            local_results = self.gazetteer.search(query, limit)
+            if local_results:
+                return local_results
+
         # Normalizar el query para la caché
-        cache_query = query.lower().strip()
+        cache_query = self.city_search_query(query, limit)
         
         # Consultar caché
-        cached_results = self._get_from_cache('city_search_cache', cache_query)
+        cached_results = await self._get_from_cache('city_search_cache', cache_query)
         if cached_results is not None:
             return cached_results
 
-        # Si no está en caché, buscar en la API
+        # Si no está en caché, buscar en la API (una sola llamada por query)
+        return await self._single_flight(
+            ('city_search_cache', cache_query),
+            lambda: self._fetch_cities(query, limit, cache_query)
+        )
+
+    async def _fetch_cities(self, query: str, limit: int, cache_query: str) -> List[Dict]:
+        """Busca ciudades en Nominatim y guarda el resultado en caché."""
         try:
             params = {
                 'q': query,
@@ -96,17 +369,7 @@ class GeocodingService:
                 'featuretype': 'city'
             }
             
-            # Ejecutar la llamada bloqueante en un hilo separado
-            response = await asyncio.to_thread(
-                requests.get,
-                f"{self.base_url}/search",
-                params=params,
-                headers=self.headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            results = response.json()
+            results = await self._request("/search", params)
             cities = []
             
             for result in results:
@@ -131,7 +394,7 @@ class GeocodingService:
             
             return cities
             
-        except requests.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             print(f"Error en búsqueda de ciudades: {e}")
             return []
 
@@ -139,14 +402,28 @@ class GeocodingService:
         """
         Obtener coordenadas de una ciudad, usando caché.
         """
-        query = f"{city.lower().strip()},{country.lower().strip()}"
+        # Consultar el gazetteer local
+        if self.gazetteer is not None:
+            local_coords = self.gazetteer.lookup(city, country)
+            if local_coords is not None:
+                return local_coords
+
+        query = self.coordinates_query(city, country)
         
         # Consultar caché
-        cached_coords = self._get_from_cache('coordinates_cache', query)
+        cached_coords = await self._get_from_cache('coordinates_cache', query)
         if cached_coords is not None:
             return tuple(cached_coords)
 
-        # Si no está en caché, buscar en la API
+        # Si no está en caché, buscar en la API (una sola llamada por query)
+        coords = await self._single_flight(
+            ('coordinates_cache', query),
+            lambda: self._fetch_coordinates(city, country, query)
+        )
+        return tuple(coords) if coords is not None else None
+
+    async def _fetch_coordinates(self, city: str, country: str, query: str) -> Optional[Tuple[float, float]]:
+        """Busca las coordenadas en Nominatim y las guarda en caché."""
         try:
             api_query = f"{city}, {country}" if country else city
             params = {
@@ -156,17 +433,7 @@ class GeocodingService:
                 'addressdetails': 1
             }
             
-            # Ejecutar la llamada bloqueante en un hilo separado
-            response = await asyncio.to_thread(
-                requests.get,
-                f"{self.base_url}/search",
-                params=params,
-                headers=self.headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            results = response.json()
+            results = await self._request("/search", params)
             if results:
                 result = results[0]
                 coordinates = (
@@ -179,13 +446,13 @@ class GeocodingService:
             
             return None
             
-        except requests.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             print(f"Error obteniendo coordenadas: {e}")
             return None
     
-    def get_city_info(self, lat: float, lon: float) -> Optional[Dict]:
+    async def get_city_info(self, lat: float, lon: float) -> Optional[Dict]:
         """
-        Obtener información de una ciudad por coordenadas (reverse geocoding)
+        Obtener información de una ciudad por coordenadas (reverse geocoding), usando caché.
         
         Args:
             lat: Latitud
@@ -194,6 +461,24 @@ class GeocodingService:
         Returns:
             Información de la ciudad o None si no se encuentra
         """
+        lat_q = round(lat, REVERSE_PRECISION)
+        lon_q = round(lon, REVERSE_PRECISION)
+        query = f"{lat_q},{lon_q}"
+
+        # Consultar caché
+        info = await self._get_from_cache('reverse_cache', query)
+        if info is None:
+            # Si no está en caché, buscar en la API (una sola llamada por query)
+            info = await self._single_flight(
+                ('reverse_cache', query),
+                lambda: self._fetch_city_info(lat_q, lon_q, query)
+            )
+        if info is None:
+            return None
+        return {**info, 'lat': lat, 'lon': lon}
+
+    async def _fetch_city_info(self, lat: float, lon: float, query: str) -> Optional[Dict]:
+        """Hace el reverse geocoding en Nominatim y guarda el resultado en caché."""
         try:
             params = {
                 'lat': lat,
@@ -202,18 +487,10 @@ class GeocodingService:
                 'addressdetails': 1
             }
             
-            response = requests.get(
-                f"{self.base_url}/reverse",
-                params=params,
-                headers=self.headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            result = response.json()
+            result = await self._request("/reverse", params)
             address = result.get('address', {})
             
-            return {
+            info = {
                 'display_name': result.get('display_name', ''),
                 'city': address.get('city', address.get('town', address.get('village', ''))),
                 'state': address.get('state', ''),
@@ -222,8 +499,11 @@ class GeocodingService:
                 'lat': lat,
                 'lon': lon
             }
+            # Guardar en caché
+            await self._set_to_cache('reverse_cache', query, info)
+            return info
             
-        except requests.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             print(f"Error en reverse geocoding: {e}")
             return None
 
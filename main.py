@@ -1,40 +1,66 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from util import get_chart, get_timezone_offset
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from util import (
+    CUERPOS_EXTRA, PLANETAS, SISTEMAS_CASAS, get_chart, get_charts_list, get_ephemeris_series, get_timezone_offset,
+    jd_from_datetime
+)
 from geocoding import geocoding_service
-from typing import Optional
+from typeahead import Typeahead
+from estaticos import estaticos
+from formatos import (
+    MEDIA_TYPES, CompresorStream, cabeceras, compactar_carta, negociar_codificacion, negociar_formato, respuesta,
+    serializar
+)
+from executor import chart_executor, ExecutorSaturado
+from chart_cache import chart_cache, chart_key, etag_for
+from eventos import TIPOS_EVENTO, buscar_eventos, longitud_natal
+from retornos import TIPOS_SERIE, cartas_en_instantes, serie
+from tabla_efemerides import tabla_efemerides
+from cielo import CieloEnVivo
+from calendario import CalendarioLunar
+from timezones import timezone_name_at, zona_valida
+from lru import TTLCache
+from sinastria import NOMBRES_PLANETAS, mejores_candidatos, vectores_registros
+from startup import arranque
+from metrics import MetricsMiddleware, etapa, metrics_response
+from typing import List, Optional
+from datetime import datetime
 import asyncio
+import io
+import os
+import numpy as np
 
 app = FastAPI(title="Astrology API", version="1.0.0")
 
-# Lista de ciudades para precargar en la caché al inicio
-CITIES_TO_PRELOAD = [
-    # Argentina
-    "Buenos Aires", "Córdoba", "Rosario", "Mendoza", "La Plata", "Gualeguaychú", "Adolfo Gonzales Chaves",
-    # Mundo
-    "Madrid", "Mexico City", "New York", "London", "Paris", "Tokyo", "Sao Paulo"
-]
-
-async def preload_cities_cache():
-    """Precarga la caché de ciudades en segundo plano."""
-    print("🚀 Iniciando precarga de caché de ciudades...")
-    await asyncio.sleep(5) # Esperar un poco a que todo arranque
-    for city in CITIES_TO_PRELOAD:
-        try:
-            print(f" caching... {city}")
-            await geocoding_service.search_cities(city)
-            await asyncio.sleep(2)  # Pausa para no sobrecargar la API de Nominatim
-        except Exception as e:
-            print(f"❌ Error cacheando {city}: {e}")
-    print("✅ Precarga de caché de ciudades completada.")
-
-
 @app.on_event("startup")
 async def startup_event():
-    """Al iniciar la app, crea la tarea de precarga en segundo plano."""
-    asyncio.create_task(preload_cities_cache())
+    """
+    Al iniciar la app, precomprime el frontend y lanza en segundo plano la
+    carga del gazetteer, el arranque de los workers y el calentamiento de la
+    caché (ver /ready).
+    """
+    estaticos.cargar("index.html")
+    arranque.iniciar(geocoding_service, chart_executor, chart_cache)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Al detener la app, libera los procesos del executor y el cliente HTTP."""
+    chart_executor.shutdown()
+    await geocoding_service.aclose()
+
+
+@app.exception_handler(ExecutorSaturado)
+async def executor_saturado_handler(request: Request, exc: ExecutorSaturado):
+    """Responde 503 con una pista de reintento cuando el executor está lleno."""
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(exc), "reintentar_en": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 # Configurar CORS para permitir conexiones desde el frontend
 app.add_middleware(
@@ -43,17 +69,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Métricas por pedido y encabezado Server-Timing
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
-async def read_root():
-    return FileResponse("index.html")
+async def read_root(request: Request):
+    """Frontend precomprimido en memoria, con ETag y revalidación (ver estaticos.py)"""
+    return estaticos.pagina("index.html", request)
+
+@app.get("/assets/{nombre}")
+async def asset(nombre: str, request: Request):
+    """CSS y JS del frontend con huella en el nombre: caché larga e inmutable"""
+    return estaticos.asset(nombre, request)
 
 @app.get("/health")
 async def health_check():
     """Endpoint para health check del contenedor"""
     return {"status": "healthy", "service": "astrology-api"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 cuando terminaron las etapas de arranque requeridas, 503 si no"""
+    return JSONResponse(arranque.resumen(), status_code=200 if arranque.listo else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas en formato Prometheus"""
+    contenido, content_type = metrics_response()
+    return Response(contenido, media_type=content_type)
+
 @app.get("/status")
 async def status():
     """Endpoint para verificar el estado de la API"""
@@ -63,26 +109,53 @@ async def status():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready",
             "status": "/status",
+            "metrics": "/metrics",
             "carta": "/carta",
+            "cartas": "/cartas",
+            "efemerides": "/efemerides",
+            "eventos": "/eventos",
+            "retornos": "/retornos",
+            "cielo": "/cielo",
+            "calendario": "/calendario",
+            "sinastria": "/sinastria",
             "buscar_ciudades": "/buscar_ciudades",
             "coordenadas": "/coordenadas",
             "root": "/"
-        }
+        },
+        "cache_geocodificacion": geocoding_service.cache_stats(),
+        "cache_cartas": chart_cache.stats(),
+        "tabla_efemerides": tabla_efemerides.resumen(),
+        "cielo": cielo_en_vivo.resumen()
     }
 
+# Autocompletado: las búsquedas sucesivas de un mismo texto se resuelven
+# filtrando resultados de sus prefijos
+typeahead = Typeahead(geocoding_service)
+
+
 @app.get("/buscar_ciudades")
-async def buscar_ciudades(q: str = Query(..., min_length=2, description="Término de búsqueda")):
+async def buscar_ciudades(
+    request: Request,
+    q: str = Query(..., min_length=2, description="Término de búsqueda")
+):
     """
     Buscar ciudades por nombre
     
+    Sin distinguir mayúsculas ni acentos. Si el cliente envía `X-Client-Id`,
+    una búsqueda reemplazada por otra más nueva del mismo cliente se
+    abandona y responde con `cancelada: true`.
+    
     Args:
         q: Término de búsqueda (mínimo 2 caracteres)
         
     Returns:
         Lista de ciudades encontradas
     """
-    ciudades = await geocoding_service.search_cities(q, limit=15)
+    ciudades = await typeahead.buscar(q, limit=15, cliente=request.headers.get("x-client-id"))
+    if ciudades is None:
+        return {"query": q, "results": [], "total": 0, "cancelada": True}
     return {
         "query": q,
         "results": ciudades,
@@ -121,8 +194,21 @@ async def obtener_coordenadas(
             "error": "Ciudad no encontrada"
         }
 
+def _parse_casas_extras(casas: str, extras: Optional[str]):
+    """Valida los sistemas de casas y cuerpos extra pedidos (listas separadas por coma)."""
+    sistemas = [c.strip().lower() for c in casas.split(",") if c.strip()] or ["placidus"]
+    cuerpos_extra = [e.strip().lower() for e in extras.split(",") if e.strip()] if extras else []
+    if any(c not in SISTEMAS_CASAS for c in sistemas) or any(e not in CUERPOS_EXTRA for e in cuerpos_extra):
+        return sistemas, cuerpos_extra, {
+            "error": "Sistema de casas o cuerpo extra desconocido",
+            "sugerencia": f"Casas: {', '.join(SISTEMAS_CASAS)}. Extras: {', '.join(CUERPOS_EXTRA)}"
+        }
+    return sistemas, cuerpos_extra, None
+
+
 @app.get("/carta")
 async def carta(
+    request: Request,
     anio: int = Query(..., ge=1500),
     mes: int = Query(..., ge=1, le=12),
     dia: int = Query(..., ge=1, le=31),
@@ -132,11 +218,22 @@ async def carta(
     lat: Optional[str] = Query(None, description="Latitud (opcional si se usa ciudad)"),
     lon: Optional[str] = Query(None, description="Longitud (opcional si se usa ciudad)"),
     ciudad: Optional[str] = Query(None, description="Nombre de la ciudad (opcional)"),
-    pais: Optional[str] = Query(None, description="Nombre del país (opcional)")
+    pais: Optional[str] = Query(None, description="Nombre del país (opcional)"),
+    casas: str = Query("placidus", description="Sistema(s) de casas separados por coma"),
+    extras: Optional[str] = Query(None, description="Cuerpos extra separados por coma: nodo_norte, quiron, lilith"),
+    formato: Optional[str] = Query(None, pattern="^(json|msgpack)$", description="json o msgpack (default: según Accept)"),
+    precision: str = Query("exacta", pattern="^(exacta|rapida)$", description="exacta o rapida (tabla interpolada)")
 ):
     """
     Generar carta astral
     
+    La respuesta lleva un ETag: si el cliente lo envía en `If-None-Match`
+    y la carta no cambió, se responde 304 sin cuerpo.
+    
+    Con `Accept: application/msgpack` (o `formato=msgpack`) la carta se
+    envía en MessagePack con el esquema compacto de `formatos.compactar_carta`.
+    Con `Accept-Encoding` se comprime con brotli o gzip.
+    
     Args:
         anio: Año de nacimiento
         mes: Mes de nacimiento
@@ -148,7 +245,17 @@ async def carta(
         lon: Longitud (opcional si se usa ciudad)
         ciudad: Nombre de la ciudad (opcional)
         pais: Nombre del país (opcional)
+        casas: Sistema(s) de casas (opcional, default: placidus). Con varios,
+            las posiciones planetarias se calculan una sola vez
+        extras: Cuerpos extra (opcional)
+        formato: json o msgpack (opcional)
+        precision: exacta (Swiss Ephemeris) o rapida (tabla precalculada,
+            error de segundos de arco; fuera de su rango se usa la exacta)
     """
+    sistemas, cuerpos_extra, error = _parse_casas_extras(casas, extras)
+    if error:
+        return error
+
     lat_float = 0.0
     lon_float = 0.0
     ciudad_info = None
@@ -156,14 +263,18 @@ async def carta(
     
     # Si se proporciona ciudad, obtener coordenadas
     if ciudad:
-        coords = await geocoding_service.get_coordinates(ciudad, pais or "")
+        with etapa("geocodificacion"):
+            coords = await geocoding_service.get_coordinates(ciudad, pais or "")
         if coords:
             lat_float, lon_float = coords
-            ciudad_info = geocoding_service.get_city_info(lat_float, lon_float)
+            with etapa("reverse_geocoding"):
+                ciudad_info = await geocoding_service.get_city_info(lat_float, lon_float)
             # Si no se especificó tz, obtenerla automáticamente
             if tz is None:
-                from datetime import datetime
-                tz_offset = get_timezone_offset(lat_float, lon_float, datetime(anio, mes, dia, hora, minuto))
+                with etapa("zona_horaria"):
+                    tz_offset = await chart_executor.run(
+                        get_timezone_offset, lat_float, lon_float, datetime(anio, mes, dia, hora, minuto)
+                    )
                 if tz_offset is None:
                     tz_offset = -3  # Default Buenos Aires
         else:
@@ -179,8 +290,10 @@ async def carta(
                 lon_float = float(lon.replace(',', '.'))
                 # Si no se especificó tz, obtenerla automáticamente
                 if tz is None:
-                    from datetime import datetime
-                    tz_offset = get_timezone_offset(lat_float, lon_float, datetime(anio, mes, dia, hora, minuto))
+                    with etapa("zona_horaria"):
+                        tz_offset = await chart_executor.run(
+                            get_timezone_offset, lat_float, lon_float, datetime(anio, mes, dia, hora, minuto)
+                        )
                     if tz_offset is None:
                         tz_offset = -3  # Default Buenos Aires
             except ValueError:
@@ -196,12 +309,9 @@ async def carta(
             if tz is None:
                 tz_offset = -3
     
-    # Generar carta astral
-    carta_result = get_chart(anio, mes, dia, hora, minuto, 0, tz_offset, lat_float, lon_float)
-    
     # Agregar información de la ciudad si está disponible
     if ciudad_info:
-        carta_result["ubicacion"] = {
+        ubicacion = {
             "ciudad": ciudad_info.get("city", ciudad),
             "pais": ciudad_info.get("country", pais or ""),
             "estado": ciudad_info.get("state", ""),
@@ -210,10 +320,629 @@ async def carta(
             "display_name": ciudad_info.get("display_name", "")
         }
     else:
-        carta_result["ubicacion"] = {
+        ubicacion = {
             "latitud": lat_float,
             "longitud": lon_float
         }
-    
-    carta_result["zona_horaria"] = tz_offset
-    return carta_result
+
+    # Revalidación: si el cliente ya tiene esta carta, no enviar el cuerpo
+    key = chart_key(anio, mes, dia, hora, minuto, 0, tz_offset, lat_float, lon_float,
+                    ",".join(sistemas) + "|" + ",".join(cuerpos_extra) + "|" + precision)
+    formato = negociar_formato(request.headers.get("accept", ""), formato)
+    codificacion = negociar_codificacion(request.headers.get("accept-encoding", ""))
+    etag = etag_for(key, ubicacion, tz_offset, formato, codificacion)
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag, **cabeceras(None)})
+
+    # Generar carta astral (o tomarla de la caché)
+    with etapa("cache_cartas"):
+        carta_result = await chart_cache.get(key)
+    if carta_result is None:
+        with etapa("efemerides"):
+            carta_result = await chart_executor.run(
+                get_chart, anio, mes, dia, hora, minuto, 0, tz_offset, lat_float, lon_float,
+                sistemas, cuerpos_extra, precision
+            )
+        await chart_cache.set(key, carta_result)
+
+    # Copia superficial: la carta en caché no se modifica
+    with etapa("serializacion"):
+        contenido = {**carta_result, "ubicacion": ubicacion, "zona_horaria": tz_offset}
+        if formato == "msgpack":
+            contenido = compactar_carta(contenido)
+        return respuesta(contenido, formato, codificacion, headers={"ETag": etag})
+
+
+# Cantidad de cartas que se calculan juntas en cada trabajo del executor
+TAMANO_BLOQUE_LOTE = 64
+
+
+class RegistroCarta(BaseModel):
+    """Datos de nacimiento de una carta dentro de un lote."""
+    anio: int = Field(..., ge=1500)
+    mes: int = Field(..., ge=1, le=12)
+    dia: int = Field(..., ge=1, le=31)
+    hora: int = 12
+    minuto: int = 0
+    tz: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    ciudad: Optional[str] = None
+    pais: Optional[str] = None
+
+
+class LoteCartas(BaseModel):
+    registros: List[RegistroCarta] = Field(..., max_length=10000)
+    casas: str = "placidus"
+    extras: Optional[str] = None
+    precision: str = Field("exacta", pattern="^(exacta|rapida)$")
+
+
+async def _resolver_registros(lista: List[RegistroCarta]):
+    """
+    Convierte registros en dicts para util con lat/lon resueltas.
+
+    Cada ciudad distinta se geocodifica una sola vez. Devuelve la lista de
+    (índice, registro) válidos y un dict índice -> error para los demás.
+    """
+    ciudades = {
+        (r.ciudad, r.pais or "")
+        for r in lista
+        if r.ciudad and (r.lat is None or r.lon is None)
+    }
+    claves = list(ciudades)
+    coordenadas = dict(zip(claves, await asyncio.gather(
+        *(geocoding_service.get_coordinates(ciudad, pais) for ciudad, pais in claves)
+    )))
+
+    registros = []
+    errores = {}
+    for i, r in enumerate(lista):
+        lat, lon = r.lat, r.lon
+        if r.ciudad and (lat is None or lon is None):
+            coords = coordenadas.get((r.ciudad, r.pais or ""))
+            if not coords:
+                errores[i] = {"error": f"No se pudo encontrar la ciudad: {r.ciudad}"}
+                continue
+            lat, lon = coords
+        elif lat is None or lon is None:
+            # Sin ciudad ni coordenadas, usar Buenos Aires por defecto
+            lat, lon = -34.6037, -58.3816
+        registros.append((i, {
+            "anio": r.anio, "mes": r.mes, "dia": r.dia,
+            "hora": r.hora, "minuto": r.minuto,
+            "tz": r.tz, "lat": lat, "lon": lon
+        }))
+    return registros, errores
+
+
+@app.post("/cartas")
+async def cartas(request: Request, lote: LoteCartas):
+    """
+    Generar muchas cartas astrales en una sola petición
+
+    Cada ciudad distinta se geocodifica una sola vez por lote y la zona
+    horaria se resuelve una vez por ubicación. La respuesta es NDJSON: una
+    línea por registro, en el mismo orden en que se enviaron. Con
+    `Accept: application/msgpack` es una secuencia de objetos MessagePack
+    con el esquema compacto, y con `Accept-Encoding` se comprime por bloque.
+    """
+    sistemas, cuerpos_extra, error = _parse_casas_extras(lote.casas, lote.extras)
+    if error:
+        return error
+    formato = negociar_formato(request.headers.get("accept", ""))
+    compresor = CompresorStream(negociar_codificacion(request.headers.get("accept-encoding", "")))
+    registros, errores = await _resolver_registros(lote.registros)
+
+    # Repartir el lote en bloques que se calculan en el executor de cartas
+    bloques = [registros[i:i + TAMANO_BLOQUE_LOTE] for i in range(0, len(registros), TAMANO_BLOQUE_LOTE)]
+
+    async def calcular_bloque(bloque):
+        while True:
+            try:
+                return await chart_executor.run(
+                    get_charts_list, [registro for _, registro in bloque], -3, sistemas, cuerpos_extra,
+                    lote.precision
+                )
+            except ExecutorSaturado as e:
+                await asyncio.sleep(e.retry_after)
+
+    # El primer bloque se calcula antes de responder, así un executor
+    # saturado devuelve 503 en lugar de un stream a medias.
+    primero = await chart_executor.run(
+        get_charts_list, [registro for _, registro in bloques[0]], -3, sistemas, cuerpos_extra, lote.precision
+    ) if bloques else []
+
+    async def generar_bloques():
+        """Listas de resultados (cartas o errores) en el orden de los registros."""
+        ventana = max(1, chart_executor.workers)
+        pendientes = [asyncio.ensure_future(calcular_bloque(b)) for b in bloques[1:1 + ventana]]
+        proximo = 1 + ventana
+        resultados = primero
+        siguiente = 0
+        try:
+            for n, bloque in enumerate(bloques):
+                if n > 0:
+                    resultados = await pendientes.pop(0)
+                    if proximo < len(bloques):
+                        pendientes.append(asyncio.ensure_future(calcular_bloque(bloques[proximo])))
+                        proximo += 1
+                salida = []
+                for (indice, _), carta_result in zip(bloque, resultados):
+                    while siguiente < indice:
+                        salida.append({"indice": siguiente, **errores[siguiente]})
+                        siguiente += 1
+                    if "error" in carta_result:
+                        carta_result = {"indice": indice, **carta_result}
+                    salida.append(carta_result)
+                    siguiente += 1
+                yield salida
+            yield [{"indice": i, **errores[i]} for i in range(siguiente, len(lote.registros))]
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+
+    async def generar():
+        async for salida in generar_bloques():
+            if formato == "msgpack":
+                cuerpo = b"".join(serializar(compactar_carta(r), formato) for r in salida)
+            else:
+                cuerpo = b"".join(serializar(r, formato) + b"\n" for r in salida)
+            if cuerpo:
+                yield compresor.comprimir(cuerpo)
+        yield compresor.cerrar()
+
+    media_type = "application/x-ndjson" if formato == "json" else MEDIA_TYPES[formato]
+    return StreamingResponse(generar(), media_type=media_type, headers=cabeceras(compresor.codificacion))
+
+
+@app.get("/efemerides")
+async def efemerides(
+    inicio: str = Query(..., description="Fecha/hora inicial en UTC (ISO 8601, ej. 2024-01-01T00:00)"),
+    fin: str = Query(..., description="Fecha/hora final en UTC (ISO 8601)"),
+    paso_horas: float = Query(24.0, gt=0, description="Intervalo entre muestras, en horas"),
+    planetas: Optional[str] = Query(None, description="Planetas separados por coma (default: todos)"),
+    formato: str = Query("json", pattern="^(json|npz)$", description="json o npz (NumPy)"),
+    precision: str = Query("exacta", pattern="^(exacta|rapida)$", description="exacta o rapida (tabla interpolada)")
+):
+    """
+    Serie temporal de posiciones planetarias
+
+    Devuelve por cada planeta la longitud, la velocidad (grados/día) y el
+    índice de signo en cada instante, en columnas. Con `formato=npz` la
+    respuesta es un archivo NumPy `.npz` con arrays `jd`, `<planeta>_longitud`,
+    `<planeta>_velocidad` y `<planeta>_signo`. Con `precision=rapida` la
+    serie se interpola de la tabla precalculada si cae dentro de su rango.
+    """
+    try:
+        jd_inicio = jd_from_datetime(datetime.fromisoformat(inicio))
+        jd_fin = jd_from_datetime(datetime.fromisoformat(fin))
+    except ValueError:
+        return {
+            "error": "Fechas inválidas",
+            "sugerencia": "Usa el formato ISO 8601, por ejemplo 2024-01-01T00:00"
+        }
+    nombres = [p.strip().lower() for p in planetas.split(",") if p.strip()] if planetas else list(PLANETAS)
+    desconocidos = [p for p in nombres if p not in PLANETAS]
+    if desconocidos:
+        return {
+            "error": f"Planetas desconocidos: {', '.join(desconocidos)}",
+            "sugerencia": f"Usa alguno de: {', '.join(PLANETAS)}"
+        }
+    if jd_fin < jd_inicio:
+        return {"error": "La fecha final es anterior a la inicial"}
+
+    # Cada planeta se calcula en un trabajo propio del executor, en paralelo
+    try:
+        partes = await asyncio.gather(*(
+            chart_executor.run(get_ephemeris_series, jd_inicio, jd_fin, paso_horas, [nombre], precision)
+            for nombre in nombres
+        ))
+    except ValueError as e:
+        return {"error": str(e), "sugerencia": "Aumenta paso_horas o acorta el rango"}
+    serie = {"jd": partes[0]["jd"]}
+    for nombre, parte in zip(nombres, partes):
+        serie[nombre] = parte[nombre]
+
+    if formato == "npz":
+        arrays = {"jd": serie["jd"]}
+        for nombre in nombres:
+            for columna, valores in serie[nombre].items():
+                arrays[f"{nombre}_{columna}"] = valores
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return Response(
+            buffer.getvalue(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": 'attachment; filename="efemerides.npz"'}
+        )
+
+    return {
+        "inicio": inicio,
+        "fin": fin,
+        "paso_horas": paso_horas,
+        "jd": serie["jd"].round(6).tolist(),
+        "planetas": {
+            nombre: {
+                "longitud": serie[nombre]["longitud"].round(4).tolist(),
+                "velocidad": serie[nombre]["velocidad"].round(4).tolist(),
+                "signo": serie[nombre]["signo"].tolist()
+            }
+            for nombre in nombres
+        }
+    }
+
+
+# Rango máximo de una búsqueda de eventos, en días (~100 años)
+MAX_DIAS_EVENTOS = 36525
+
+
+@app.get("/eventos")
+async def eventos(
+    planeta: str = Query(..., description="Planeta en tránsito"),
+    inicio: str = Query(..., description="Fecha/hora inicial en UTC (ISO 8601)"),
+    fin: str = Query(..., description="Fecha/hora final en UTC (ISO 8601)"),
+    tipos: str = Query(",".join(TIPOS_EVENTO), description="aspecto, ingreso y/o estacion, separados por coma"),
+    aspectos: Optional[str] = Query(None, description="Aspectos a buscar separados por coma (default: todos)"),
+    planeta_natal: Optional[str] = Query(None, description="Planeta natal para los aspectos"),
+    anio: Optional[int] = Query(None, ge=1500, description="Año de nacimiento"),
+    mes: Optional[int] = Query(None, ge=1, le=12),
+    dia: Optional[int] = Query(None, ge=1, le=31),
+    hora: int = 12,
+    minuto: int = 0,
+    tz: float = 0
+):
+    """
+    Buscar eventos de un planeta en tránsito
+
+    Devuelve los instantes exactos (UTC) de sus ingresos a signo, sus
+    estaciones y, si se indica `planeta_natal` con la fecha de nacimiento,
+    los aspectos exactos al grado natal de ese planeta.
+    """
+    tipos_pedidos = [t.strip() for t in tipos.split(",") if t.strip()]
+    invalidos = [t for t in tipos_pedidos if t not in TIPOS_EVENTO]
+    if invalidos or planeta not in PLANETAS or (planeta_natal and planeta_natal not in PLANETAS):
+        return {
+            "error": "Parámetros inválidos",
+            "sugerencia": f"Tipos: {', '.join(TIPOS_EVENTO)}. Planetas: {', '.join(PLANETAS)}"
+        }
+    try:
+        jd_inicio = jd_from_datetime(datetime.fromisoformat(inicio))
+        jd_fin = jd_from_datetime(datetime.fromisoformat(fin))
+    except ValueError:
+        return {
+            "error": "Fechas inválidas",
+            "sugerencia": "Usa el formato ISO 8601, por ejemplo 2024-01-01T00:00"
+        }
+    if not 0 < jd_fin - jd_inicio <= MAX_DIAS_EVENTOS:
+        return {"error": "El rango debe ser positivo y de hasta 100 años"}
+
+    grado = None
+    if planeta_natal:
+        if anio is None or mes is None or dia is None:
+            return {
+                "error": "Faltan datos de nacimiento",
+                "sugerencia": "Para buscar aspectos indica anio, mes y dia (y opcionalmente hora, minuto y tz)"
+            }
+        grado = await chart_executor.run(longitud_natal, planeta_natal, anio, mes, dia, hora, minuto, 0, tz)
+
+    lista_aspectos = [a.strip() for a in aspectos.split(",") if a.strip()] if aspectos else None
+    resultado = await chart_executor.run(
+        buscar_eventos, planeta, jd_inicio, jd_fin, tipos_pedidos, grado, lista_aspectos, planeta_natal
+    )
+    return {
+        "planeta": planeta,
+        "inicio": inicio,
+        "fin": fin,
+        "eventos": resultado,
+        "total": len(resultado)
+    }
+
+
+# Cielo actual compartido por todos los clientes de /cielo de este proceso
+cielo_en_vivo = CieloEnVivo(chart_executor)
+# Segundos sin datos tras los que se envía un comentario SSE (mantiene viva la conexión)
+CIELO_LATIDO = 15
+
+
+@app.get("/cielo")
+async def cielo(
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Latitud para las casas (opcional)"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Longitud para las casas (opcional)")
+):
+    """
+    Cielo actual en vivo (Server-Sent Events)
+
+    Envía un evento `cielo` con posiciones, aspectos y balance de elementos
+    cada CIELO_INTERVALO segundos y, si se indican `lat` y `lon`, un evento
+    `casas` con las casas y el ascendente para esa ubicación. El cálculo es
+    uno por intervalo para todos los clientes, no uno por cliente.
+    """
+    async def generar():
+        # Suscribir recién al empezar el stream: el finally siempre lo libera
+        cola, ubicacion = cielo_en_vivo.suscribir(lat, lon)
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(cola.get(), CIELO_LATIDO)
+                except asyncio.TimeoutError:
+                    yield b": latido\n\n"
+        finally:
+            cielo_en_vivo.desuscribir(cola, ubicacion)
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Máximo de cartas por serie de retornos (20 años de retornos lunares)
+MAX_RETORNOS = 260
+
+
+@app.get("/retornos")
+async def retornos(
+    request: Request,
+    anio: int = Query(..., ge=1500, description="Año de nacimiento"),
+    mes: int = Query(..., ge=1, le=12, description="Mes de nacimiento"),
+    dia: int = Query(..., ge=1, le=31, description="Día de nacimiento"),
+    hora: int = 12,
+    minuto: int = 0,
+    tz: Optional[float] = Query(None, description="Zona horaria del nacimiento (opcional, se detecta automáticamente)"),
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    ciudad: Optional[str] = Query(None, description="Ciudad de nacimiento (opcional)"),
+    pais: Optional[str] = Query(None, description="País de nacimiento (opcional)"),
+    tipo: str = Query("solar", description="solar, lunar o progresion"),
+    desde: Optional[str] = Query(None, description="Fecha inicial en UTC (ISO 8601, default: ahora)"),
+    cantidad: Optional[int] = Query(None, ge=1, le=MAX_RETORNOS, description="Cartas de la serie (default: 20 solares, 12 lunares)"),
+    lat_retorno: Optional[float] = Query(None, description="Latitud donde se levantan los retornos (default: la natal)"),
+    lon_retorno: Optional[float] = Query(None, description="Longitud donde se levantan los retornos (default: la natal)"),
+    casas: str = Query("placidus", description="Sistema(s) de casas separados por coma"),
+    extras: Optional[str] = Query(None, description="Cuerpos extra separados por coma"),
+    formato: Optional[str] = Query(None, pattern="^(json|msgpack)$", description="json o msgpack (default: según Accept)")
+):
+    """
+    Serie de retornos solares, retornos lunares o progresiones secundarias
+
+    Los instantes exactos se buscan en un solo trabajo, cada uno a partir del
+    anterior; después las cartas se reparten entre los workers del executor
+    y se calculan en paralelo. Las fechas son UTC. Las progresiones usan un
+    día después del nacimiento por cada año de vida, con casas en el lugar
+    natal. Como en `/carta`, con `Accept: application/msgpack` (o
+    `formato=msgpack`) cada carta va con el esquema compacto, y con
+    `Accept-Encoding` la respuesta se comprime.
+    """
+    sistemas, cuerpos_extra, error = _parse_casas_extras(casas, extras)
+    if error:
+        return error
+    if tipo not in TIPOS_SERIE:
+        return {"error": f"Tipo desconocido: {tipo}", "sugerencia": f"Usa alguno de: {', '.join(TIPOS_SERIE)}"}
+    try:
+        jd_desde = jd_from_datetime(datetime.fromisoformat(desde) if desde else datetime.utcnow())
+    except ValueError:
+        return {
+            "error": "Fecha inválida",
+            "sugerencia": "Usa el formato ISO 8601, por ejemplo 2024-01-01T00:00"
+        }
+    if cantidad is None:
+        cantidad = 12 if tipo == "lunar" else 20
+
+    registros, errores = await _resolver_registros([RegistroCarta(
+        anio=anio, mes=mes, dia=dia, hora=hora, minuto=minuto, tz=tz, lat=lat, lon=lon, ciudad=ciudad, pais=pais
+    )])
+    if errores:
+        return {**errores[0], "sugerencia": "Verifica el nombre de la ciudad o usa coordenadas directamente"}
+    _, registro = registros[0]
+
+    try:
+        resultado = await chart_executor.run(serie, tipo, registro, jd_desde, cantidad)
+    except ValueError as e:
+        return JSONResponse(status_code=422, content={
+            "error": str(e),
+            "sugerencia": "Verifica la fecha y la hora de nacimiento o indica la zona horaria con tz"
+        })
+    instantes = resultado["instantes"]
+    if tipo == "progresion" or lat_retorno is None or lon_retorno is None:
+        lat_retorno, lon_retorno = registro["lat"], registro["lon"]
+
+    # Un trabajo por worker, con las cartas repartidas en partes iguales
+    partes = max(1, min(chart_executor.workers, len(instantes)))
+    tamano = -(-len(instantes) // partes)
+    bloques = await asyncio.gather(*(
+        chart_executor.run(cartas_en_instantes, instantes[i:i + tamano], lat_retorno, lon_retorno,
+                           sistemas, cuerpos_extra)
+        for i in range(0, len(instantes), tamano)
+    ))
+    resultados = [item for bloque in bloques for item in bloque]
+    formato = negociar_formato(request.headers.get("accept", ""), formato)
+    codificacion = negociar_codificacion(request.headers.get("accept-encoding", ""))
+    if formato == "msgpack":
+        resultados = [{**item, "carta": compactar_carta(item["carta"])} for item in resultados]
+    return respuesta({
+        "tipo": tipo,
+        "natal": {
+            "jd": round(resultado["jd_natal"], 6),
+            "latitud": registro["lat"],
+            "longitud": registro["lon"],
+            "zona_horaria": resultado["zona_horaria"]
+        },
+        "ubicacion": {"latitud": lat_retorno, "longitud": lon_retorno},
+        "resultados": resultados,
+        "total": len(instantes)
+    }, formato, codificacion)
+
+
+# Tablas de eventos lunares por mes, compartidas por todas las zonas horarias
+calendario_lunar = CalendarioLunar(chart_executor)
+# Offset fijo máximo en horas para /calendario (las zonas reales van de -12 a +14)
+MAX_OFFSET_CALENDARIO = 14
+
+
+@app.get("/calendario")
+async def calendario(
+    anio: int = Query(..., ge=1500, le=2500, description="Año"),
+    mes: int = Query(..., ge=1, le=12, description="Mes"),
+    tz: Optional[str] = Query(None, description="Zona horaria: nombre IANA (ej. America/Argentina/Buenos_Aires) u offset en horas"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Latitud para detectar la zona horaria (opcional)"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Longitud para detectar la zona horaria (opcional)")
+):
+    """
+    Calendario lunar de un mes
+
+    Fases exactas (lunas nuevas, llenas y cuartos), ingresos de la Luna en
+    cada signo, períodos de Luna vacía de curso y la fase y el signo de cada
+    día. Los eventos de cada mes UTC se calculan una sola vez y se guardan;
+    cada pedido solo los convierte a su zona horaria (por defecto UTC, o la
+    de `lat`/`lon` si se indican).
+    """
+    zona = 0.0
+    if tz is not None:
+        try:
+            zona = float(tz)
+        except ValueError:
+            zona = tz if zona_valida(tz) else None
+        # `not <=` también rechaza nan e inf
+        if zona is None or (isinstance(zona, float) and not abs(zona) <= MAX_OFFSET_CALENDARIO):
+            return {
+                "error": f"Zona horaria desconocida: {tz}",
+                "sugerencia": "Usa un nombre IANA como America/Argentina/Buenos_Aires o un offset en horas como -3"
+            }
+    elif lat is not None and lon is not None:
+        # Buscar la zona carga TimezoneFinder: en el executor, no en el event loop
+        zona = await chart_executor.run(timezone_name_at, lat, lon) or 0.0
+
+    resultado = await calendario_lunar.mes_local(anio, mes, zona)
+    return {"anio": anio, "mes": mes, "zona_horaria": zona, **resultado}
+
+
+# Registros por trabajo del executor al calcular vectores de sinastría
+TAMANO_BLOQUE_SINASTRIA = 256
+# Candidatos máximos por pedido de sinastría
+MAX_CANDIDATOS_SINASTRIA = 20000
+# Vectores de longitudes ya calculados, por datos de nacimiento
+vectores_cache = TTLCache(int(os.getenv("SINASTRIA_CACHE_SIZE", "100000")), float("inf"))
+
+
+class CandidatoSinastria(RegistroCarta):
+    """Candidato de sinastría: datos de nacimiento o longitudes ya calculadas."""
+    id: str
+    anio: Optional[int] = Field(None, ge=1500)
+    mes: Optional[int] = Field(None, ge=1, le=12)
+    dia: Optional[int] = Field(None, ge=1, le=31)
+    longitudes: Optional[List[float]] = Field(
+        None, min_length=len(NOMBRES_PLANETAS), max_length=len(NOMBRES_PLANETAS),
+        description="Longitudes precalculadas, en el orden de PLANETAS"
+    )
+
+
+class PedidoSinastria(BaseModel):
+    perfil: RegistroCarta
+    candidatos: List[CandidatoSinastria] = Field(..., max_length=MAX_CANDIDATOS_SINASTRIA)
+    limite: int = Field(20, ge=1, le=1000)
+    compuesta: bool = False
+
+
+def _clave_vector(registro: dict):
+    return (registro["anio"], registro["mes"], registro["dia"], registro["hora"], registro["minuto"],
+            registro["tz"], round(registro["lat"], 4), round(registro["lon"], 4))
+
+
+async def _vectores(registros: List[dict]):
+    """
+    Longitudes de cada registro, calculando en paralelo solo las que no están
+    en caché, y un dict índice -> mensaje con los registros inválidos.
+    """
+    vectores = np.empty((len(registros), len(NOMBRES_PLANETAS)))
+    errores = {}
+    faltantes = []
+    for i, registro in enumerate(registros):
+        vector = vectores_cache.get(_clave_vector(registro))
+        if vector is None:
+            faltantes.append(i)
+        else:
+            vectores[i] = vector
+    bloques = [faltantes[i:i + TAMANO_BLOQUE_SINASTRIA]
+               for i in range(0, len(faltantes), TAMANO_BLOQUE_SINASTRIA)]
+
+    # Como en /cartas: una ventana de bloques en vuelo por worker, así un
+    # pedido grande no ocupa toda la capacidad del executor
+    ventana = asyncio.Semaphore(max(1, chart_executor.workers))
+
+    async def calcular_bloque(bloque):
+        async with ventana:
+            while True:
+                try:
+                    return await chart_executor.run(vectores_registros, [registros[i] for i in bloque])
+                except ExecutorSaturado as e:
+                    await asyncio.sleep(e.retry_after)
+
+    # El primer bloque se calcula solo: con el executor saturado, 503 de inmediato
+    calculados = [await chart_executor.run(vectores_registros, [registros[i] for i in bloques[0]])] if bloques else []
+    calculados += await asyncio.gather(*(calcular_bloque(bloque) for bloque in bloques[1:]))
+    for bloque, (matriz, errores_bloque) in zip(bloques, calculados):
+        for j, (i, vector) in enumerate(zip(bloque, matriz)):
+            if j in errores_bloque:
+                errores[i] = errores_bloque[j]
+                continue
+            vectores[i] = vector
+            vectores_cache.set(_clave_vector(registros[i]), vector)
+    return vectores, errores
+
+
+@app.post("/sinastria")
+async def sinastria(request: Request, pedido: PedidoSinastria):
+    """
+    Compatibilidad de un perfil contra muchos candidatos
+
+    Calcula de una vez la matriz de aspectos cruzados entre los planetas del
+    perfil y los de cada candidato y devuelve los candidatos ordenados por
+    puntaje. Los candidatos pueden enviar sus `longitudes` ya calculadas.
+    Como en `/cartas`, la respuesta va en MessagePack con
+    `Accept: application/msgpack` y comprimida según `Accept-Encoding`.
+    """
+    perfil, errores_perfil = await _resolver_registros([pedido.perfil])
+    if errores_perfil:
+        return errores_perfil[0]
+
+    con_fecha = [c for c in pedido.candidatos if c.longitudes is None]
+    incompletos = [c.id for c in con_fecha if c.anio is None or c.mes is None or c.dia is None]
+    if incompletos:
+        return {
+            "error": f"Candidatos sin fecha ni longitudes: {', '.join(incompletos[:10])}",
+            "sugerencia": "Envía anio, mes y dia, o las longitudes precalculadas"
+        }
+    resueltos, errores = await _resolver_registros(con_fecha)
+
+    vectores, invalidos = await _vectores([perfil[0][1]] + [registro for _, registro in resueltos])
+    if 0 in invalidos:
+        return JSONResponse(status_code=422, content={
+            "error": f"Perfil inválido: {invalidos[0]}",
+            "sugerencia": "Verifica la fecha y la hora de nacimiento o indica la zona horaria con tz"
+        })
+    vector_perfil = vectores[0]
+    for k, mensaje in invalidos.items():
+        errores[resueltos[k - 1][0]] = {"error": mensaje}
+    validos = [k for k in range(1, len(vectores)) if k not in invalidos]
+    ids = [con_fecha[resueltos[k - 1][0]].id for k in validos]
+    filas = [vectores[validos]]
+    precalculados = [c for c in pedido.candidatos if c.longitudes is not None]
+    if precalculados:
+        ids += [c.id for c in precalculados]
+        filas.append(np.array([c.longitudes for c in precalculados], dtype=np.float64))
+    matriz = np.concatenate(filas)
+
+    # El ranking es CPU y memoria: va al executor, no al event loop
+    mejores = await chart_executor.run(mejores_candidatos, vector_perfil, matriz, pedido.limite, pedido.compuesta)
+    resultados = [{"id": ids[resultado.pop("fila")], **resultado} for resultado in mejores]
+
+    contenido = {
+        "resultados": resultados,
+        "total_candidatos": len(ids),
+        "errores": [{"id": con_fecha[i].id, **error} for i, error in errores.items()]
+    }
+    formato = negociar_formato(request.headers.get("accept", ""))
+    codificacion = negociar_codificacion(request.headers.get("accept-encoding", ""))
+    return respuesta(contenido, formato, codificacion)
@@ -0,0 +1,141 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Buckets en segundos: desde hits de caché (~µs) hasta Nominatim con reintentos
+BUCKETS_ETAPAS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+DURACION_PEDIDOS = Histogram(
+    "astrology_request_duration_seconds", "Duración de cada pedido HTTP",
+    ["method", "path", "status"], buckets=BUCKETS_ETAPAS
+)
+DURACION_ETAPAS = Histogram(
+    "astrology_stage_duration_seconds", "Duración de cada etapa dentro de un pedido",
+    ["etapa"], buckets=BUCKETS_ETAPAS
+)
+CACHE_CONSULTAS = Counter(
+    "astrology_cache_lookups_total", "Consultas a las cachés por tabla, capa y resultado",
+    ["tabla", "capa", "resultado"]
+)
+NOMINATIM_LLAMADAS = Counter(
+    "astrology_nominatim_requests_total", "Llamadas HTTP a Nominatim por ruta y código de estado",
+    ["ruta", "estado"]
+)
+NOMINATIM_ERRORES = Counter(
+    "astrology_nominatim_errors_total", "Errores de red o HTTP al llamar a Nominatim",
+    ["ruta", "tipo"]
+)
+TYPEAHEAD_RESPUESTAS = Counter(
+    "astrology_typeahead_responses_total",
+    "Respuestas de /buscar_ciudades por origen: exacta, prefijo, busqueda o reemplazada",
+    ["origen"]
+)
+CIELO_TICKS = Counter(
+    "astrology_live_sky_ticks_total", "Actualizaciones calculadas del cielo actual (/cielo)"
+)
+# Con varios workers de uvicorn se suman los valores de todos los procesos vivos
+EXECUTOR_EN_CURSO = Gauge(
+    "astrology_executor_in_flight", "Trabajos en curso o en cola en el executor de cartas",
+    multiprocess_mode="livesum"
+)
+EXECUTOR_CAPACIDAD = Gauge(
+    "astrology_executor_capacity", "Trabajos que admite el executor antes de responder 503",
+    multiprocess_mode="livesum"
+)
+CIELO_SUSCRIPTORES = Gauge(
+    "astrology_live_sky_subscribers", "Clientes conectados a /cielo",
+    multiprocess_mode="livesum"
+)
+
+# Etapas medidas en el pedido actual: lista de (nombre, segundos)
+_etapas: contextvars.ContextVar = contextvars.ContextVar("etapas", default=None)
+
+
+@contextmanager
+def etapa(nombre: str):
+    """
+    Mide un bloque: lo registra en el histograma de etapas y, si hay un
+    pedido en curso, lo agrega a su encabezado Server-Timing.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        DURACION_ETAPAS.labels(nombre).observe(duracion)
+        etapas = _etapas.get()
+        if etapas is not None:
+            etapas.append((nombre, duracion))
+
+
+def registrar_cache(tabla: str, capa: str, hit: bool):
+    CACHE_CONSULTAS.labels(tabla, capa, "hit" if hit else "miss").inc()
+
+
+def server_timing(etapas, total: float) -> str:
+    """Valor del encabezado Server-Timing; las etapas repetidas se suman."""
+    acumulado = {}
+    for nombre, duracion in etapas:
+        acumulado[nombre] = acumulado.get(nombre, 0.0) + duracion
+    partes = [f"{nombre};dur={duracion * 1000:.2f}" for nombre, duracion in acumulado.items()]
+    partes.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(partes)
+
+
+def metrics_response():
+    """
+    Cuerpo y content type de /metrics en el formato de texto de Prometheus.
+
+    Con varios workers (PROMETHEUS_MULTIPROC_DIR definida) se agregan las
+    métricas que cada proceso escribe en ese directorio.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada pedido HTTP y agrega el encabezado
+    Server-Timing con el desglose de las etapas medidas con `etapa()`.
+
+    La etiqueta `path` es la plantilla de la ruta (ej. /carta), no la URL
+    con parámetros, para acotar la cardinalidad.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        etapas = []
+        token = _etapas.set(etapas)
+        inicio = time.perf_counter()
+        estado = 500
+
+        async def send_con_timing(message):
+            nonlocal estado
+            if message["type"] == "http.response.start":
+                estado = message["status"]
+                total = time.perf_counter() - inicio
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(etapas, total).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_timing)
+        finally:
+            _etapas.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "otro")
+            DURACION_PEDIDOS.labels(scope["method"], path, str(estado)).observe(time.perf_counter() - inicio)
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Limitador de tasa tipo token bucket para corrutinas.
+
+    Repone `rate` tokens por segundo hasta un máximo de `burst`. Cada
+    `acquire()` consume un token y espera lo necesario si no hay ninguno.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # El lock hace que los que esperan se atiendan en orden de llegada
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def penalize(self, seconds: float):
+        """Vacía el bucket para que no se emitan llamadas durante `seconds` (ej. tras un 429)."""
+        self._refill()
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
@@ -0,0 +1,115 @@
+import swisseph as swe
+from typing import Dict, List, Tuple
+
+from eventos import TOLERANCIA, _diferencia, _posicion, jd_a_fecha
+from util import PLANETAS, get_chart_jd, zona_registro
+
+# Períodos medios en días: el instante de cada retorno se busca a partir
+# del anterior más un período
+ANIO_TROPICAL = 365.24219
+MES_TROPICAL = 27.32158
+
+PERIODOS = {"sol": ANIO_TROPICAL, "luna": MES_TROPICAL}
+
+# Tipo de retorno -> planeta
+TIPOS_RETORNO = {"solar": "sol", "lunar": "luna"}
+TIPOS_SERIE = tuple(TIPOS_RETORNO) + ("progresion",)
+
+# Iteraciones de Newton por retorno (converge en 2-4 desde una buena semilla)
+MAX_ITERACIONES = 30
+
+
+def jd_natal(registro: Dict, tz_default: float = -3) -> Tuple[float, float]:
+    """
+    Día juliano (UT) y zona horaria de un registro de nacimiento (las claves
+    de `/carta`). Si `tz` es None se resuelve a partir de las coordenadas,
+    igual que en get_charts_batch; lanza ValueError con una fecha inválida.
+    """
+    tz = zona_registro(registro, tz_default)
+    anio, mes, dia = registro["anio"], registro["mes"], registro["dia"]
+    hora = registro.get("hora", 12)
+    minuto = registro.get("minuto", 0)
+    return swe.julday(anio, mes, dia, hora + minuto / 60 - tz), tz
+
+
+def _retorno(id_planeta: int, objetivo: float, jd: float) -> float:
+    """Instante más cercano a `jd` en que el planeta vuelve a `objetivo` (Newton)."""
+    for _ in range(MAX_ITERACIONES):
+        longitud, velocidad = _posicion(jd, id_planeta)
+        paso = _diferencia(longitud, objetivo) / velocidad
+        jd -= paso
+        if abs(paso) < TOLERANCIA:
+            return jd
+    raise ValueError(f"El retorno cerca del día juliano {jd:.2f} no convergió")
+
+
+def instantes_retorno(planeta: str, jd_nacimiento: float, jd_desde: float, cantidad: int) -> List[float]:
+    """
+    Los `cantidad` retornos del planeta a su longitud natal a partir de
+    `jd_desde`. Cada uno se busca desde el anterior más el período medio,
+    así que cuesta unas pocas posiciones y no una búsqueda en todo el rango.
+    """
+    id_planeta = PLANETAS[planeta]
+    periodo = PERIODOS[planeta]
+    objetivo = _posicion(jd_nacimiento, id_planeta)[0]
+    # Nunca antes del nacimiento (ese sería el retorno cero)
+    jd_desde = max(jd_desde, jd_nacimiento + periodo / 2)
+
+    falta = (objetivo - _posicion(jd_desde, id_planeta)[0]) % 360
+    jd = _retorno(id_planeta, objetivo, jd_desde + falta / 360 * periodo)
+    if jd < jd_desde:
+        jd = _retorno(id_planeta, objetivo, jd + periodo)
+
+    instantes = [jd]
+    while len(instantes) < cantidad:
+        instantes.append(_retorno(id_planeta, objetivo, instantes[-1] + periodo))
+    return instantes
+
+
+def instantes_progresion(jd_nacimiento: float, jd_desde: float, cantidad: int,
+                         paso_anios: float = 1.0) -> List[Tuple[float, float]]:
+    """
+    Progresiones secundarias (un día por año): pares (jd de la fecha, jd
+    progresado) cada `paso_anios` a partir de `jd_desde`.
+    """
+    pares = []
+    for k in range(cantidad):
+        jd_fecha = jd_desde + k * paso_anios * ANIO_TROPICAL
+        pares.append((jd_fecha, jd_nacimiento + (jd_fecha - jd_nacimiento) / ANIO_TROPICAL))
+    return pares
+
+
+def serie(tipo: str, registro: Dict, jd_desde: float, cantidad: int) -> Dict:
+    """
+    Instantes de una serie de retornos (`solar` o `lunar`) o de progresiones
+    para un registro de nacimiento. Solo busca los instantes: las cartas se
+    calculan aparte con `cartas_en_instantes`, en paralelo.
+    """
+    jd_nacimiento, tz = jd_natal(registro)
+    if tipo == "progresion":
+        instantes = instantes_progresion(jd_nacimiento, jd_desde, cantidad)
+    else:
+        jds = instantes_retorno(TIPOS_RETORNO[tipo], jd_nacimiento, jd_desde, cantidad)
+        instantes = [(jd, jd) for jd in jds]
+    return {"jd_natal": jd_nacimiento, "zona_horaria": tz, "instantes": instantes}
+
+
+def cartas_en_instantes(instantes: List[Tuple[float, float]], lat: float, lon: float,
+                        sistema_casas="placidus", extras=()) -> List[Dict]:
+    """
+    Carta de cada par (jd de la fecha, jd de la carta) de `serie`. En los
+    retornos ambos coinciden; en las progresiones la carta es la del día
+    progresado.
+    """
+    resultado = []
+    for jd_fecha, jd_carta in instantes:
+        item = {
+            "jd": round(jd_fecha, 6),
+            "fecha": jd_a_fecha(jd_fecha).isoformat(timespec="seconds"),
+        }
+        if jd_carta != jd_fecha:
+            item["jd_progresado"] = round(jd_carta, 6)
+            item["fecha_progresada"] = jd_a_fecha(jd_carta).isoformat(timespec="seconds")
+        item["carta"] = get_chart_jd(jd_carta, lat, lon, sistema_casas, extras)
+        resultado.append(item)
+    return resultado
@@ -0,0 +1,137 @@
+import numpy as np
+import swisseph as swe
+
+from util import ASPECTOS, PLANETAS, SIGNS, zona_registro
+
+# Peso de cada aspecto en el puntaje de compatibilidad: los armónicos suman
+# y los tensos restan. Cada aspecto pesa más cuanto más exacto es.
+PESOS_ASPECTOS = {
+    "conjunción": 1.0,
+    "sextil": 1.0,
+    "trígono": 2.0,
+    "cuadratura": -1.0,
+    "oposición": -1.0
+}
+
+# Candidatos por bloque al calcular puntajes: acota los temporales de
+# matriz_aspectos (~8 MB por array de forma (bloque, P, P, aspectos))
+TAMANO_BLOQUE_RANKING = 2048
+
+NOMBRES_PLANETAS = list(PLANETAS.keys())
+_IDS_PLANETAS = list(PLANETAS.values())
+_ANGULOS = np.array([angulo for angulo, _, _ in ASPECTOS], dtype=np.float64)
+_ORBES = np.array([orbe for _, _, orbe in ASPECTOS], dtype=np.float64)
+_PESOS = np.array([PESOS_ASPECTOS[nombre] for _, nombre, _ in ASPECTOS], dtype=np.float64)
+_NOMBRES_ASPECTOS = [nombre for _, nombre, _ in ASPECTOS]
+
+
+def vector_longitudes(y, m, d, h=12, mi=0, s=0, tz=0):
+    """Longitudes de los planetas de PLANETAS (en ese orden) para una fecha local."""
+    jd_ut = swe.julday(y, m, d, h + mi / 60 + s / 3600 - tz)
+    return np.array([swe.calc_ut(jd_ut, id_planeta, swe.FLG_SWIEPH)[0][0]
+                     for id_planeta in _IDS_PLANETAS])
+
+
+def vectores_registros(registros, tz_default=-3):
+    """
+    Matriz (N, planetas) de longitudes para una lista de registros con las
+    claves de `/carta`. Si `tz` es None se resuelve por coordenadas. Devuelve
+    también un dict índice -> mensaje con los registros inválidos (fecha
+    inexistente, hora en un cambio de horario), cuyas filas quedan en NaN.
+    """
+    vectores = np.full((len(registros), len(_IDS_PLANETAS)), np.nan)
+    errores = {}
+    for i, r in enumerate(registros):
+        try:
+            tz = zona_registro(r, tz_default)
+        except ValueError as e:
+            errores[i] = str(e)
+            continue
+        vectores[i] = vector_longitudes(r["anio"], r["mes"], r["dia"], r["hora"], r["minuto"], 0, tz)
+    return vectores, errores
+
+
+def matriz_aspectos(vector, matriz):
+    """
+    Aspectos cruzados entre un perfil y N candidatos en una sola operación.
+
+    `vector` tiene forma (P,) y `matriz` (N, P). Devuelve dos arrays de forma
+    (N, P, P): el índice en ASPECTOS del aspecto entre el planeta i del
+    perfil y el j del candidato (-1 si no hay) y su orbe.
+    """
+    separacion = np.abs(vector[None, :, None] - matriz[:, None, :]) % 360
+    separacion = np.minimum(separacion, 360 - separacion)
+    desvio = np.abs(separacion[..., None] - _ANGULOS)
+    dentro = desvio <= _ORBES
+    # Los orbes de ASPECTOS no se superponen: hay a lo sumo un aspecto por par
+    indices = np.where(dentro.any(axis=-1), dentro.argmax(axis=-1), -1).astype(np.int8)
+    orbes = np.take_along_axis(desvio, np.maximum(indices, 0)[..., None], axis=-1)[..., 0]
+    return indices, orbes
+
+
+def puntajes(indices, orbes):
+    """Puntaje de compatibilidad por candidato a partir de `matriz_aspectos`."""
+    hay = indices >= 0
+    exactitud = np.where(hay, 1 - orbes / _ORBES[np.maximum(indices, 0)], 0)
+    return (np.where(hay, _PESOS[np.maximum(indices, 0)], 0) * exactitud).sum(axis=(1, 2))
+
+
+def aspectos_de(indices, orbes, fila):
+    """Lista de aspectos de un candidato, con el formato de get_chart."""
+    aspectos = []
+    for i, j in zip(*np.nonzero(indices[fila] >= 0)):
+        aspectos.append({
+            "planeta1": NOMBRES_PLANETAS[i],
+            "planeta2": NOMBRES_PLANETAS[j],
+            "aspecto": _NOMBRES_ASPECTOS[indices[fila, i, j]],
+            "orbe": round(float(orbes[fila, i, j]), 2)
+        })
+    return aspectos
+
+
+def carta_compuesta(vector1, vector2):
+    """Carta compuesta: punto medio por el arco más corto de cada par de planetas."""
+    diferencia = (vector2 - vector1) % 360
+    medios = np.where(diferencia > 180, vector1 + (diferencia - 360) / 2, vector1 + diferencia / 2) % 360
+    return {
+        nombre: {"signo": SIGNS[int(grado // 30)], "grado": round(float(grado), 4)}
+        for nombre, grado in zip(NOMBRES_PLANETAS, medios)
+    }
+
+
+def ranking(vector, matriz, limite=20, bloque=TAMANO_BLOQUE_RANKING):
+    """
+    Los `limite` candidatos con mayor puntaje, de mayor a menor. Los puntajes
+    se calculan por bloques de `bloque` filas, así que la memoria no crece
+    con la cantidad de candidatos, y la matriz de aspectos se arma de nuevo
+    solo para los elegidos. Devuelve (filas, puntajes, indices, orbes), con
+    `indices` y `orbes` en el orden de `filas`.
+    """
+    total = np.empty(len(matriz))
+    for inicio in range(0, len(matriz), bloque):
+        total[inicio:inicio + bloque] = puntajes(*matriz_aspectos(vector, matriz[inicio:inicio + bloque]))
+    limite = min(limite, len(total))
+    mejores = np.argpartition(-total, limite - 1)[:limite] if limite else np.array([], dtype=int)
+    mejores = mejores[np.argsort(-total[mejores], kind="stable")]
+    indices, orbes = matriz_aspectos(vector, matriz[mejores])
+    return mejores, total[mejores], indices, orbes
+
+
+def mejores_candidatos(vector, matriz, limite=20, compuesta=False):
+    """
+    Resultados de `/sinastria` para los `limite` mejores candidatos: fila en
+    `matriz`, puntaje, aspectos y, con `compuesta`, la carta compuesta. Es
+    el trabajo pesado del endpoint y corre en el executor de cartas.
+    """
+    filas, total, indices, orbes = ranking(vector, matriz, limite)
+    resultados = []
+    for k, fila in enumerate(filas):
+        resultado = {
+            "fila": int(fila),
+            "puntaje": round(float(total[k]), 3),
+            "aspectos": aspectos_de(indices, orbes, k)
+        }
+        if compuesta:
+            resultado["compuesta"] = carta_compuesta(vector, matriz[fila])
+        resultados.append(resultado)
+    return resultados
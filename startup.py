@@ -0,0 +1,216 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from cache_admin import CACHE_MAINTENANCE_INTERVAL, GEOCODING_SEED_FILE, importar, mantener, mantener_cartas
+from geocoding import CACHE_COLUMNS, DB_PATH
+from typeahead import TYPEAHEAD_FETCH_LIMIT
+
+# Calentar la caché de geocodificación al iniciar
+WARMUP = os.getenv("WARMUP", "1") == "1"
+# Archivo con las ciudades a calentar: una por línea, "ciudad" o "ciudad | país"
+WARMUP_CITIES_FILE = os.getenv("WARMUP_CITIES_FILE", "warmup_cities.txt")
+# Entradas más recientes de cada tabla de SQLite que se copian a memoria
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "500"))
+# Ciudades que se calientan a la vez (el limitador de Nominatim sigue aplicando)
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+# Lock de archivo: con varios workers solo el que lo obtiene consulta Nominatim
+WARMUP_LOCK_FILE = os.getenv("WARMUP_LOCK_FILE", os.path.join(os.path.dirname(DB_PATH) or ".", "warmup.lock"))
+
+
+@contextmanager
+def liderazgo(path: str = WARMUP_LOCK_FILE):
+    """
+    Elige un líder entre los procesos que comparten `path`: devuelve True
+    en el proceso que obtiene el lock y False en los demás. El lock se
+    libera al salir del bloque (o si el proceso muere).
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # Sin fcntl (Windows) no hay varios workers que coordinar
+        yield True
+        return
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def leer_ciudades(path: str = WARMUP_CITIES_FILE) -> List[Tuple[str, str]]:
+    """Lee la lista de ciudades a calentar; ignora líneas vacías y comentarios (#)."""
+    if not path or not os.path.exists(path):
+        return []
+    ciudades = []
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.split("#", 1)[0].strip()
+            if not linea:
+                continue
+            ciudad, _, pais = linea.partition("|")
+            ciudades.append((ciudad.strip(), pais.strip()))
+    return ciudades
+
+
+async def calentar_cache(geocoding, ciudades: List[Tuple[str, str]], top_n: int = WARMUP_TOP_N,
+                         concurrencia: int = WARMUP_CONCURRENCY) -> Dict[str, int]:
+    """
+    Calienta la caché de geocodificación en dos pasos (antes, el líder
+    importa GEOCODING_SEED_FILE si existe):
+
+    1. Copia a memoria las `top_n` entradas más recientes de cada tabla de
+       SQLite (sin red).
+    2. Resuelve coordenadas, búsqueda y reverse geocoding de las ciudades de
+       la lista que todavía no están en disco, en paralelo y bajo el mismo
+       limitador de tasa que los pedidos normales. Si todas ya están en
+       disco, este paso se omite. Con varios workers, solo el líder lo hace.
+    """
+    resumen = {}
+    if GEOCODING_SEED_FILE and os.path.exists(GEOCODING_SEED_FILE):
+        with liderazgo() as lider:
+            if lider:
+                resumen["semilla"] = await asyncio.to_thread(importar, geocoding.db_path, GEOCODING_SEED_FILE)
+    for table in CACHE_COLUMNS:
+        resumen[table] = await asyncio.to_thread(geocoding.precargar_memoria, table, top_n)
+
+    claves = {geocoding.coordinates_query(ciudad, pais): (ciudad, pais) for ciudad, pais in ciudades}
+    en_disco = await asyncio.to_thread(geocoding.consultas_en_cache, "coordinates_cache", list(claves))
+    faltantes = [ciudad for clave, ciudad in claves.items() if clave not in en_disco]
+    resumen["ciudades_en_disco"] = len(en_disco)
+    resumen["ciudades_consultadas"] = len(faltantes)
+    if not faltantes:
+        print("✅ Caché de geocodificación ya caliente, no se consulta Nominatim")
+        return resumen
+
+    with liderazgo() as lider:
+        if not lider:
+            print("⏭️ Otro worker está calentando la caché de geocodificación")
+            resumen["ciudades_consultadas"] = 0
+            return resumen
+        await _consultar_ciudades(geocoding, faltantes, concurrencia)
+        # Confirmar en disco antes de soltar el lock, para los demás workers
+        await geocoding.flush_writes()
+    return resumen
+
+
+async def _consultar_ciudades(geocoding, ciudades: List[Tuple[str, str]], concurrencia: int):
+    semaforo = asyncio.Semaphore(max(1, concurrencia))
+
+    async def calentar(ciudad: str, pais: str):
+        async with semaforo:
+            try:
+                coords = await geocoding.get_coordinates(ciudad, pais)
+                # Con el límite del autocompletado, que es quien lee esta caché
+                await geocoding.search_cities(ciudad, limit=TYPEAHEAD_FETCH_LIMIT)
+                if coords:
+                    await geocoding.get_city_info(*coords)
+            except Exception as e:
+                print(f"❌ Error cacheando {ciudad}: {e}")
+
+    await asyncio.gather(*(calentar(ciudad, pais) for ciudad, pais in ciudades))
+
+
+async def mantenimiento_periodico(geocoding, cartas=None, intervalo: float = CACHE_MAINTENANCE_INTERVAL):
+    """
+    Cada `intervalo` segundos purga la caché de geocodificación en disco
+    (ver cache_admin.mantener) y, si `cartas` guarda en disco, aplica sus
+    límites (cache_admin.mantener_cartas). Con varios workers lo hace solo
+    uno por vez.
+    """
+    while True:
+        await asyncio.sleep(intervalo)
+        with liderazgo() as lider:
+            if not lider:
+                continue
+            try:
+                await geocoding.flush_writes()
+                resumen = await asyncio.to_thread(mantener, geocoding.db_path)
+                print(f"🧹 Mantenimiento de caché: {resumen}")
+                if cartas is not None and cartas.disk:
+                    resumen = await asyncio.to_thread(mantener_cartas, cartas.db_path)
+                    print(f"🧹 Mantenimiento de caché de cartas: {resumen}")
+            except Exception as e:
+                print(f"❌ Error en el mantenimiento de caché: {e}")
+
+
+class Arranque:
+    """
+    Etapas de arranque en segundo plano y estado de readiness.
+
+    El servidor acepta conexiones de inmediato (`/health` responde), pero
+    `/ready` solo da 200 cuando terminaron las etapas requeridas: el
+    gazetteer cargado y los workers del executor iniciados con sus módulos
+    pesados. El calentamiento de la caché no bloquea la readiness.
+    """
+
+    REQUERIDAS = ("gazetteer", "executor")
+
+    def __init__(self):
+        self.etapas = {"gazetteer": "pendiente", "executor": "pendiente", "cache": "pendiente"}
+        self.duraciones: Dict[str, float] = {}
+        self.detalle: Dict[str, Dict] = {}
+        self._tarea = None
+        self._mantenimiento = None
+
+    @property
+    def listo(self) -> bool:
+        return all(self.etapas[etapa] == "listo" for etapa in self.REQUERIDAS)
+
+    def resumen(self) -> Dict:
+        return {
+            "listo": self.listo,
+            "etapas": dict(self.etapas),
+            "duraciones_s": {etapa: round(d, 3) for etapa, d in self.duraciones.items()},
+            "detalle": self.detalle
+        }
+
+    async def _etapa(self, nombre: str, corrutina):
+        self.etapas[nombre] = "en_curso"
+        inicio = time.perf_counter()
+        try:
+            resultado = await corrutina
+        except Exception as e:
+            self.etapas[nombre] = "error"
+            print(f"❌ Error en la etapa de arranque {nombre}: {e}")
+            return None
+        self.duraciones[nombre] = time.perf_counter() - inicio
+        self.etapas[nombre] = "listo"
+        return resultado
+
+    async def _gazetteer_y_cache(self, geocoding):
+        await self._etapa("gazetteer", asyncio.to_thread(geocoding.cargar_gazetteer))
+        if not WARMUP:
+            self.etapas["cache"] = "omitido"
+            return
+        resumen = await self._etapa("cache", calentar_cache(geocoding, leer_ciudades()))
+        if resumen is not None:
+            self.detalle["cache"] = resumen
+
+    async def _executor(self, executor):
+        procesos = await self._etapa("executor", executor.precalentar())
+        if procesos is not None:
+            self.detalle["executor"] = {"procesos": procesos}
+
+    async def correr(self, geocoding, executor):
+        print("🚀 Iniciando etapas de arranque...")
+        await asyncio.gather(self._gazetteer_y_cache(geocoding), self._executor(executor))
+        print(f"✅ Arranque completado: {self.etapas}")
+
+    def iniciar(self, geocoding, executor, cartas=None):
+        """Lanza las etapas y el mantenimiento periódico en segundo plano y vuelve de inmediato."""
+        self._tarea = asyncio.create_task(self.correr(geocoding, executor))
+        if CACHE_MAINTENANCE_INTERVAL > 0:
+            self._mantenimiento = asyncio.create_task(mantenimiento_periodico(geocoding, cartas))
+        return self._tarea
+
+
+# Estado global del arranque
+arranque = Arranque()
@@ -0,0 +1,220 @@
+"""
+Tabla precalculada de efemérides para la precisión "rapida".
+
+Guarda longitud y velocidad de cada planeta a pasos fijos en archivos
+NumPy (.npy) que se abren con mmap, así que los procesos del executor
+comparten las páginas en memoria. Entre dos pasos la posición se obtiene
+con interpolación cúbica de Hermite (usa la longitud y la velocidad de
+ambos extremos). Al generar la tabla se mide el error contra Swiss
+Ephemeris y queda guardado en meta.json: con los pasos por defecto y el
+rango 1900-2100 el error máximo es de unos 5 segundos de arco (el peor
+planeta), más de diez veces menos que un minuto de arco. `estado` muestra el
+error medido de cada planeta.
+
+Uso (desde la raíz del repositorio):
+    python tabla_efemerides.py generar --desde 1900 --hasta 2100
+    python tabla_efemerides.py estado
+"""
+import argparse
+import json
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import swisseph as swe
+
+# Directorio de la tabla (por defecto, junto a los archivos de Swiss Ephemeris)
+EFEMERIDES_TABLA_DIR = os.getenv(
+    "EFEMERIDES_TABLA_DIR", os.path.join(os.getenv("EPH_PATH", "./ephe"), "tabla")
+)
+
+# Paso de la tabla en días por planeta, elegido para que el error de la
+# interpolación quede en segundos de arco (la Luna es la más exigente)
+PASOS_TABLA = {
+    "sol": 4.0,
+    "luna": 0.5,
+    "mercurio": 1.0,
+    "venus": 2.0,
+    "marte": 2.0,
+    "jupiter": 4.0,
+    "saturno": 4.0,
+    "urano": 4.0,
+    "neptuno": 4.0,
+    "pluton": 4.0
+}
+
+# Instantes al azar por planeta con los que se mide el error al generar
+MUESTRAS_VALIDACION = 20000
+
+_FLAGS = swe.FLG_SWIEPH | swe.FLG_SPEED
+
+
+def _hermite(p0, v0, p1, v1, paso, t):
+    """Longitud y velocidad interpoladas en la fracción `t` del intervalo (admite arrays)."""
+    # Diferencia por el camino corto: el intervalo puede cruzar 360° -> 0°
+    d = (p1 - p0 + 180) % 360 - 180
+    t2 = t * t
+    t3 = t2 * t
+    longitud = p0 + (3 * t2 - 2 * t3) * d + paso * ((t3 - 2 * t2 + t) * v0 + (t3 - t2) * v1)
+    velocidad = (6 * t - 6 * t2) * d / paso + (3 * t2 - 4 * t + 1) * v0 + (3 * t2 - 2 * t) * v1
+    return longitud % 360, velocidad
+
+
+class TablaEfemerides:
+    """
+    Lectura de la tabla generada con `generar`. Se carga la primera vez que
+    se usa; si no existe, `posicion` y `posiciones` devuelven None y quien
+    llama usa Swiss Ephemeris.
+    """
+
+    def __init__(self, directorio: str = EFEMERIDES_TABLA_DIR):
+        self.directorio = directorio
+        self.meta: Optional[Dict] = None
+        self._datos: Dict[str, np.ndarray] = {}
+        self._cargada = False
+
+    def cargar(self) -> bool:
+        if self._cargada:
+            return self.meta is not None
+        self._cargada = True
+        path_meta = os.path.join(self.directorio, "meta.json")
+        if not os.path.exists(path_meta):
+            return False
+        with open(path_meta, encoding="utf-8") as f:
+            self.meta = json.load(f)
+        for nombre in self.meta["planetas"]:
+            self._datos[nombre] = np.load(os.path.join(self.directorio, f"{nombre}.npy"), mmap_mode="r")
+        return True
+
+    def cubre(self, jd: float) -> bool:
+        return self.cargar() and self.meta["jd_inicio"] <= jd < self.meta["jd_fin"]
+
+    def posicion(self, nombre: str, jd: float) -> Optional[Tuple[float, float]]:
+        """(longitud, velocidad) interpoladas, o None fuera del rango de la tabla."""
+        if not self.cubre(jd) or nombre not in self._datos:
+            return None
+        paso = self.meta["planetas"][nombre]["paso"]
+        x = (jd - self.meta["jd_inicio"]) / paso
+        i = math.floor(x)
+        datos = self._datos[nombre]
+        # item() lee un escalar sin crear arrays intermedios
+        return _hermite(datos.item(i, 0), datos.item(i, 1), datos.item(i + 1, 0), datos.item(i + 1, 1),
+                        paso, x - i)
+
+    def posiciones(self, nombre: str, jds: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Versión vectorizada de `posicion`: None si algún instante queda fuera del rango."""
+        if len(jds) == 0 or not (self.cubre(float(jds.min())) and self.cubre(float(jds.max()))):
+            return None
+        if nombre not in self._datos:
+            return None
+        paso = self.meta["planetas"][nombre]["paso"]
+        x = (jds - self.meta["jd_inicio"]) / paso
+        i = np.floor(x).astype(np.int64)
+        datos = self._datos[nombre]
+        return _hermite(datos[i, 0], datos[i, 1], datos[i + 1, 0], datos[i + 1, 1], paso, x - i)
+
+    def resumen(self) -> Dict:
+        if not self.cargar():
+            return {"disponible": False, "directorio": self.directorio}
+        return {"disponible": True, "directorio": self.directorio, **self.meta}
+
+
+def _corregir_velocidades(datos: np.ndarray, paso: float, exactas_medio: np.ndarray) -> int:
+    """
+    Las velocidades de Swiss Ephemeris tienen saltos aislados (sobre todo
+    en los planetas lentos) que arruinan la interpolación a su alrededor.
+    En los intervalos cuyo punto medio queda muy lejos de la posición exacta
+    se reemplazan las velocidades de los extremos por diferencias centrales
+    de las longitudes, si eso mejora el punto medio. Devuelve cuántos
+    intervalos se corrigieron.
+    """
+    longitudes = np.degrees(np.unwrap(np.radians(datos[:, 0])))
+    diferencias = datos[:, 1].copy()
+    diferencias[1:-1] = (longitudes[2:] - longitudes[:-2]) / (2 * paso)
+
+    def error_medio(velocidades):
+        medio, _ = _hermite(datos[:-1, 0], velocidades[:-1], datos[1:, 0], velocidades[1:], paso, 0.5)
+        return np.abs((medio - exactas_medio + 180) % 360 - 180) * 3600
+
+    error_swe = error_medio(datos[:, 1])
+    error_dif = error_medio(diferencias)
+    malos = np.nonzero((error_swe > max(1.0, 10 * np.median(error_swe))) & (error_dif < error_swe))[0]
+    datos[malos, 1] = diferencias[malos]
+    datos[malos + 1, 1] = diferencias[malos + 1]
+    return len(malos)
+
+
+def generar(directorio: str, desde: int, hasta: int, planetas: Dict[str, int],
+            pasos: Dict[str, float] = PASOS_TABLA, muestras: int = MUESTRAS_VALIDACION) -> Dict:
+    """
+    Calcula la tabla para los años [desde, hasta) con Swiss Ephemeris y la
+    escribe en `directorio`. El error de la interpolación se mide en el
+    punto medio de cada intervalo y en `muestras` instantes al azar por
+    planeta, y el máximo queda en meta.json.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    jd_inicio = swe.julday(desde, 1, 1, 0.0)
+    jd_fin = swe.julday(hasta, 1, 1, 0.0)
+    meta = {
+        "desde": desde,
+        "hasta": hasta,
+        "jd_inicio": jd_inicio,
+        "jd_fin": jd_fin,
+        "generada": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "swisseph": swe.version,
+        "planetas": {}
+    }
+    rng = np.random.default_rng(0)
+    for nombre, id_planeta in planetas.items():
+        paso = pasos.get(nombre, 1.0)
+        # Un punto más allá del final para poder interpolar hasta jd_fin
+        n = int(np.ceil((jd_fin - jd_inicio) / paso)) + 2
+        jds = jd_inicio + np.arange(n) * paso
+        datos = np.array([swe.calc_ut(jd, id_planeta, _FLAGS)[0][:4:3] for jd in jds.tolist()], dtype=np.float64)
+        medios = np.array([swe.calc_ut(jd, id_planeta, _FLAGS)[0][0] for jd in (jds[:-1] + paso / 2).tolist()])
+        corregidos = _corregir_velocidades(datos, paso, medios)
+        np.save(os.path.join(directorio, f"{nombre}.npy"), datos)
+
+        prueba = np.concatenate([jds[:-1] + paso / 2, jd_inicio + rng.random(muestras) * (jd_fin - jd_inicio)])
+        exactas = np.concatenate([medios, [swe.calc_ut(jd, id_planeta, _FLAGS)[0][0] for jd in prueba[n - 1:].tolist()]])
+        i = np.floor((prueba - jd_inicio) / paso).astype(np.int64)
+        interpoladas, _ = _hermite(datos[i, 0], datos[i, 1], datos[i + 1, 0], datos[i + 1, 1], paso,
+                                   (prueba - jd_inicio) / paso - i)
+        error = float(np.abs((interpoladas - exactas + 180) % 360 - 180).max()) * 3600
+        meta["planetas"][nombre] = {"paso": paso, "filas": n, "error_max_arcsec": round(error, 3)}
+        print(f"🪐 {nombre}: {n} filas cada {paso} días, {corregidos} intervalos corregidos, "
+              f"error máximo {error:.3f}\"")
+
+    with open(os.path.join(directorio, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+# Tabla compartida por el proceso (cada worker del executor abre la suya con mmap)
+tabla_efemerides = TablaEfemerides()
+
+
+def main():
+    from util import PLANETAS
+
+    parser = argparse.ArgumentParser(description="Tabla precalculada de efemérides")
+    parser.add_argument("--dir", default=EFEMERIDES_TABLA_DIR, help="Directorio de la tabla")
+    sub = parser.add_subparsers(dest="orden", required=True)
+    gen = sub.add_parser("generar", help="Calcular la tabla con Swiss Ephemeris")
+    gen.add_argument("--desde", type=int, default=1900, help="Primer año cubierto")
+    gen.add_argument("--hasta", type=int, default=2100, help="Año final (excluido)")
+    sub.add_parser("estado", help="Rango cubierto y error medido por planeta")
+    args = parser.parse_args()
+
+    if args.orden == "generar":
+        inicio = time.perf_counter()
+        generar(args.dir, args.desde, args.hasta, PLANETAS)
+        print(f"💾 Tabla generada en {args.dir} ({time.perf_counter() - inicio:.1f}s)")
+    elif args.orden == "estado":
+        print(json.dumps(TablaEfemerides(args.dir).resumen(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+import pytest
+
+# Configuración antes de importar los módulos de la API: sin warmup ni
+# Nominatim, y las bases SQLite en un directorio temporal
+_DATOS = tempfile.mkdtemp(prefix="astrology-api-tests-")
+os.environ.setdefault("WARMUP", "0")
+os.environ.setdefault("CHART_WORKERS", "2")
+os.environ.setdefault("GEOCODING_DB_PATH", os.path.join(_DATOS, "geocoding_cache.db"))
+os.environ.setdefault("CALENDARIO_DB_PATH", os.path.join(_DATOS, "calendario.db"))
+
+# Madrid: el 2024-03-31 las 02:00-03:00 no existen (cambio a horario de verano)
+MADRID = {"lat": 40.4168, "lon": -3.7038}
+HUECO_MADRID = {"anio": 2024, "mes": 3, "dia": 31, "hora": 2, "minuto": 30, **MADRID}
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+    with TestClient(main.app) as c:
+        yield c
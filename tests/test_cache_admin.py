@@ -0,0 +1,58 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+
+from cache_admin import exportar, importar, mantener, recortar_filas
+from geocoding import init_cache_db
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _llenar(path, n, timestamp=None):
+    conn = init_cache_db(path)
+    ahora = time.time()
+    with conn:
+        for i in range(n):
+            momento = timestamp if timestamp is not None else ahora - n + i
+            conn.execute("INSERT INTO coordinates_cache VALUES (?, ?, ?, ?)",
+                         (f"ciudad {i},", json.dumps([i, i]), momento, momento))
+    return conn
+
+
+def test_recortar_filas_conserva_las_mas_usadas(tmp_path):
+    conn = _llenar(str(tmp_path / "geo.db"), 10)
+    assert recortar_filas(conn, 3)["coordinates_cache"] == 7
+    assert {q for (q,) in conn.execute("SELECT query FROM coordinates_cache")} == {"ciudad 7,", "ciudad 8,", "ciudad 9,"}
+
+
+def test_mantener_purga_vencidas(tmp_path):
+    path = str(tmp_path / "geo.db")
+    _llenar(path, 5, timestamp=1.0).close()
+    resumen = mantener(path)
+    assert resumen["vencidas"]["coordinates_cache"] == 5
+
+
+def test_exportar_e_importar(tmp_path):
+    origen, destino = str(tmp_path / "a.db"), str(tmp_path / "b.db")
+    _llenar(origen, 4).close()
+    archivo = str(tmp_path / "semilla.jsonl.gz")
+    assert exportar(origen, archivo) == 4
+    with gzip.open(archivo, "rt", encoding="utf-8") as f:
+        assert len(f.readlines()) == 4
+    assert importar(destino, archivo) == 4
+    assert init_cache_db(destino).execute("SELECT COUNT(*) FROM coordinates_cache").fetchone()[0] == 4
+
+
+def test_cli_fuera_de_la_raiz(tmp_path):
+    # Sin data/ en el directorio actual: importar geocoding no debe abrir la base por defecto
+    db = str(tmp_path / "otra.db")
+    env = {**os.environ, "PYTHONPATH": RAIZ}
+    env.pop("GEOCODING_DB_PATH", None)
+    salida = subprocess.run([sys.executable, os.path.join(RAIZ, "cache_admin.py"), "--db", db, "estado"],
+                            cwd=str(tmp_path), env=env, capture_output=True, text=True)
+    assert salida.returncode == 0, salida.stderr
+    assert json.loads(salida.stdout)["tablas"]["coordinates_cache"]["filas"] == 0
+    assert not (tmp_path / "data").exists()
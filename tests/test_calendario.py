@@ -0,0 +1,122 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from calendario import CalendarioLunar, buscar_fases, eventos_mes
+from eventos import jd_a_fecha
+from util import jd_from_datetime
+
+
+class ExecutorEnLinea:
+    """Corre los trabajos en el mismo proceso y los cuenta."""
+
+    workers = 1
+
+    def __init__(self):
+        self.trabajos = 0
+
+    async def run(self, funcion, *args):
+        self.trabajos += 1
+        await asyncio.sleep(0.01)
+        return funcion(*args)
+
+
+def _utc(jd):
+    return jd_a_fecha(jd).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def test_fases_conocidas():
+    inicio = jd_from_datetime(datetime(2024, 1, 1))
+    fases = buscar_fases(inicio, inicio + 31)
+    assert [f["fase"] for f in fases] == ["cuarto_menguante", "luna_nueva", "cuarto_creciente", "luna_llena"]
+    # Luna llena del 25/01/2024 a las 17:54 UTC, en Leo
+    llena = fases[-1]
+    assert abs((_utc(llena["jd"]) - datetime(2024, 1, 25, 17, 54)).total_seconds()) < 60
+    assert llena["signo"] == "Leo"
+
+
+def test_vacios_terminan_en_el_ingreso_siguiente():
+    eventos = eventos_mes(2024, 5)
+    ingresos = {e["jd"] for e in eventos["ingresos"]}
+    assert len(eventos["ingresos"]) >= 12
+    for vacio in eventos["vacios"]:
+        assert vacio["inicio_jd"] <= vacio["fin_jd"]
+        assert vacio["fin_jd"] in ingresos
+        # Un período vacío dura a lo sumo lo que la Luna tarda en cruzar un signo
+        assert vacio["fin_jd"] - vacio["inicio_jd"] < 3
+
+
+def test_mes_local_persistencia_y_zona(tmp_path):
+    path = str(tmp_path / "calendario.db")
+    executor = ExecutorEnLinea()
+    calendario = CalendarioLunar(executor, db_path=path)
+
+    async def escenario():
+        # Pedidos simultáneos del mismo mes comparten el cálculo
+        utc, local, _ = await asyncio.gather(
+            calendario.mes_local(2024, 1, 0.0),
+            calendario.mes_local(2024, 1, "America/Argentina/Buenos_Aires"),
+            calendario.mes_local(2024, 1, -3.0)
+        )
+        return utc, local
+
+    utc, local = asyncio.run(escenario())
+    assert executor.trabajos == 3
+    llena_utc = [f for f in utc["fases"] if f["fase"] == "luna_llena"][0]["fecha"]
+    llena_local = [f for f in local["fases"] if f["fase"] == "luna_llena"][0]["fecha"]
+    assert (llena_utc, llena_local) == ("2024-01-25T17:54", "2024-01-25T14:54")
+    assert len(local["dias"]) == 31
+    assert [d["fase"] for d in local["dias"]].count("luna_llena") == 1
+    assert all(d["signo"] and d["fase"] for d in local["dias"])
+
+    meses = {m for (m,) in sqlite3.connect(path).execute("SELECT mes FROM calendario_lunar")}
+    assert meses == {"2023-12", "2024-01", "2024-02"}
+    # Otra instancia lee los meses de SQLite sin recalcular
+    otro_executor = ExecutorEnLinea()
+    asyncio.run(CalendarioLunar(otro_executor, db_path=path).mes_utc(2024, 1))
+    assert otro_executor.trabajos == 0
+
+
+@pytest.mark.parametrize("params, zona", [
+    ({"tz": "-3"}, -3.0),
+    ({"tz": "14"}, 14.0),
+    ({"tz": "Europe/Madrid"}, "Europe/Madrid"),
+    ({"lat": 40.4168, "lon": -3.7038}, "Europe/Madrid"),
+    ({}, 0.0),
+])
+def test_endpoint_zonas(client, params, zona):
+    datos = client.get("/calendario", params={"anio": 2024, "mes": 1, **params}).json()
+    assert datos["zona_horaria"] == zona
+    assert len(datos["dias"]) == 31
+
+
+@pytest.mark.parametrize("tz", ["Marte/Olimpo", "nan", "inf", "-inf", "1e9", "15"])
+def test_endpoint_zona_desconocida(client, tz):
+    respuesta = client.get("/calendario", params={"anio": 2024, "mes": 1, "tz": tz})
+    assert respuesta.status_code == 200
+    datos = respuesta.json()
+    assert "error" in datos and "sugerencia" in datos
+
+
+def test_la_base_se_abre_al_primer_uso(tmp_path):
+    path = tmp_path / "datos" / "calendario.db"
+    calendario = CalendarioLunar(ExecutorEnLinea(), db_path=str(path))
+    assert not path.parent.exists()
+    asyncio.run(calendario.mes_utc(2024, 1))
+    assert path.exists()
+
+
+def test_importar_main_desde_otro_directorio(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    entorno = {k: v for k, v in os.environ.items() if not k.endswith("_DB_PATH")}
+    entorno["PYTHONPATH"] = raiz
+    resultado = subprocess.run([sys.executable, "-c", "import main"], cwd=tmp_path, env=entorno,
+                               capture_output=True, text=True, timeout=120)
+    assert resultado.returncode == 0, resultado.stderr
+    assert not (tmp_path / "data").exists()
@@ -0,0 +1,39 @@
+import pytest
+
+from util import ELEMENTOS, PLANETAS, SIGNS, calcular_balance_elementos, get_chart
+
+
+def test_balance_elementos():
+    planetas = {f"p{i}": {"signo": signo} for i, signo in enumerate(["Aries", "Leo", "Tauro", "Cáncer"])}
+    balance = calcular_balance_elementos(planetas)
+    assert {e: d["cantidad"] for e, d in balance["elementos"].items()} == {"Fuego": 2, "Tierra": 1, "Aire": 0, "Agua": 1}
+    assert balance["dominante"] == "Fuego"
+    assert balance["elementos"]["Fuego"]["porcentaje"] == 50.0
+    assert balance["balance_general"] == "Balanceado"
+
+
+def test_carta_conocida():
+    # 1 de enero de 2000, 12:00 UT: Sol en ~280.4° (Capricornio)
+    carta = get_chart(2000, 1, 1, 12, 0, 0, 0, 51.5, 0.0)
+    assert carta["planetas"]["sol"]["signo"] == "Capricornio"
+    assert carta["planetas"]["sol"]["grado"] == pytest.approx(280.37, abs=0.05)
+    assert set(carta["planetas"]) == set(PLANETAS)
+    assert len(carta["casas"]) == 12 and carta["ascendente"] in SIGNS
+    cantidades = {e: d["cantidad"] for e, d in carta["balance_elementos"]["elementos"].items()}
+    esperadas = {e: 0 for e in cantidades}
+    for info in carta["planetas"].values():
+        esperadas[ELEMENTOS[info["signo"]]] += 1
+    assert cantidades == esperadas
+
+
+def test_varios_sistemas_y_extras():
+    carta = get_chart(2000, 1, 1, 12, 0, 0, 0, 51.5, 0.0, ["placidus", "signos_enteros"], ("quiron",))
+    assert set(carta["sistemas_casas"]) == {"placidus", "signos_enteros"}
+    assert "quiron" in carta["planetas"]
+    # Los cuerpos extra no cuentan en el balance
+    assert sum(d["cantidad"] for d in carta["balance_elementos"]["elementos"].values()) == len(PLANETAS)
+
+
+def test_opciones_desconocidas():
+    with pytest.raises(ValueError):
+        get_chart(2000, 1, 1, sistema_casas="inexistente")
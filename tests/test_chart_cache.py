@@ -0,0 +1,57 @@
+import asyncio
+import sqlite3
+import time
+
+from cache_admin import mantener_cartas
+from chart_cache import ChartCache, chart_key, init_chart_db
+
+
+def test_claves_equivalentes():
+    # 12:00 en UTC-3 es el mismo instante que 15:00 UTC
+    assert chart_key(1990, 5, 5, 12, 0, 0, -3, -34.6, -58.4) == chart_key(1990, 5, 5, 15, 0, 0, 0, -34.6, -58.4)
+    assert chart_key(1990, 5, 5, 12, 0, 0, -3, -34.6, -58.4) != chart_key(1990, 5, 5, 12, 0, 0, 0, -34.6, -58.4)
+
+
+def test_capa_en_disco_sobrevive_a_la_memoria(tmp_path):
+    path = str(tmp_path / "cartas.db")
+
+    async def escenario():
+        await ChartCache(disk=True, db_path=path).set("k", {"planetas": {}})
+        nueva = ChartCache(disk=True, db_path=path)
+        return await nueva.get("k"), await nueva.get("otra"), nueva.stats()["disco"]
+
+    carta, faltante, stats = asyncio.run(escenario())
+    assert carta == {"planetas": {}} and faltante is None
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_sin_disco_no_abre_la_base(tmp_path):
+    cache = ChartCache(disk=False, db_path=str(tmp_path / "no" / "existe.db"))
+    asyncio.run(cache.set("k", {}))
+    assert cache.db_conn is None
+
+
+def test_mantener_cartas_descarta_las_de_acceso_mas_antiguo(tmp_path):
+    path = str(tmp_path / "cartas.db")
+    cache = ChartCache(disk=True, db_path=path)
+    for i in range(10):
+        cache._write_db_sync(f"k{i}", {"i": i})
+        time.sleep(0.002)
+    # Leer k0 lo vuelve la más reciente
+    cache._read_db_sync("k0")
+
+    resumen = mantener_cartas(path, max_filas=4, max_bytes=0)
+    assert resumen["por_filas"] == 6
+    claves = {fila[0] for fila in sqlite3.connect(path).execute("SELECT key FROM chart_cache")}
+    assert claves == {"k0", "k7", "k8", "k9"}
+
+
+def test_migra_bases_sin_last_access(tmp_path):
+    path = str(tmp_path / "vieja.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE chart_cache (key TEXT PRIMARY KEY, chart TEXT, timestamp REAL)")
+    conn.execute("INSERT INTO chart_cache VALUES ('k', '{}', 123.0)")
+    conn.commit()
+    conn.close()
+    fila = init_chart_db(path).execute("SELECT last_access FROM chart_cache WHERE key = 'k'").fetchone()
+    assert fila == (123.0,)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from cielo import CieloEnVivo, cielo_en
+
+
+class ExecutorEnLinea:
+    """Corre los trabajos en el mismo proceso y los cuenta."""
+
+    def __init__(self):
+        self.trabajos = 0
+
+    async def run(self, funcion, *args):
+        self.trabajos += 1
+        return funcion(*args)
+
+
+def _eventos(mensaje: bytes):
+    """Eventos SSE de un mensaje: lista de (id, evento, datos)."""
+    eventos = []
+    for bloque in mensaje.decode().strip().split("\n\n"):
+        campos = dict(linea.split(": ", 1) for linea in bloque.splitlines())
+        eventos.append((int(campos["id"]), campos["event"], json.loads(campos["data"])))
+    return eventos
+
+
+def test_cielo_en_casas_por_ubicacion():
+    resultado = cielo_en(2451545.0, [(40.4, -3.7), (-34.6, -58.4)])
+    assert resultado["cielo"]["planetas"]["sol"]["signo"] == "Capricornio"
+    assert set(resultado["casas"]) == {(40.4, -3.7), (-34.6, -58.4)}
+
+
+def test_un_calculo_por_tick_para_todos_los_suscriptores():
+    executor = ExecutorEnLinea()
+    cielo = CieloEnVivo(executor, intervalo=60)
+
+    async def escenario():
+        # Tres en la misma ciudad (redondeada a 0.1°) y uno sin ubicación
+        suscripciones = [cielo.suscribir(40.41, -3.71), cielo.suscribir(40.44, -3.73), cielo.suscribir(40.4, -3.7),
+                         cielo.suscribir()]
+        mensajes = [await cola.get() for cola, _ in suscripciones]
+        tarde = cielo.suscribir(40.4, -3.7)
+        inmediato = tarde[0].get_nowait()
+        for cola, ubicacion in suscripciones + [tarde]:
+            cielo.desuscribir(cola, ubicacion)
+        cielo._tarea.cancel()
+        return mensajes, inmediato
+
+    mensajes, inmediato = asyncio.run(escenario())
+    assert executor.trabajos == 1 and cielo.ticks == 1
+    # Los mismos bytes para toda la ciudad, serializados una vez
+    assert mensajes[0] is mensajes[1] is mensajes[2]
+    assert [evento for _, evento, _ in _eventos(mensajes[0])] == ["cielo", "casas"]
+    assert [evento for _, evento, _ in _eventos(mensajes[3])] == ["cielo"]
+    # Quien llega entre ticks recibe de inmediato el último
+    assert inmediato == mensajes[0]
+    assert cielo.total_suscriptores == 0
+
+
+def test_endpoint_primer_evento():
+    import main
+
+    async def leer():
+        respuesta = await main.cielo(lat=40.4168, lon=-3.7038)
+        flujo = respuesta.body_iterator
+        try:
+            return respuesta, await flujo.__anext__(), await asyncio.wait_for(flujo.__anext__(), 60)
+        finally:
+            await flujo.aclose()
+
+    respuesta, inicio, mensaje = asyncio.run(leer())
+    assert respuesta.media_type == "text/event-stream"
+    assert respuesta.headers["cache-control"] == "no-cache"
+    assert inicio == b"retry: 5000\n\n"
+    (id_cielo, evento, datos), (id_casas, evento_casas, casas) = _eventos(mensaje)
+    assert evento == "cielo" and evento_casas == "casas" and id_cielo == id_casas
+    assert set(datos) == {"jd", "fecha", "planetas", "aspectos", "balance_elementos"}
+    assert len(datos["planetas"]) == 10
+    assert casas["ubicacion"] == {"latitud": 40.4, "longitud": -3.7} and len(casas["casas"]) == 12
+    assert main.cielo_en_vivo.total_suscriptores == 0
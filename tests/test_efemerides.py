@@ -0,0 +1,46 @@
+import time
+
+import numpy as np
+import pytest
+import swisseph as swe
+
+from util import MAX_MUESTRAS_EFEMERIDES, get_ephemeris_series
+
+JD_2024 = swe.julday(2024, 1, 1, 0.0)
+
+
+def test_serie_incluye_ambos_extremos():
+    serie = get_ephemeris_series(JD_2024, JD_2024 + 10, 24.0, ["sol"])
+    assert len(serie["jd"]) == 11
+    assert serie["jd"][0] == JD_2024 and serie["jd"][-1] == pytest.approx(JD_2024 + 10)
+    # El Sol avanza ~1°/día y el signo se deriva de la longitud
+    assert np.all(np.diff(serie["sol"]["longitud"]) > 0.9)
+    assert np.all(serie["sol"]["signo"] == serie["sol"]["longitud"] // 30)
+
+
+def test_serie_no_pasa_del_final():
+    serie = get_ephemeris_series(JD_2024, JD_2024 + 1, 10.0, ["luna"])
+    assert len(serie["jd"]) == 3
+    assert serie["jd"][-1] <= JD_2024 + 1
+
+
+def test_paso_diminuto_se_rechaza_sin_reservar_memoria():
+    inicio = time.perf_counter()
+    with pytest.raises(ValueError, match=str(MAX_MUESTRAS_EFEMERIDES)):
+        get_ephemeris_series(JD_2024, JD_2024 + 1, 1e-7, ["sol"])
+    assert time.perf_counter() - inicio < 0.1
+
+
+@pytest.mark.parametrize("paso", [0.0, -1.0, float("nan")])
+def test_paso_no_positivo(paso):
+    with pytest.raises(ValueError, match="mayor que cero"):
+        get_ephemeris_series(JD_2024, JD_2024 + 1, paso, ["sol"])
+
+
+def test_endpoint_valida_el_paso(client):
+    params = {"inicio": "2024-01-01T00:00", "fin": "2024-01-02T00:00", "planetas": "sol"}
+    assert client.get("/efemerides", params={**params, "paso_horas": 0}).status_code == 422
+    respuesta = client.get("/efemerides", params={**params, "paso_horas": 1e-7})
+    assert respuesta.status_code == 200
+    assert "máximo" in respuesta.json()["error"]
+    assert len(client.get("/efemerides", params={**params, "paso_horas": 6}).json()["jd"]) == 5
@@ -0,0 +1,62 @@
+import re
+
+import pytest
+
+from estaticos import Estaticos
+
+PAGINA = """<html><head><style>body { color: red; }</style></head>
+<body><h1>Carta astral</h1><script>console.log("hola");</script></body></html>
+"""
+
+
+def _assets(html):
+    return re.findall(r'(?:href|src)="/assets/([^"]+)"', html)
+
+
+@pytest.mark.parametrize("accept_encoding, codificacion", [("br", "br"), ("gzip", "gzip"), ("identity", None)])
+def test_pagina_precomprimida(client, accept_encoding, codificacion):
+    respuesta = client.get("/", headers={"Accept-Encoding": accept_encoding})
+    assert respuesta.status_code == 200
+    assert respuesta.headers.get("content-encoding") == codificacion
+    assert respuesta.headers["cache-control"] == "no-cache"
+    assert respuesta.headers["content-type"].startswith("text/html")
+    # El cliente descomprime: el cuerpo es el HTML con los assets separados
+    assert "<style>" not in respuesta.text and _assets(respuesta.text)
+
+
+def test_pagina_revalidada_con_etag(client):
+    primera = client.get("/", headers={"Accept-Encoding": "br"})
+    etag = primera.headers["etag"]
+    segunda = client.get("/", headers={"Accept-Encoding": "br", "If-None-Match": etag})
+    assert segunda.status_code == 304 and segunda.content == b""
+    assert segunda.headers["etag"] == etag
+    # Otra codificación es otra representación: su ETag no coincide
+    otra = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert otra.status_code == 200 and otra.headers["etag"] != etag
+
+
+def test_assets_inmutables(client):
+    for nombre in _assets(client.get("/").text):
+        respuesta = client.get(f"/assets/{nombre}", headers={"Accept-Encoding": "br"})
+        assert respuesta.status_code == 200
+        assert "immutable" in respuesta.headers["cache-control"]
+        assert "max-age=31536000" in respuesta.headers["cache-control"]
+        assert client.get(f"/assets/{nombre}", headers={"If-None-Match": respuesta.headers["etag"],
+                                                        "Accept-Encoding": "br"}).status_code == 304
+    assert client.get("/assets/index.0000000000000000.js").status_code == 404
+
+
+def test_huella_cambia_con_el_contenido(tmp_path):
+    path = tmp_path / "pagina.html"
+    path.write_text(PAGINA, encoding="utf-8")
+    antes = Estaticos()
+    antes.cargar(str(path))
+    path.write_text(PAGINA.replace("red", "blue"), encoding="utf-8")
+    despues = Estaticos()
+    despues.cargar(str(path))
+
+    css_antes = [n for n in antes.assets if n.endswith(".css")]
+    css_despues = [n for n in despues.assets if n.endswith(".css")]
+    assert len(css_antes) == len(css_despues) == 1 and css_antes != css_despues
+    # El script no cambió: misma URL
+    assert [n for n in antes.assets if n.endswith(".js")] == [n for n in despues.assets if n.endswith(".js")]
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from eventos import TOLERANCIA, _diferencia, _refinar, buscar_aspectos, buscar_estaciones, buscar_ingresos, jd_a_fecha
+from util import jd_from_datetime
+
+
+def _cerca(jd, fecha, minutos=2):
+    return abs((jd_a_fecha(jd) - fecha.replace(tzinfo=timezone.utc)).total_seconds()) < minutos * 60
+
+
+def test_refinar_converge_dentro_del_intervalo():
+    llamadas = []
+
+    def f(x):
+        llamadas.append(x)
+        return x ** 3 - 2
+
+    raiz = _refinar(f, 0.0, 2.0, f(0.0), f(2.0))
+    assert raiz == pytest.approx(2 ** (1 / 3), abs=TOLERANCIA)
+    assert all(0.0 <= x <= 2.0 for x in llamadas)
+    # Illinois: muchas menos evaluaciones que la bisección (~21 para 1e-6)
+    assert len(llamadas) < 15
+
+
+def test_diferencia_angular():
+    assert _diferencia(350, 10) == -20
+    assert _diferencia(10, 350) == 20
+    assert _diferencia(190, 10) == 180
+
+
+def test_equinoccio_de_marzo():
+    inicio = jd_from_datetime(datetime(2024, 3, 1))
+    ingresos = buscar_ingresos("sol", inicio, inicio + 30)
+    assert [e["signo"] for e in ingresos] == ["Aries"]
+    # Equinoccio: 20/03/2024 03:06 UTC
+    assert _cerca(ingresos[0]["jd"], datetime(2024, 3, 20, 3, 6))
+
+
+def test_estaciones_de_mercurio():
+    inicio = jd_from_datetime(datetime(2024, 3, 25))
+    estaciones = buscar_estaciones("mercurio", inicio, inicio + 40)
+    assert [e["direccion"] for e in estaciones] == ["retrograda", "directa"]
+    # 01/04/2024 22:14 UTC y 25/04/2024 12:54 UTC
+    assert _cerca(estaciones[0]["jd"], datetime(2024, 4, 1, 22, 14), 10)
+    assert _cerca(estaciones[1]["jd"], datetime(2024, 4, 25, 12, 54), 10)
+
+
+def test_aspectos_exactos():
+    inicio = jd_from_datetime(datetime(2024, 1, 1))
+    eventos = buscar_aspectos("sol", 100.0, inicio, inicio + 366, aspectos=["cuadratura", "oposición"])
+    assert sorted(round(e["longitud"]) for e in eventos) == [10, 190, 280]
+    assert {e["aspecto"] for e in eventos} == {"cuadratura", "oposición"}
+
+
+def test_oposicion_y_conjuncion_sin_duplicados():
+    # Con este grado (grado + 180) % 360 y (grado - 180) % 360 difieren en el último bit
+    grado = 195.70499692755223
+    assert (grado + 180) % 360 != (grado - 180) % 360
+    inicio = jd_from_datetime(datetime(2024, 1, 1))
+    eventos = buscar_aspectos("sol", grado, inicio, inicio + 366, aspectos=["conjunción", "oposición"])
+    assert sorted(e["aspecto"] for e in eventos) == ["conjunción", "oposición"]
+
+
+def test_endpoint_eventos(client):
+    respuesta = client.get("/eventos", params={"planeta": "sol", "inicio": "2024-01-01", "fin": "2025-01-01",
+                                                "tipos": "ingreso"})
+    datos = respuesta.json()
+    assert datos["total"] == 12
+    assert [e["signo"] for e in datos["eventos"]][:2] == ["Acuario", "Piscis"]
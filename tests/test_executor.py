@@ -0,0 +1,43 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from executor import ChartExecutor, ExecutorSaturado
+
+
+def test_rechaza_lo_que_excede_la_capacidad():
+    executor = ChartExecutor(workers=1, queue_limit=1, retry_after=3)
+
+    async def escenario():
+        ocupados = [asyncio.ensure_future(executor.run(time.sleep, 0.5)) for _ in range(executor.capacidad)]
+        await asyncio.sleep(0)
+        assert executor.en_curso == executor.capacidad
+        with pytest.raises(ExecutorSaturado) as error:
+            await executor.run(os.getpid)
+        await asyncio.gather(*ocupados)
+        # Con lugar libre vuelve a aceptar
+        return error.value.retry_after, executor.en_curso, await executor.run(os.getpid)
+
+    try:
+        retry_after, en_curso, pid = asyncio.run(escenario())
+    finally:
+        executor.shutdown()
+    assert retry_after == 3 and en_curso == 0
+    assert pid != os.getpid()
+
+
+def test_endpoint_saturado_responde_503(client):
+    import main
+
+    executor = main.chart_executor
+    en_curso = executor._en_curso
+    executor._en_curso = executor.capacidad
+    try:
+        respuesta = client.get("/carta", params={"anio": 1911, "mes": 11, "dia": 11, "tz": 0})
+    finally:
+        executor._en_curso = en_curso
+    assert respuesta.status_code == 503
+    assert respuesta.headers["retry-after"] == str(executor.retry_after)
+    assert respuesta.json()["reintentar_en"] == executor.retry_after
@@ -0,0 +1,130 @@
+import gzip
+import zlib
+
+import brotli
+import msgpack
+import orjson
+import pytest
+
+from formatos import COMPRESION_MIN_BYTES, CompresorStream, negociar_codificacion, negociar_formato, respuesta
+from tests.conftest import MADRID
+
+CARTA = {"anio": 1990, "mes": 5, "dia": 5, "hora": 12, "tz": 2, **MADRID}
+
+
+@pytest.mark.parametrize("accept, formato, esperado", [
+    ("", None, "json"),
+    ("*/*", None, "json"),
+    ("application/msgpack", None, "msgpack"),
+    ("application/x-msgpack", None, "msgpack"),
+    ("application/json;q=0.9, application/msgpack", None, "msgpack"),
+    ("application/json, application/msgpack;q=0.5", None, "json"),
+    ("application/msgpack;q=0", None, "json"),
+    ("application/msgpack", "json", "json"),
+])
+def test_negociar_formato(accept, formato, esperado):
+    assert negociar_formato(accept, formato) == esperado
+
+
+@pytest.mark.parametrize("accept_encoding, esperado", [
+    ("", None),
+    ("identity", None),
+    ("gzip, deflate", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+])
+def test_negociar_codificacion(accept_encoding, esperado):
+    assert negociar_codificacion(accept_encoding) == esperado
+
+
+def test_respuestas_chicas_no_se_comprimen():
+    chica = respuesta({"a": 1}, "json", "br")
+    assert "content-encoding" not in chica.headers
+    grande = respuesta({"a": "x" * COMPRESION_MIN_BYTES}, "json", "br")
+    assert grande.headers["content-encoding"] == "br"
+    assert orjson.loads(brotli.decompress(grande.body)) == {"a": "x" * COMPRESION_MIN_BYTES}
+
+
+@pytest.mark.parametrize("codificacion, descomprimir", [
+    ("br", brotli.decompress),
+    ("gzip", gzip.decompress),
+    (None, bytes),
+])
+def test_compresor_stream_ida_y_vuelta(codificacion, descomprimir):
+    trozos = [orjson.dumps({"i": i, "relleno": "abc" * i}) + b"\n" for i in range(50)]
+    compresor = CompresorStream(codificacion)
+    comprimido = b"".join(compresor.comprimir(trozo) for trozo in trozos) + compresor.cerrar()
+    assert descomprimir(comprimido) == b"".join(trozos)
+
+
+def test_compresor_stream_envia_cada_trozo_completo():
+    # Cada trozo se vacía al salir: lo ya enviado se puede descomprimir sin esperar al resto
+    compresor = CompresorStream("gzip")
+    enviado = compresor.comprimir(b'{"i": 0}\n')
+    assert zlib.decompressobj(31).decompress(enviado) == b'{"i": 0}\n'
+
+
+def test_carta_msgpack_comprimida(client):
+    respuesta_json = client.get("/carta", params=CARTA)
+    respuesta_msgpack = client.get("/carta", params=CARTA, headers={
+        "Accept": "application/msgpack", "Accept-Encoding": "br"
+    })
+    assert respuesta_msgpack.headers["content-type"] == "application/msgpack"
+    assert respuesta_msgpack.headers["content-encoding"] == "br"
+    compacta = msgpack.unpackb(respuesta_msgpack.content)
+    carta = respuesta_json.json()
+    assert compacta["cuerpos"] == list(carta["planetas"])
+    assert compacta["grados"] == pytest.approx([p["grado"] for p in carta["planetas"].values()], abs=1e-4)
+
+
+def test_carta_etag_304(client):
+    primera = client.get("/carta", params=CARTA)
+    etag = primera.headers["etag"]
+    segunda = client.get("/carta", params=CARTA, headers={"If-None-Match": etag})
+    assert segunda.status_code == 304
+    assert segunda.content == b""
+    otro_formato = client.get("/carta", params=CARTA, headers={"If-None-Match": etag, "Accept": "application/msgpack"})
+    assert otro_formato.status_code == 200
+
+
+def test_lote_msgpack_en_streaming(client):
+    registros = [{**CARTA, "dia": dia} for dia in range(1, 6)] + [{**CARTA, "mes": 2, "dia": 31}]
+    respuesta_lote = client.post("/cartas", json={"registros": registros}, headers={
+        "Accept": "application/msgpack", "Accept-Encoding": "gzip"
+    })
+    assert respuesta_lote.headers["content-encoding"] == "gzip"
+    desempaquetador = msgpack.Unpacker(raw=False)
+    desempaquetador.feed(respuesta_lote.content)
+    objetos = list(desempaquetador)
+    assert len(objetos) == 6
+    assert all(objeto["v"] == 1 for objeto in objetos[:5])
+    assert objetos[5]["indice"] == 5 and "error" in objetos[5]
+
+
+def test_retornos_msgpack_comprimidos(client):
+    params = {**CARTA, "desde": "2024-01-01", "cantidad": 2}
+    como_json = client.get("/retornos", params=params).json()
+    respuesta_msgpack = client.get("/retornos", params=params, headers={
+        "Accept": "application/msgpack", "Accept-Encoding": "br"
+    })
+    assert respuesta_msgpack.headers["content-type"] == "application/msgpack"
+    assert respuesta_msgpack.headers["content-encoding"] == "br"
+    datos = msgpack.unpackb(respuesta_msgpack.content)
+    assert datos["total"] == como_json["total"] == 2
+    assert [item["fecha"] for item in datos["resultados"]] == [item["fecha"] for item in como_json["resultados"]]
+    # Las cartas van con el esquema compacto
+    assert all(item["carta"]["v"] == 1 for item in datos["resultados"])
+
+
+def test_sinastria_msgpack_comprimida(client):
+    pedido = {"perfil": CARTA, "candidatos": [{"id": str(i), **CARTA, "anio": 1980 + i} for i in range(40)],
+              "limite": 10}
+    como_json = client.post("/sinastria", json=pedido).json()
+    respuesta_msgpack = client.post("/sinastria", json=pedido, headers={
+        "Accept": "application/msgpack", "Accept-Encoding": "gzip"
+    })
+    assert respuesta_msgpack.headers["content-type"] == "application/msgpack"
+    assert respuesta_msgpack.headers["content-encoding"] == "gzip"
+    datos = msgpack.unpackb(respuesta_msgpack.content)
+    assert datos["total_candidatos"] == como_json["total_candidatos"] == 40
+    assert [r["id"] for r in datos["resultados"]] == [r["id"] for r in como_json["resultados"]]
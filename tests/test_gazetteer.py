@@ -0,0 +1,65 @@
+import pytest
+
+from gazetteer import Gazetteer, normalizar
+
+# Columnas de GeoNames: id, nombre, ascii, alternativos, lat, lon, clase,
+# código, país, cc2, admin1, admin2, admin3, admin4, población, ...
+CIUDADES = [
+    ("3435910", "Buenos Aires", "Buenos Aires", "Baires", -34.6132, -58.3772, "AR", "07", 13076300),
+    ("3838583", "Rosario", "Rosario", "", -32.9468, -60.6393, "AR", "21", 1173533),
+    ("3860259", "Córdoba", "Cordoba", "", -31.4135, -64.1811, "AR", "05", 1428214),
+    ("2519240", "Córdoba", "Cordoba", "Cordova", 37.8916, -4.7727, "ES", "51", 328428),
+    ("2643743", "London", "London", "Londres,Londra", 51.5085, -0.1257, "GB", "ENG", 8961989),
+    ("6058560", "London", "London", "", 42.9834, -81.233, "CA", "08", 346765),
+    ("3117735", "Madrid", "Madrid", "", 40.4165, -3.7026, "ES", "29", 3255944),
+    ("2950159", "Berlin", "Berlin", "Berlín", 52.5244, 13.4105, "DE", "16", 3426354),
+]
+
+
+@pytest.fixture(scope="module")
+def gazetteer(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp("geonames")
+    with open(directorio / "cities.txt", "w", encoding="utf-8") as f:
+        for id_, nombre, ascii_nombre, alternativos, lat, lon, pais, admin1, poblacion in CIUDADES:
+            campos = [id_, nombre, ascii_nombre, alternativos, str(lat), str(lon), "P", "PPL", pais, "",
+                      admin1, "", "", "", str(poblacion), "", "0", "", "2024-01-01"]
+            f.write("\t".join(campos) + "\n")
+    (directorio / "countryInfo.txt").write_text(
+        "#ISO\tISO3\tnum\tfips\tCountry\nAR\tARG\t032\tAR\tArgentina\nES\tESP\t724\tSP\tSpain\n", encoding="utf-8"
+    )
+    return Gazetteer.from_geonames(str(directorio / "cities.txt"))
+
+
+def test_normalizar():
+    assert normalizar("  Córdoba   Capital ") == "cordoba capital"
+
+
+def test_prefijo_ordenado_por_poblacion(gazetteer):
+    assert len(gazetteer) == len(CIUDADES)
+    resultados = gazetteer.search("cor", limit=5)
+    assert [(r["city"], r["country_code"]) for r in resultados] == [("Córdoba", "ar"), ("Córdoba", "es")]
+    assert resultados[0]["country"] == "Argentina" and resultados[0]["state"] == "05"
+    # Prefijo largo (fuera del top precalculado) y nombre alternativo
+    assert [r["city"] for r in gazetteer.search("buenos ai")] == ["Buenos Aires"]
+    assert gazetteer.search("Londres")[0]["country_code"] == "gb"
+
+
+def test_trigramas_con_un_error_de_tipeo(gazetteer):
+    # Ningún nombre empieza así: responde el índice de trigramas
+    assert [r["city"] for r in gazetteer.search("Madrib")] == ["Madrid"]
+    assert [r["city"] for r in gazetteer.search("Rossario")] == ["Rosario"]
+    # Consultas cortas no usan trigramas
+    assert gazetteer.search("mdr") == []
+
+
+def test_sin_coincidencias(gazetteer):
+    assert gazetteer.search("xyzzyq") == []
+    assert gazetteer.search("  ") == []
+    assert gazetteer.lookup("Atlantis") is None
+
+
+def test_lookup_por_nombre_y_pais(gazetteer):
+    assert gazetteer.lookup("london") == (51.5085, -0.1257)
+    assert gazetteer.lookup("London", "ca") == (42.9834, -81.233)
+    assert gazetteer.lookup("cordoba", "Spain") == (37.8916, -4.7727)
+    assert gazetteer.lookup("Londres") == (51.5085, -0.1257)
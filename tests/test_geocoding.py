@@ -0,0 +1,72 @@
+import asyncio
+
+from geocoding import GeocodingService
+
+
+def _servicio(tmp_path):
+    return GeocodingService(base_url="http://127.0.0.1:9", db_path=str(tmp_path / "geo.db"))
+
+
+def test_single_flight_no_repite_una_consulta_ya_resuelta(tmp_path):
+    servicio = _servicio(tmp_path)
+    llamadas = []
+
+    async def consultar():
+        llamadas.append(1)
+        await asyncio.sleep(0.01)
+        await servicio._set_to_cache("coordinates_cache", "rosario,", (-32.95, -60.64))
+        return (-32.95, -60.64)
+
+    async def escenario():
+        primero = await servicio._single_flight(("coordinates_cache", "rosario,"), consultar)
+        # Un llamador cuyo fallo en SQLite terminó después de la consulta anterior
+        segundo = await servicio._single_flight(("coordinates_cache", "rosario,"), consultar)
+        await servicio.aclose()
+        return primero, segundo
+
+    primero, segundo = asyncio.run(escenario())
+    assert tuple(primero) == tuple(segundo) == (-32.95, -60.64)
+    assert len(llamadas) == 1
+
+
+def test_single_flight_comparte_la_consulta_en_curso(tmp_path):
+    servicio = _servicio(tmp_path)
+    llamadas = []
+
+    async def consultar():
+        llamadas.append(1)
+        await asyncio.sleep(0.01)
+        return [{"name": "Rosario"}]
+
+    async def escenario():
+        resultados = await asyncio.gather(*(
+            servicio._single_flight(("city_search_cache", "rosario"), consultar) for _ in range(5)
+        ))
+        await servicio.aclose()
+        return resultados
+
+    assert all(r == [{"name": "Rosario"}] for r in asyncio.run(escenario()))
+    assert len(llamadas) == 1
+
+
+def test_respuesta_que_no_es_json(tmp_path):
+    import httpx
+
+    servicio = _servicio(tmp_path)
+
+    def nominatim(request):
+        return httpx.Response(200, text="<html>Bandwidth limit exceeded</html>",
+                              headers={"Content-Type": "text/html"})
+
+    async def escenario():
+        servicio._client = httpx.AsyncClient(base_url=servicio.base_url, transport=httpx.MockTransport(nominatim))
+        servicio._client_loop = asyncio.get_running_loop()
+        resultados = (
+            await servicio.search_cities("rosario"),
+            await servicio.get_coordinates("rosario"),
+            await servicio.get_city_info(-32.95, -60.64)
+        )
+        await servicio.aclose()
+        return resultados
+
+    assert asyncio.run(escenario()) == ([], None, None)
@@ -0,0 +1,76 @@
+import json
+
+from tests.conftest import HUECO_MADRID, MADRID
+from util import get_charts_batch, zona_registro
+
+import pytest
+
+
+def _registro(**cambios):
+    return {"anio": 1990, "mes": 5, "dia": 5, "hora": 12, "minuto": 0, "tz": None, **MADRID, **cambios}
+
+
+def _lineas(respuesta):
+    return [json.loads(linea) for linea in respuesta.text.splitlines() if linea]
+
+
+def test_zona_registro_resuelve_por_coordenadas():
+    assert zona_registro(_registro()) == 2.0
+    assert zona_registro(_registro(mes=1)) == 1.0
+    assert zona_registro(_registro(tz=-3)) == -3
+
+
+@pytest.mark.parametrize("registro, mensaje", [
+    (_registro(mes=2, dia=31), "inexistente"),
+    (_registro(tz=0, mes=2, dia=30), "inexistente"),
+    (_registro(**HUECO_MADRID), "cambio de horario"),
+    (_registro(anio=2024, mes=10, dia=27, hora=2, minuto=30), "ambigua"),
+])
+def test_zona_registro_rechaza_fechas_invalidas(registro, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        zona_registro(registro)
+
+
+def test_batch_sigue_despues_de_un_registro_invalido():
+    resultados = list(get_charts_batch([_registro(), _registro(**HUECO_MADRID), _registro(dia=6)]))
+    assert len(resultados) == 3
+    assert "planetas" in resultados[0] and "planetas" in resultados[2]
+    assert set(resultados[1]) == {"error"}
+
+
+def test_cartas_registro_invalido_en_el_primer_bloque(client):
+    registros = [{**_registro(), "mes": 2, "dia": 31}] + [_registro(dia=d) for d in range(1, 4)]
+    respuesta = client.post("/cartas", json={"registros": registros})
+    assert respuesta.status_code == 200
+    lineas = _lineas(respuesta)
+    assert len(lineas) == 4
+    assert lineas[0]["indice"] == 0 and "error" in lineas[0]
+    assert all("planetas" in linea for linea in lineas[1:])
+
+
+def test_cartas_registro_invalido_en_un_bloque_posterior(client):
+    registros = [_registro(dia=1 + i % 28) for i in range(200)] + [HUECO_MADRID]
+    respuesta = client.post("/cartas", json={"registros": registros})
+    assert respuesta.status_code == 200
+    lineas = _lineas(respuesta)
+    assert len(lineas) == 201
+    assert all("planetas" in linea for linea in lineas[:200])
+    assert lineas[200]["indice"] == 200 and "cambio de horario" in lineas[200]["error"]
+
+
+def test_retornos_con_hora_en_cambio_de_horario(client):
+    respuesta = client.get("/retornos", params={**HUECO_MADRID, "cantidad": 2})
+    assert respuesta.status_code == 422
+    assert "cambio de horario" in respuesta.json()["error"]
+
+
+def test_sinastria_con_candidato_y_perfil_invalidos(client):
+    candidatos = [{"id": "ok", **_registro()}, {"id": "hueco", **HUECO_MADRID}]
+    respuesta = client.post("/sinastria", json={"perfil": _registro(dia=6), "candidatos": candidatos})
+    assert respuesta.status_code == 200
+    datos = respuesta.json()
+    assert [r["id"] for r in datos["resultados"]] == ["ok"]
+    assert [e["id"] for e in datos["errores"]] == ["hueco"]
+
+    respuesta = client.post("/sinastria", json={"perfil": HUECO_MADRID, "candidatos": candidatos[:1]})
+    assert respuesta.status_code == 422
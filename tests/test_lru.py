@@ -0,0 +1,38 @@
+import time
+
+from lru import TTLCache
+
+
+def test_descarta_la_menos_usada():
+    cache = TTLCache(2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_vence_por_ttl():
+    cache = TTLCache(10, 60)
+    cache.set("viejo", 1, timestamp=time.time() - 61)
+    cache.set("nuevo", 2, timestamp=time.time() - 59)
+    assert cache.get("viejo") is None
+    assert cache.get("nuevo") == 2
+    # Lo vencido se borra al leerlo
+    assert len(cache) == 1
+
+
+def test_estadisticas_y_default():
+    cache = TTLCache(10, 60)
+    cache.set("a", 0)
+    assert cache.get("a") == 0
+    assert cache.get("b", "nada") == "nada"
+    assert cache.stats() == {"size": 1, "maxsize": 10, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_tamano_cero_no_guarda():
+    cache = TTLCache(0, 60)
+    cache.set("a", 1)
+    assert cache.get("a") is None and len(cache) == 0
@@ -0,0 +1,39 @@
+import re
+
+from metrics import etapa, server_timing
+
+
+def test_server_timing_suma_etapas_repetidas():
+    valor = server_timing([("sqlite", 0.001), ("calculo", 0.0025), ("sqlite", 0.002)], 0.01)
+    assert valor == "sqlite;dur=3.00, calculo;dur=2.50, total;dur=10.00"
+
+
+def test_etapa_fuera_de_un_pedido():
+    # Sin pedido en curso solo se registra en el histograma
+    with etapa("prueba"):
+        pass
+
+
+def _etapas(respuesta):
+    return dict(re.findall(r"(\w+);dur=([\d.]+)", respuesta.headers["server-timing"]))
+
+
+def test_encabezado_server_timing_en_carta(client):
+    params = {"anio": 1933, "mes": 3, "dia": 3, "tz": 0}
+    etapas = _etapas(client.get("/carta", params=params))
+    assert {"cache_cartas", "efemerides", "serializacion", "total"} <= set(etapas)
+    assert float(etapas["total"]) >= float(etapas["efemerides"])
+    # La segunda vez sale de la caché: no hay cálculo
+    assert "efemerides" not in _etapas(client.get("/carta", params=params))
+
+
+def test_endpoint_metrics(client):
+    client.get("/health")
+    respuesta = client.get("/metrics")
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("text/plain")
+    texto = respuesta.text
+    # La etiqueta path es la plantilla de la ruta
+    assert re.search(r'astrology_request_duration_seconds_count\{method="GET",path="/health",status="200"\} [1-9]', texto)
+    assert "astrology_stage_duration_seconds_bucket" in texto
+    assert "astrology_executor_capacity" in texto
@@ -0,0 +1,30 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from rate_limit import TokenBucket
+
+
+def test_token_bucket_respeta_la_tasa():
+    async def escenario():
+        bucket = TokenBucket(rate=50, burst=2)
+        inicio = time.monotonic()
+        for _ in range(7):
+            await bucket.acquire()
+        return time.monotonic() - inicio
+
+    # 2 de golpe y 5 a 50/s
+    assert 0.09 < asyncio.run(escenario()) < 0.3
+
+
+def test_tasa_de_nominatim_repartida_entre_workers(tmp_path):
+    env = {**os.environ, "WEB_CONCURRENCY": "4", "NOMINATIM_RATE": "1",
+           "GEOCODING_DB_PATH": str(tmp_path / "geo.db")}
+    salida = subprocess.run(
+        [sys.executable, "-c", "from geocoding import geocoding_service; print(geocoding_service.rate_limiter.rate)"],
+        env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    assert float(salida.stdout.strip().splitlines()[-1]) == 0.25
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+from eventos import _diferencia, _posicion
+from retornos import ANIO_TROPICAL, MES_TROPICAL, instantes_progresion, instantes_retorno, jd_natal
+from tests.conftest import MADRID
+from util import PLANETAS, jd_from_datetime
+
+NACIMIENTO = {"anio": 1990, "mes": 5, "dia": 5, "hora": 12, "minuto": 0, "tz": 2, **MADRID}
+
+
+@pytest.mark.parametrize("planeta, periodo", [("sol", ANIO_TROPICAL), ("luna", MES_TROPICAL)])
+def test_retornos_vuelven_a_la_longitud_natal(planeta, periodo):
+    jd_nacimiento, _ = jd_natal(NACIMIENTO)
+    natal = _posicion(jd_nacimiento, PLANETAS[planeta])[0]
+    desde = jd_from_datetime(datetime(2024, 1, 1))
+    instantes = instantes_retorno(planeta, jd_nacimiento, desde, 5)
+
+    assert instantes[0] >= desde
+    assert instantes[0] - desde < periodo
+    for jd in instantes:
+        assert abs(_diferencia(_posicion(jd, PLANETAS[planeta])[0], natal)) < 1e-5
+    # Uno por período, sin saltear ni repetir
+    for anterior, siguiente in zip(instantes, instantes[1:]):
+        assert siguiente - anterior == pytest.approx(periodo, rel=0.1)
+
+
+def test_retorno_solar_nunca_antes_del_nacimiento():
+    jd_nacimiento, _ = jd_natal(NACIMIENTO)
+    primero = instantes_retorno("sol", jd_nacimiento, jd_nacimiento - 1000, 1)[0]
+    assert primero == pytest.approx(jd_nacimiento + ANIO_TROPICAL, abs=1)
+
+
+def test_progresion_un_dia_por_anio():
+    jd_nacimiento, _ = jd_natal(NACIMIENTO)
+    pares = instantes_progresion(jd_nacimiento, jd_nacimiento + 30 * ANIO_TROPICAL, 3)
+    assert [round(progresado - jd_nacimiento, 6) for _, progresado in pares] == [30, 31, 32]
+
+
+def test_endpoint_retornos_solares(client):
+    datos = client.get("/retornos", params={**NACIMIENTO, "desde": "2024-01-01", "cantidad": 3}).json()
+    assert datos["total"] == 3
+    soles = [item["carta"]["planetas"]["sol"] for item in datos["resultados"]]
+    assert len({(sol["signo"], round(sol["grado"], 2)) for sol in soles}) == 1
+    assert [item["fecha"][:4] for item in datos["resultados"]] == ["2024", "2025", "2026"]
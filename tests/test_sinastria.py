@@ -0,0 +1,66 @@
+import numpy as np
+
+from sinastria import NOMBRES_PLANETAS, aspectos_de, matriz_aspectos, mejores_candidatos, puntajes, ranking
+
+
+def _matriz(n, semilla=0):
+    return np.random.default_rng(semilla).random((n, len(NOMBRES_PLANETAS))) * 360
+
+
+def test_aspecto_exacto():
+    vector = np.zeros(len(NOMBRES_PLANETAS))
+    candidato = np.full((1, len(NOMBRES_PLANETAS)), 120.0)
+    indices, orbes = matriz_aspectos(vector, candidato)
+    aspectos = aspectos_de(indices, orbes, 0)
+    assert len(aspectos) == len(NOMBRES_PLANETAS) ** 2
+    assert {a["aspecto"] for a in aspectos} == {"trígono"} and all(a["orbe"] == 0 for a in aspectos)
+
+
+def test_ranking_por_bloques_igual_al_calculo_completo():
+    vector, matriz = _matriz(1, 1)[0], _matriz(1000)
+    total = puntajes(*matriz_aspectos(vector, matriz))
+    filas, puntos, indices, orbes = ranking(vector, matriz, 15, bloque=64)
+    assert list(filas) == list(np.argsort(-total, kind="stable")[:15])
+    assert np.allclose(puntos, total[filas])
+    completos, orbes_completos = matriz_aspectos(vector, matriz)
+    assert (indices == completos[filas]).all() and np.allclose(orbes, orbes_completos[filas])
+
+
+def test_mejores_candidatos():
+    vector, matriz = _matriz(1, 1)[0], _matriz(300)
+    resultados = mejores_candidatos(vector, matriz, 5, compuesta=True)
+    assert len(resultados) == 5
+    assert [r["puntaje"] for r in resultados] == sorted((r["puntaje"] for r in resultados), reverse=True)
+    assert all(set(r) == {"fila", "puntaje", "aspectos", "compuesta"} for r in resultados)
+    assert mejores_candidatos(vector, matriz[:0], 5) == []
+
+
+def test_endpoint_limita_los_candidatos(client):
+    import main
+
+    perfil = {"anio": 1990, "mes": 5, "dia": 5, "tz": -3}
+    candidatos = [{"id": str(i), "longitudes": [0.0] * len(NOMBRES_PLANETAS)}
+                  for i in range(main.MAX_CANDIDATOS_SINASTRIA + 1)]
+    respuesta = client.post("/sinastria", json={"perfil": perfil, "candidatos": candidatos})
+    assert respuesta.status_code == 422
+
+    respuesta = client.post("/sinastria", json={"perfil": perfil, "candidatos": candidatos[:3], "limite": 2})
+    assert respuesta.status_code == 200
+    datos = respuesta.json()
+    assert len(datos["resultados"]) == 2 and datos["total_candidatos"] == 3
+
+
+def test_endpoint_con_el_maximo_de_candidatos(client):
+    import main
+
+    # Más bloques que la capacidad del executor: no debe responder 503
+    assert main.MAX_CANDIDATOS_SINASTRIA / main.TAMANO_BLOQUE_SINASTRIA > main.chart_executor.capacidad
+    perfil = {"anio": 1990, "mes": 5, "dia": 5, "tz": -3}
+    candidatos = [{"id": str(i), "anio": 1950 + i % 60, "mes": 1 + i % 12, "dia": 1 + i % 28,
+                   "hora": i % 24, "tz": -3, "lat": -34.6, "lon": -58.4}
+                  for i in range(main.MAX_CANDIDATOS_SINASTRIA)]
+    respuesta = client.post("/sinastria", json={"perfil": perfil, "candidatos": candidatos, "limite": 5})
+    assert respuesta.status_code == 200
+    datos = respuesta.json()
+    assert datos["total_candidatos"] == main.MAX_CANDIDATOS_SINASTRIA and not datos["errores"]
+    assert len(datos["resultados"]) == 5
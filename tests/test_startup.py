@@ -0,0 +1,103 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+from startup import Arranque, calentar_cache, leer_ciudades, liderazgo
+
+
+def _lider_en_otro_proceso(path) -> bool:
+    codigo = f"from startup import liderazgo\nwith liderazgo({str(path)!r}) as lider:\n    print(lider)"
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, timeout=60, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return salida.stdout.strip().splitlines()[-1] == "True"
+
+
+def test_un_solo_lider(tmp_path):
+    path = tmp_path / "warmup.lock"
+    with liderazgo(str(path)) as lider:
+        assert lider
+        assert not _lider_en_otro_proceso(path)
+        with liderazgo(str(path)) as otro:
+            assert not otro
+    # Liberado al salir del bloque
+    assert _lider_en_otro_proceso(path)
+
+
+def test_leer_ciudades(tmp_path):
+    path = tmp_path / "ciudades.txt"
+    path.write_text("# comentario\nRosario | Argentina\n\nMadrid  # capital\n", encoding="utf-8")
+    assert leer_ciudades(str(path)) == [("Rosario", "Argentina"), ("Madrid", "")]
+    assert leer_ciudades(str(tmp_path / "no_existe.txt")) == []
+
+
+class GeocodingFalso:
+    """Lo mínimo de GeocodingService que usa el calentamiento, sin disco ni red."""
+
+    db_path = ""
+
+    def __init__(self):
+        self.consultas = []
+
+    def cargar_gazetteer(self):
+        return None
+
+    def precargar_memoria(self, table, top_n):
+        return 0
+
+    @staticmethod
+    def coordinates_query(ciudad, pais):
+        return f"{ciudad.lower()},{pais.lower()}"
+
+    def consultas_en_cache(self, table, claves):
+        return {clave for clave in claves if clave.startswith("rosario")}
+
+    async def get_coordinates(self, ciudad, pais):
+        self.consultas.append(ciudad)
+        return (0.0, 0.0)
+
+    async def search_cities(self, ciudad, limit):
+        return []
+
+    async def get_city_info(self, lat, lon):
+        return None
+
+    async def flush_writes(self):
+        pass
+
+
+def test_calentar_solo_el_lider_consulta():
+    ciudades = [("Rosario", ""), ("Madrid", ""), ("Lima", "")]
+    geocoding = GeocodingFalso()
+    resumen = asyncio.run(calentar_cache(geocoding, ciudades))
+    assert resumen["ciudades_en_disco"] == 1 and resumen["ciudades_consultadas"] == 2
+    assert sorted(geocoding.consultas) == ["Lima", "Madrid"]
+
+    otro = GeocodingFalso()
+    with liderazgo() as lider:
+        assert lider
+        resumen = asyncio.run(calentar_cache(otro, ciudades))
+    assert resumen["ciudades_consultadas"] == 0 and otro.consultas == []
+
+
+class ExecutorFalso:
+    def __init__(self, error=None):
+        self.error = error
+
+    async def precalentar(self):
+        await asyncio.sleep(0.01)
+        if self.error:
+            raise self.error
+        return 2
+
+
+def test_listo_cuando_terminan_las_etapas_requeridas():
+    arranque = Arranque()
+    assert not arranque.listo
+    asyncio.run(arranque.correr(GeocodingFalso(), ExecutorFalso()))
+    assert arranque.listo
+    assert arranque.resumen()["detalle"]["executor"] == {"procesos": 2}
+
+    fallido = Arranque()
+    asyncio.run(fallido.correr(GeocodingFalso(), ExecutorFalso(RuntimeError("sin procesos"))))
+    assert fallido.etapas["executor"] == "error" and not fallido.listo
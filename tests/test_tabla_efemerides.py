@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import swisseph as swe
+
+from tabla_efemerides import TablaEfemerides, _hermite, generar
+from util import PLANETAS
+
+PLANETAS_TABLA = {nombre: PLANETAS[nombre] for nombre in ("sol", "luna", "mercurio")}
+
+
+@pytest.fixture(scope="module")
+def tabla(tmp_path_factory):
+    directorio = str(tmp_path_factory.mktemp("tabla"))
+    generar(directorio, 2000, 2002, PLANETAS_TABLA, muestras=500)
+    return TablaEfemerides(directorio)
+
+
+def _error_arcsec(calculada, exacta):
+    return abs((calculada - exacta + 180) % 360 - 180) * 3600
+
+
+def test_hermite_reproduce_extremos_y_cruza_cero():
+    assert _hermite(10.0, 1.0, 11.0, 1.0, 1.0, 0.0) == pytest.approx((10.0, 1.0))
+    assert _hermite(10.0, 1.0, 11.0, 1.0, 1.0, 1.0) == pytest.approx((11.0, 1.0))
+    # El intervalo 359.5° -> 0.5° va por el camino corto
+    longitud, velocidad = _hermite(359.5, 1.0, 0.5, 1.0, 1.0, 0.5)
+    assert _error_arcsec(longitud, 0.0) < 1e-6
+    assert velocidad == pytest.approx(1.0)
+
+
+def test_error_de_interpolacion_en_segundos_de_arco(tabla):
+    assert tabla.cargar()
+    rng = np.random.default_rng(1)
+    jds = tabla.meta["jd_inicio"] + rng.random(200) * (tabla.meta["jd_fin"] - tabla.meta["jd_inicio"])
+    for nombre, id_planeta in PLANETAS_TABLA.items():
+        assert tabla.meta["planetas"][nombre]["error_max_arcsec"] < 10
+        longitudes, _ = tabla.posiciones(nombre, jds)
+        for jd, longitud in zip(jds.tolist(), longitudes.tolist()):
+            exacta = swe.calc_ut(jd, id_planeta, swe.FLG_SWIEPH)[0][0]
+            assert _error_arcsec(longitud, exacta) < 10
+            assert tabla.posicion(nombre, jd)[0] == pytest.approx(longitud)
+
+
+def test_fuera_de_rango_devuelve_none(tabla):
+    inicio, fin = tabla.meta["jd_inicio"], tabla.meta["jd_fin"]
+    assert tabla.cubre(inicio) and not tabla.cubre(fin) and not tabla.cubre(inicio - 1)
+    assert tabla.posicion("sol", fin) is None
+    assert tabla.posicion("venus", inicio + 1) is None
+    assert tabla.posiciones("sol", np.array([inicio + 1, fin + 1])) is None
+    assert tabla.posiciones("sol", np.array([])) is None
+
+
+def test_sin_tabla_usa_swiss_ephemeris(tmp_path):
+    vacia = TablaEfemerides(str(tmp_path))
+    assert not vacia.cubre(2451545.0)
+    assert vacia.posicion("sol", 2451545.0) is None
+    assert vacia.resumen() == {"disponible": False, "directorio": str(tmp_path)}
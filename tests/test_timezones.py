@@ -0,0 +1,73 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from timezones import _transiciones, offset_en_utc, timezone_name_at, utc_offset_hours, zona_valida
+
+# Zonas con casos raros: medias horas, horario de verano doble, un día
+# salteado (Apia, 2011), hemisferio sur y offsets fijos
+ZONAS = [
+    "Europe/Madrid", "Europe/London", "America/New_York", "America/Argentina/Buenos_Aires",
+    "America/Sao_Paulo", "Australia/Lord_Howe", "Asia/Kolkata", "Pacific/Apia", "Asia/Kathmandu",
+    "UTC", "Etc/GMT+3"
+]
+
+
+def _pytz(nombre, dt):
+    """Offset en horas según pytz, o el tipo de la excepción que lanza."""
+    try:
+        return pytz.timezone(nombre).localize(dt, is_dst=None).utcoffset().total_seconds() / 3600
+    except (pytz.exceptions.NonExistentTimeError, pytz.exceptions.AmbiguousTimeError) as e:
+        return type(e)
+
+
+def _tabla(nombre, dt):
+    try:
+        return utc_offset_hours(nombre, dt)
+    except (pytz.exceptions.NonExistentTimeError, pytz.exceptions.AmbiguousTimeError) as e:
+        return type(e)
+
+
+def _fechas_de_prueba(nombre):
+    """Fechas al azar entre 1900 y 2040 y cada 15 minutos alrededor de cada cambio de horario."""
+    rng = random.Random(nombre)
+    fechas = [datetime(1900, 1, 1) + timedelta(minutes=rng.randrange(140 * 365 * 24 * 60)) for _ in range(500)]
+    utc_times, offsets = _transiciones(nombre)
+    for instante, offset in zip(utc_times[1:], offsets[1:]):
+        if datetime(1900, 1, 1) < instante < datetime(2040, 1, 1):
+            local = instante + offset
+            fechas += [local + timedelta(minutes=15 * k) for k in range(-12, 13)]
+    return fechas
+
+
+@pytest.mark.parametrize("nombre", ZONAS)
+def test_offsets_iguales_a_pytz_localize(nombre):
+    fechas = _fechas_de_prueba(nombre)
+    distintas = [(dt, _tabla(nombre, dt), _pytz(nombre, dt)) for dt in fechas if _tabla(nombre, dt) != _pytz(nombre, dt)]
+    assert not distintas[:5]
+
+
+@pytest.mark.parametrize("dt, esperado", [
+    (datetime(2024, 3, 31, 2, 30), pytz.exceptions.NonExistentTimeError),
+    (datetime(2024, 10, 27, 2, 30), pytz.exceptions.AmbiguousTimeError),
+    (datetime(2024, 7, 1, 12), 2.0),
+    (datetime(2024, 1, 1, 12), 1.0),
+])
+def test_cambios_de_horario_de_madrid(dt, esperado):
+    assert _tabla("Europe/Madrid", dt) == esperado
+
+
+@pytest.mark.parametrize("nombre", ZONAS)
+def test_offset_en_utc_igual_a_pytz(nombre):
+    zona = pytz.timezone(nombre)
+    for dt in _fechas_de_prueba(nombre)[::7]:
+        esperado = zona.fromutc(dt.replace(tzinfo=zona)).utcoffset().total_seconds() / 3600
+        assert offset_en_utc(nombre, dt) == esperado, dt
+
+
+def test_nombre_por_coordenadas():
+    assert timezone_name_at(40.4168, -3.7038) == "Europe/Madrid"
+    assert timezone_name_at(-34.6037, -58.3816) == "America/Argentina/Buenos_Aires"
+    assert zona_valida("Europe/Madrid") and not zona_valida("Marte/Olimpo")
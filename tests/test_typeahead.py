@@ -0,0 +1,68 @@
+import asyncio
+
+from geocoding import GeocodingService
+from typeahead import Typeahead
+
+CIUDADES = [{"name": f"Buenos Aires {i}", "city": f"Buenos Aires {i}"} for i in range(60)] + \
+           [{"name": "Buenaventura, Colombia", "city": "Buenaventura"}]
+
+
+class GeocodingFalso:
+    """search_cities con un límite real, como Nominatim: devuelve como mucho `limit` filas."""
+
+    def __init__(self):
+        self.llamadas = []
+
+    async def search_cities(self, query, limit=10):
+        self.llamadas.append((query, limit))
+        q = query.lower()
+        return [c for c in CIUDADES if c["name"].lower().startswith(q)][:limit]
+
+
+def test_prefijo_truncado_no_se_toma_como_completo():
+    geocoding = GeocodingFalso()
+    typeahead = Typeahead(geocoding, fetch_limit=40, debounce=0)
+
+    async def escenario():
+        primera = await typeahead.buscar("bue", limit=15)
+        # "buena" no está entre los 40 de "bue": hay que consultar
+        segunda = await typeahead.buscar("buena", limit=15)
+        return primera, segunda
+
+    primera, segunda = asyncio.run(escenario())
+    assert len(primera) == 15
+    assert [c["city"] for c in segunda] == ["Buenaventura"]
+    assert geocoding.llamadas == [("bue", 40), ("buena", 40)]
+
+
+def test_prefijo_completo_responde_sin_consultar():
+    geocoding = GeocodingFalso()
+    typeahead = Typeahead(geocoding, fetch_limit=100, debounce=0)
+
+    async def escenario():
+        await typeahead.buscar("bue")
+        return await typeahead.buscar("buenaven")
+
+    assert [c["city"] for c in asyncio.run(escenario())] == ["Buenaventura"]
+    assert geocoding.llamadas == [("bue", 100)]
+
+
+def test_cache_de_busqueda_separa_por_limite(tmp_path):
+    servicio = GeocodingService(base_url="http://127.0.0.1:9", db_path=str(tmp_path / "geo.db"))
+
+    async def request(path, params):
+        return [{"display_name": f"Buenos Aires {i}", "lat": "0", "lon": "0", "importance": 1 - i / 100,
+                 "address": {"city": f"Buenos Aires {i}"}} for i in range(params["limit"])]
+
+    servicio._request = request
+
+    async def escenario():
+        # El warmup pedía 10; el autocompletado pide 40 y no debe recibir esos 10
+        diez = await servicio.search_cities("Buenos Aires", limit=10)
+        cuarenta = await servicio.search_cities("buenos aires ", limit=40)
+        await servicio.aclose()
+        return diez, cuarenta
+
+    diez, cuarenta = asyncio.run(escenario())
+    assert len(diez) == 10 and len(cuarenta) == 40
+    assert GeocodingService.city_search_query("Buenos Aires ", 40) == "buenos aires|40"
@@ -0,0 +1,89 @@
+import os
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+
+# Cargar los polígonos de zonas horarias en memoria (más rápido, usa más RAM)
+TZ_IN_MEMORY = os.getenv("TZ_IN_MEMORY", "0") == "1"
+# Decimales a los que se redondean lat/lon para indexar zonas (~110 m con 3)
+TZ_PRECISION = int(os.getenv("TZ_PRECISION", "3"))
+
+_finder = None
+_finder_lock = threading.Lock()
+
+
+def get_finder():
+    """Devuelve el TimezoneFinder compartido del proceso, creándolo la primera vez."""
+    global _finder
+    if _finder is None:
+        with _finder_lock:
+            if _finder is None:
+                from timezonefinder import TimezoneFinder
+                _finder = TimezoneFinder(in_memory=TZ_IN_MEMORY)
+    return _finder
+
+
+@lru_cache(maxsize=65536)
+def _zona_en(lat: float, lon: float):
+    return get_finder().timezone_at(lng=lon, lat=lat)
+
+
+def timezone_name_at(lat: float, lon: float):
+    """Nombre de la zona horaria (ej. 'America/Argentina/Buenos_Aires') o None."""
+    return _zona_en(round(lat, TZ_PRECISION), round(lon, TZ_PRECISION))
+
+
+@lru_cache(maxsize=1024)
+def _transiciones(nombre: str):
+    """
+    Tabla de transiciones de una zona: instantes UTC ordenados y el offset
+    vigente desde cada uno. Se calcula una vez por zona.
+    """
+    import pytz
+    tz = pytz.timezone(nombre)
+    utc_times = getattr(tz, "_utc_transition_times", None)
+    if utc_times:
+        return list(utc_times), [info[0] for info in tz._transition_info]
+    # Zonas de offset fijo (UTC, Etc/GMT+3, ...)
+    return [datetime.min], [tz.utcoffset(datetime(2000, 1, 1))]
+
+
+def utc_offset_hours(nombre: str, dt: datetime) -> float:
+    """
+    Offset en horas de la zona `nombre` para la fecha local (naive) `dt`.
+
+    Equivale a `pytz.timezone(nombre).localize(dt, is_dst=None).utcoffset()`:
+    lanza `NonExistentTimeError` o `AmbiguousTimeError` en los cambios de
+    horario, pero resuelve cada consulta con una búsqueda binaria.
+    """
+    utc_times, offsets = _transiciones(nombre)
+    i = bisect_right(utc_times, dt) - 1
+    candidatos = {offsets[j] for j in range(max(0, i - 2), min(len(offsets), i + 3))}
+    validos = []
+    for offset in candidatos:
+        j = bisect_right(utc_times, dt - offset) - 1
+        if offsets[max(j, 0)] == offset:
+            validos.append(offset)
+    if len(validos) != 1:
+        import pytz
+        if not validos:
+            raise pytz.exceptions.NonExistentTimeError(dt)
+        raise pytz.exceptions.AmbiguousTimeError(dt)
+    return validos[0].total_seconds() / 3600
+
+
+def offset_en_utc(nombre: str, dt: datetime) -> float:
+    """
+    Offset en horas de la zona `nombre` en el instante UTC (naive) `dt`. A
+    diferencia de una hora local, un instante UTC nunca es ambiguo.
+    """
+    utc_times, offsets = _transiciones(nombre)
+    i = bisect_right(utc_times, dt) - 1
+    return offsets[max(i, 0)].total_seconds() / 3600
+
+
+def zona_valida(nombre: str) -> bool:
+    """True si `nombre` es una zona IANA conocida."""
+    import pytz
+    return nombre in pytz.all_timezones_set
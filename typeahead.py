@@ -0,0 +1,171 @@
+import asyncio
+import os
+import re
+from typing import Dict, List, Optional
+
+from gazetteer import normalizar
+from lru import TTLCache
+from metrics import TYPEAHEAD_RESPUESTAS
+
+# Resultados que se piden aguas arriba por prefijo (el máximo de Nominatim es
+# 40): cuantos más, más consultas siguientes se responden filtrando
+TYPEAHEAD_FETCH_LIMIT = int(os.getenv("TYPEAHEAD_FETCH_LIMIT", "40"))
+# Prefijos normalizados con sus resultados en memoria
+TYPEAHEAD_CACHE_SIZE = int(os.getenv("TYPEAHEAD_CACHE_SIZE", "20000"))
+TYPEAHEAD_CACHE_TTL = float(os.getenv("TYPEAHEAD_CACHE_TTL", str(24 * 60 * 60)))
+# Segundos que espera una búsqueda que va a Nominatim por si el mismo
+# cliente escribe otra letra (y la reemplaza) antes
+TYPEAHEAD_DEBOUNCE = float(os.getenv("TYPEAHEAD_DEBOUNCE", "0.15"))
+
+_NO_ALFANUMERICO = re.compile(r"[^0-9a-z]+")
+
+
+def _texto(resultado: Dict) -> str:
+    """Texto normalizado de un resultado, con las palabras separadas por un espacio."""
+    texto = normalizar(f"{resultado.get('city', '')} {resultado.get('name', '')}")
+    return " " + _NO_ALFANUMERICO.sub(" ", texto).strip() + " "
+
+
+def _coincide(texto: str, query: str) -> bool:
+    """`query` aparece en `texto` empezando en el inicio de una palabra."""
+    return (" " + query) in texto
+
+
+class _Entrada:
+    __slots__ = ("resultados", "textos", "completa")
+
+    def __init__(self, resultados: List[Dict], completa: bool):
+        self.resultados = resultados
+        self.textos = [_texto(r) for r in resultados]
+        # Si vinieron menos resultados que los pedidos, están todos
+        self.completa = completa
+
+    def filtrar(self, query: str) -> List[Dict]:
+        return [r for r, texto in zip(self.resultados, self.textos) if _coincide(texto, query)]
+
+
+class Typeahead:
+    """
+    Capa de autocompletado sobre `GeocodingService.search_cities`.
+
+    Mientras el usuario escribe, "bue", "buen", "bueno" y "buenos" se
+    resuelven con una sola búsqueda aguas arriba:
+
+    - Cada búsqueda se guarda por su texto normalizado (sin diacríticos ni
+      mayúsculas), pidiendo TYPEAHEAD_FETCH_LIMIT resultados.
+    - Una consulta más larga se responde filtrando el resultado de su
+      prefijo más largo en caché si alcanza: si el del prefijo estaba
+      completo o si el filtro llena el límite pedido. Si el filtro queda
+      vacío se consulta igual, porque Nominatim no busca por prefijo.
+    - Si hay una búsqueda aguas arriba en curso para un prefijo, se la
+      espera en lugar de lanzar otra.
+    - Con un identificador de cliente, una búsqueda que va a Nominatim
+      espera TYPEAHEAD_DEBOUNCE segundos y se abandona si el mismo cliente
+      envía otra antes de que termine (devuelve None).
+    """
+
+    def __init__(self, geocoding, fetch_limit: int = TYPEAHEAD_FETCH_LIMIT,
+                 size: int = TYPEAHEAD_CACHE_SIZE, ttl: float = TYPEAHEAD_CACHE_TTL,
+                 debounce: float = TYPEAHEAD_DEBOUNCE):
+        self.geocoding = geocoding
+        self.fetch_limit = fetch_limit
+        self.debounce = debounce
+        self.prefijos = TTLCache(size, ttl)
+        # Búsquedas aguas arriba en curso, por texto normalizado
+        self._en_curso: Dict[str, asyncio.Task] = {}
+        # Última búsqueda de cada cliente: su evento se activa al ser reemplazada
+        self._clientes = TTLCache(10000, 60)
+
+    def _desde_prefijo(self, clave: str, limit: int) -> Optional[List[Dict]]:
+        for largo in range(len(clave) - 1, 0, -1):
+            entrada = self.prefijos.get(clave[:largo])
+            if entrada is None:
+                continue
+            filtrados = entrada.filtrar(clave)
+            if filtrados and (entrada.completa or len(filtrados) >= limit):
+                return filtrados
+            return None
+        return None
+
+    def _prefijo_en_curso(self, clave: str):
+        """(prefijo, tarea) de la búsqueda en curso más larga que es prefijo de `clave`."""
+        for largo in range(len(clave), 0, -1):
+            tarea = self._en_curso.get(clave[:largo])
+            if tarea is not None:
+                return clave[:largo], tarea
+        return None, None
+
+    async def _buscar_aguas_arriba(self, query: str, clave: str) -> _Entrada:
+        resultados = await self.geocoding.search_cities(query, limit=self.fetch_limit)
+        entrada = _Entrada(resultados, len(resultados) < self.fetch_limit)
+        # Una lista vacía puede ser un error de Nominatim: no sirve de prefijo
+        if resultados:
+            self.prefijos.set(clave, entrada)
+        return entrada
+
+    def _registrar_cliente(self, cliente: Optional[str]) -> Optional[asyncio.Event]:
+        if not cliente:
+            return None
+        anterior = self._clientes.get(cliente)
+        if anterior is not None:
+            anterior.set()
+        reemplazada = asyncio.Event()
+        self._clientes.set(cliente, reemplazada)
+        return reemplazada
+
+    async def buscar(self, query: str, limit: int = 15, cliente: Optional[str] = None) -> Optional[List[Dict]]:
+        """
+        Ciudades para el texto `query`, como máximo `limit`. Devuelve None si
+        la búsqueda fue reemplazada por otra más nueva del mismo `cliente`.
+        """
+        clave = normalizar(query)
+        reemplazada = self._registrar_cliente(cliente)
+
+        entrada = self.prefijos.get(clave)
+        if entrada is not None:
+            TYPEAHEAD_RESPUESTAS.labels("exacta").inc()
+            return entrada.resultados[:limit]
+        filtrados = self._desde_prefijo(clave, limit)
+        if filtrados is not None:
+            TYPEAHEAD_RESPUESTAS.labels("prefijo").inc()
+            return filtrados[:limit]
+
+        # Esperar una búsqueda en curso de un prefijo y volver a intentar con ella
+        prefijo, tarea = self._prefijo_en_curso(clave)
+        if tarea is not None:
+            entrada = await asyncio.shield(tarea)
+            if prefijo == clave:
+                TYPEAHEAD_RESPUESTAS.labels("exacta").inc()
+                return entrada.resultados[:limit]
+            filtrados = self._desde_prefijo(clave, limit)
+            if filtrados is not None:
+                TYPEAHEAD_RESPUESTAS.labels("prefijo").inc()
+                return filtrados[:limit]
+
+        if reemplazada is not None:
+            try:
+                await asyncio.wait_for(reemplazada.wait(), self.debounce)
+                TYPEAHEAD_RESPUESTAS.labels("reemplazada").inc()
+                return None
+            except asyncio.TimeoutError:
+                pass
+
+        tarea = self._en_curso.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(self._buscar_aguas_arriba(query, clave))
+            self._en_curso[clave] = tarea
+            tarea.add_done_callback(lambda _: self._en_curso.pop(clave, None))
+        TYPEAHEAD_RESPUESTAS.labels("busqueda").inc()
+        if reemplazada is None:
+            entrada = await asyncio.shield(tarea)
+            return entrada.resultados[:limit]
+
+        # La búsqueda sigue aunque este pedido se abandone: su resultado
+        # sirve de prefijo para el pedido que lo reemplazó
+        espera = asyncio.ensure_future(reemplazada.wait())
+        await asyncio.wait({tarea, espera}, return_when=asyncio.FIRST_COMPLETED)
+        espera.cancel()
+        if not tarea.done():
+            TYPEAHEAD_RESPUESTAS.labels("reemplazada").inc()
+            return None
+        return tarea.result().resultados[:limit]
@@ -1,8 +1,11 @@
+import math
 import os
+import numpy as np
 import swisseph as swe
 from datetime import datetime, timezone, timedelta
-from timezonefinder import TimezoneFinder
-import pytz
+from pytz.exceptions import AmbiguousTimeError, InvalidTimeError
+from timezones import timezone_name_at, utc_offset_hours
+from tabla_efemerides import tabla_efemerides
 
 EPH_PATH = os.getenv("EPH_PATH", "./ephe")
 swe.set_ephe_path(EPH_PATH)
@@ -44,34 +47,63 @@ ASPECTOS = [
     (180, "oposición", 8)
 ]
 
+# Sistemas de casas disponibles (código de Swiss Ephemeris)
+SISTEMAS_CASAS = {
+    "placidus": b'P',
+    "koch": b'K',
+    "igual": b'E',
+    "signos_enteros": b'W',
+    "regiomontano": b'R',
+    "campanus": b'C',
+    "porfirio": b'O'
+}
+
+# Cuerpos opcionales además de PLANETAS
+CUERPOS_EXTRA = {
+    "nodo_norte": swe.TRUE_NODE,
+    "quiron": swe.CHIRON,
+    "lilith": swe.MEAN_APOG
+}
+
+# Máximo de instantes por serie de efemérides
+MAX_MUESTRAS_EFEMERIDES = 200_000
+
+# "exacta": Swiss Ephemeris. "rapida": tabla precalculada e interpolada
+# (error de segundos de arco, ver tabla_efemerides.py), con Swiss Ephemeris
+# fuera del rango de la tabla
+PRECISIONES = ("exacta", "rapida")
+
+# Tablas por signo, calculadas una vez por proceso
+_SIGN_INFO = {
+    signo: {"elemento": ELEMENTOS[signo], "cualidad": CUALIDADES[signo]}
+    for signo in SIGNS
+}
+
+def _sign_index(deg):
+    return int(deg % 360 // 30)
+
 def _sign(deg):
-    deg = deg % 360
-    index = int(deg // 30)
-    return SIGNS[index]
+    return SIGNS[_sign_index(deg)]
 
 def get_sign_info(signo):
-    return {
-        "elemento": ELEMENTOS[signo],
-        "cualidad": CUALIDADES[signo]
-    }
+    return dict(_SIGN_INFO[signo])
+
+# Orden fijo de elementos, cualidades y niveles de balance (el formato
+# compacto de las respuestas usa sus índices)
+NOMBRES_ELEMENTOS = ["Fuego", "Tierra", "Aire", "Agua"]
+NOMBRES_CUALIDADES = ["Cardinal", "Fijo", "Mutable"]
+NIVELES_BALANCE = ["Muy Balanceado", "Balanceado", "Poco Balanceado", "Desbalanceado"]
+# Índice en NOMBRES_ELEMENTOS del elemento de cada signo
+_ELEMENTO_POR_SIGNO = {signo: NOMBRES_ELEMENTOS.index(ELEMENTOS[signo]) for signo in SIGNS}
 
 def calcular_balance_elementos(planetas):
     """Calcula el balance de elementos basado en las posiciones planetarias"""
-    elementos = {"Fuego": 0, "Tierra": 0, "Aire": 0, "Agua": 0}
+    cantidades = [0] * len(NOMBRES_ELEMENTOS)
+    for info in planetas.values():
+        cantidades[_ELEMENTO_POR_SIGNO[info["signo"]]] += 1
+    elementos = dict(zip(NOMBRES_ELEMENTOS, cantidades))
     total_planetas = len(planetas)
     
-    for planeta, info in planetas.items():
-        signo = info["signo"]
-        elemento = ELEMENTOS[signo]
-        if elemento == "Fuego":
-            elementos["Fuego"] += 1
-        elif elemento == "Tierra":
-            elementos["Tierra"] += 1
-        elif elemento == "Aire":
-            elementos["Aire"] += 1
-        elif elemento == "Agua":
-            elementos["Agua"] += 1
-    
     # Calcular porcentajes
     balance = {}
     for elemento, cantidad in elementos.items():
@@ -89,14 +121,8 @@ def calcular_balance_elementos(planetas):
     min_cantidad = min(elementos.values())
     diferencia = max_cantidad - min_cantidad
     
-    if diferencia <= 1:
-        balance_general = "Muy Balanceado"
-    elif diferencia <= 2:
-        balance_general = "Balanceado"
-    elif diferencia <= 3:
-        balance_general = "Poco Balanceado"
-    else:
-        balance_general = "Desbalanceado"
+    # Diferencia <= 1: muy balanceado, 2: balanceado, 3: poco balanceado, más: desbalanceado
+    balance_general = NIVELES_BALANCE[min(max(diferencia, 1), len(NIVELES_BALANCE)) - 1]
     
     return {
         "elementos": balance,
@@ -105,39 +131,10 @@ def calcular_balance_elementos(planetas):
         "resumen": f"Elemento dominante: {elemento_dominante} ({balance[elemento_dominante]['porcentaje']}%) - {balance_general}"
     }
 
-def get_chart(y, m, d, h=12, mi=0, s=0, tz=0, lat=0.0, lon=0.0):
-    ut_hours = h + mi / 60 + s / 3600 - tz
-    jd_ut = swe.julday(y, m, d, ut_hours)
-
-    # Planetas
-    planetas = {}
-    posiciones = {}
-    for nombre, id_planeta in PLANETAS.items():
-        res = swe.calc_ut(jd_ut, id_planeta)
-        grado = res[0][0]
-        signo = _sign(grado)
-        planetas[nombre] = {"signo": signo, "grado": round(grado, 4)}
-        posiciones[nombre] = grado
-
-    # Casas
-    cusps, ascmc = swe.houses_ex(jd_ut, lat, lon, b'P')
-    casas = {}
-    for i in range(12):
-        grado = cusps[i]
-        signo = _sign(grado)
-        casas[str(i+1)] = {"grado": round(grado, 4), "signo": signo}
-
-    # Ascendente (casa 1)
-    asc_long = ascmc[0]
-    asc_sign = _sign(asc_long)
-
-    # Elemento y cualidad para Sol, Luna y Ascendente
-    sol_sign = planetas["sol"]["signo"]
-    luna_sign = planetas["luna"]["signo"]
-
-    # Aspectos
+def calcular_aspectos(posiciones):
+    """Aspectos entre cada par de cuerpos, dado un dict nombre -> longitud."""
     aspectos = []
-    nombres = list(PLANETAS.keys())
+    nombres = list(posiciones.keys())
     for i in range(len(nombres)):
         for j in range(i+1, len(nombres)):
             p1, p2 = nombres[i], nombres[j]
@@ -152,11 +149,68 @@ def get_chart(y, m, d, h=12, mi=0, s=0, tz=0, lat=0.0, lon=0.0):
                         "aspecto": nombre_asp,
                         "orbe": round(abs(diff - angulo), 2)
                     })
+    return aspectos
+
+def _casas(jd_ut, lat, lon, sistema):
+    """Cúspides y ascendente para un sistema de casas (nombre de SISTEMAS_CASAS)."""
+    cusps, ascmc = swe.houses_ex(jd_ut, lat, lon, SISTEMAS_CASAS[sistema])
+    casas = {}
+    for i in range(12):
+        grado = cusps[i]
+        casas[str(i+1)] = {"grado": round(grado, 4), "signo": SIGNS[_sign_index(grado)]}
+    return casas, SIGNS[_sign_index(ascmc[0])]
 
-    # Calcular balance de elementos
-    balance_elementos = calcular_balance_elementos(planetas)
+def get_chart(y, m, d, h=12, mi=0, s=0, tz=0, lat=0.0, lon=0.0, sistema_casas="placidus", extras=(),
+              precision="exacta"):
+    """
+    Calcula la carta astral.
 
-    return {
+    `sistema_casas` es un nombre de SISTEMAS_CASAS o una lista de nombres; en
+    ese caso las casas del primero van en "casas" y las de todos en
+    "sistemas_casas", con las posiciones planetarias calculadas una sola
+    vez. `extras` son nombres de CUERPOS_EXTRA, que se agregan a los planetas
+    y a los aspectos (no al balance de elementos). Con `precision="rapida"`
+    los planetas salen de la tabla precalculada si cubre la fecha; la carta
+    indica en "precision" cuál se usó.
+    """
+    ut_hours = h + mi / 60 + s / 3600 - tz
+    return get_chart_jd(swe.julday(y, m, d, ut_hours), lat, lon, sistema_casas, extras, precision)
+
+def get_chart_jd(jd_ut, lat=0.0, lon=0.0, sistema_casas="placidus", extras=(), precision="exacta"):
+    """Carta astral para un día juliano (UT); mismos argumentos y resultado que get_chart."""
+    sistemas = [sistema_casas] if isinstance(sistema_casas, str) else list(sistema_casas)
+    desconocidos = [n for n in sistemas if n not in SISTEMAS_CASAS] + [n for n in extras if n not in CUERPOS_EXTRA]
+    if not sistemas or desconocidos:
+        raise ValueError(f"Sistema de casas o cuerpo desconocido: {', '.join(desconocidos)}")
+
+    # Planetas (los cuerpos extra no están en la tabla)
+    rapida = precision == "rapida" and tabla_efemerides.cubre(jd_ut)
+    planetas = {}
+    posiciones = {}
+    cuerpos = list(PLANETAS.items()) + [(nombre, CUERPOS_EXTRA[nombre]) for nombre in extras]
+    for nombre, id_planeta in cuerpos:
+        interpolada = tabla_efemerides.posicion(nombre, jd_ut) if rapida else None
+        grado = interpolada[0] if interpolada else swe.calc_ut(jd_ut, id_planeta)[0][0]
+        planetas[nombre] = {"signo": SIGNS[_sign_index(grado)], "grado": round(grado, 4)}
+        posiciones[nombre] = grado
+
+    # Casas (las posiciones planetarias se comparten entre sistemas)
+    casas_por_sistema = {sistema: _casas(jd_ut, lat, lon, sistema) for sistema in sistemas}
+    casas, asc_sign = casas_por_sistema[sistemas[0]]
+
+    # Elemento y cualidad para Sol, Luna y Ascendente
+    sol_sign = planetas["sol"]["signo"]
+    luna_sign = planetas["luna"]["signo"]
+
+    # Aspectos
+    aspectos = calcular_aspectos(posiciones)
+
+    # Calcular balance de elementos (solo con los planetas principales)
+    balance_elementos = calcular_balance_elementos(
+        {nombre: planetas[nombre] for nombre in PLANETAS}
+    )
+
+    carta = {
         "planetas": planetas,
         "casas": casas,
         "ascendente": asc_sign,
@@ -166,24 +220,130 @@ def get_chart(y, m, d, h=12, mi=0, s=0, tz=0, lat=0.0, lon=0.0):
         "aspectos": aspectos,
         "balance_elementos": balance_elementos
     }
+    if precision == "rapida":
+        carta["precision"] = "rapida" if rapida else "exacta"
+    if len(sistemas) > 1:
+        carta["sistemas_casas"] = {
+            sistema: {"casas": casas_sistema, "ascendente": asc_sistema}
+            for sistema, (casas_sistema, asc_sistema) in casas_por_sistema.items()
+        }
+    return carta
 
 def get_timezone_offset(lat, lon, dt=None):
     """
     Dada una latitud, longitud y una fecha (datetime), devuelve el offset horario en horas.
     Si no se pasa fecha, usa la fecha y hora actual.
     """
-    tf = TimezoneFinder()
-    timezone_str = tf.timezone_at(lng=lon, lat=lat)
+    timezone_str = timezone_name_at(lat, lon)
     if not timezone_str:
         return None
-    tz = pytz.timezone(timezone_str)
     if dt is None:
         dt = datetime.utcnow()
-    # Hacer que dt sea 'aware' en la zona horaria local
-    if dt.tzinfo is None:
-        dt = tz.localize(dt, is_dst=None)
-    offset = dt.utcoffset()
-    if offset is None:
-        return None
-    return offset.total_seconds() / 3600
+    if dt.tzinfo is not None:
+        offset = dt.utcoffset()
+        return offset.total_seconds() / 3600 if offset is not None else None
+    return utc_offset_hours(timezone_str, dt)
+
+def zona_registro(registro, tz_default=-3):
+    """
+    Offset horario de un registro con las claves de `/carta`: su `tz`, o si
+    es None la zona de sus coordenadas en esa fecha (tz_default si no hay
+    zona). Lanza ValueError si la fecha no existe o si la hora local cae en
+    un cambio de horario (inexistente o ambigua).
+    """
+    anio, mes, dia = registro["anio"], registro["mes"], registro["dia"]
+    hora = registro.get("hora", 12)
+    minuto = registro.get("minuto", 0)
+    try:
+        fecha = datetime(anio, mes, dia, hora, minuto)
+    except ValueError:
+        raise ValueError(f"Fecha u hora inexistente: {anio:04d}-{mes:02d}-{dia:02d} {hora:02d}:{minuto:02d}")
+    tz_offset = registro.get("tz")
+    if tz_offset is not None:
+        return tz_offset
+    try:
+        tz_offset = get_timezone_offset(registro.get("lat", 0.0), registro.get("lon", 0.0), fecha)
+    except InvalidTimeError as e:
+        motivo = "ambigua" if isinstance(e, AmbiguousTimeError) else "inexistente"
+        raise ValueError(f"Hora local {motivo} por un cambio de horario: {fecha.isoformat(timespec='minutes')}; "
+                         f"indica la zona horaria con tz")
+    return tz_default if tz_offset is None else tz_offset
+
+def get_charts_batch(registros, tz_default=-3, sistema_casas="placidus", extras=(), precision="exacta"):
+    """
+    Genera cartas astrales para una lista de registros, en el mismo orden.
+
+    Cada registro es un dict con las claves de `/carta`: anio, mes, dia,
+    hora, minuto, tz, lat y lon. Si `tz` es None se resuelve a partir de
+    las coordenadas usando las tablas de zonas horarias compartidas del
+    proceso, así que cada ubicación distinta se busca una sola vez. Un
+    registro inválido (fecha inexistente, hora en un cambio de horario)
+    produce `{"error": ...}` en su lugar, sin cortar el resto del lote.
+
+    Es un generador: devuelve cada carta apenas se calcula.
+    """
+    for registro in registros:
+        lat = registro.get("lat", 0.0)
+        lon = registro.get("lon", 0.0)
+        try:
+            tz_offset = zona_registro(registro, tz_default)
+        except ValueError as e:
+            yield {"error": str(e)}
+            continue
 
+        carta = get_chart(registro["anio"], registro["mes"], registro["dia"], registro.get("hora", 12),
+                          registro.get("minuto", 0), 0, tz_offset, lat, lon, sistema_casas, extras, precision)
+        carta["ubicacion"] = {"latitud": lat, "longitud": lon}
+        carta["zona_horaria"] = tz_offset
+        yield carta
+
+def get_charts_list(registros, tz_default=-3, sistema_casas="placidus", extras=(), precision="exacta"):
+    """Versión de `get_charts_batch` que devuelve una lista (para usar en un pool de procesos)."""
+    return list(get_charts_batch(registros, tz_default, sistema_casas, extras, precision))
+
+def jd_from_datetime(dt):
+    """Día juliano (UT) de un datetime; si es naive se toma como UTC."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return swe.julday(dt.year, dt.month, dt.day,
+                      dt.hour + dt.minute / 60 + dt.second / 3600 + dt.microsecond / 3600e6)
+
+def get_ephemeris_series(jd_inicio, jd_fin, paso_horas=24.0, planetas=None, precision="exacta"):
+    """
+    Calcula longitud, velocidad y signo de los planetas entre dos fechas (UT).
+
+    Devuelve arrays de NumPy por columna: `jd` con los instantes y, por cada
+    planeta, `longitud` y `velocidad` (grados y grados/día) y `signo` (índice
+    en SIGNS). No calcula casas ni aspectos. Con `precision="rapida"` y la
+    serie dentro del rango de la tabla precalculada, se interpola toda la
+    serie de una vez.
+    """
+    nombres = list(planetas) if planetas else list(PLANETAS.keys())
+    paso = paso_horas / 24
+    if not paso > 0:
+        raise ValueError("paso_horas debe ser mayor que cero")
+    # Contar los instantes antes de crear el array: un paso diminuto no
+    # debe llegar a reservar memoria
+    n = math.floor((jd_fin - jd_inicio) / paso + 1e-9) + 1
+    if n > MAX_MUESTRAS_EFEMERIDES:
+        raise ValueError(f"La serie supera el máximo de {MAX_MUESTRAS_EFEMERIDES} instantes")
+    jds = jd_inicio + np.arange(max(n, 0)) * paso
+
+    flags = swe.FLG_SWIEPH | swe.FLG_SPEED
+    calc_ut = swe.calc_ut
+    serie = {"jd": jds}
+    for nombre in nombres:
+        id_planeta = PLANETAS[nombre]
+        interpoladas = tabla_efemerides.posiciones(nombre, jds) if precision == "rapida" else None
+        if interpoladas is not None:
+            longitudes, velocidades = interpoladas
+        else:
+            datos = np.array([calc_ut(jd, id_planeta, flags)[0][:4:3] for jd in jds.tolist()],
+                             dtype=np.float64).reshape(-1, 2)
+            longitudes, velocidades = datos[:, 0], datos[:, 1]
+        serie[nombre] = {
+            "longitud": longitudes,
+            "velocidad": velocidades,
+            "signo": (longitudes // 30).astype(np.int8) % 12
+        }
+    return serie